@@ -0,0 +1,454 @@
+"""
+Benchmarks for the XML Manipulation Tool for Rockwell PLC Programs
+
+This Python script generates synthetic L5X projects of increasing size and times the operations of xml_manipulation_tool_rockwell.py on them, so that the cost of an operation can be compared between file sizes and between versions of the tool.
+
+Usage:
+1. Run "python benchmark_xml_manipulation_tool_rockwell.py rewrite" to time the Text rewrite engine on projects of 1, 2, 4 and 8 times the base size.
+   The rewrite is linear in the size of the file, the exit code is 1 when the time per MB of the largest project is more than --scaling-tolerance above the one of the smallest.
+2. Use --programs, --routines and --rungs to change the base size and --scales to change the multipliers.
+3. Use --legacy to also time the old per-Text xml_content.replace loop (only practical on small projects).
+4. Run "python benchmark_xml_manipulation_tool_rockwell.py replacer" to time the multi-key TagReplacer against the old loop of text.replace calls, use --keys and --texts to change the size of the mapping and the number of rungs.
+5. Run "python benchmark_xml_manipulation_tool_rockwell.py pipeline" to time the dedupe and renumber workflow through the csv files against the in-memory Pipeline.
+   Both write the same L5X file, the exit code is 1 when they do not.
+6. Run "python benchmark_xml_manipulation_tool_rockwell.py l5k" to time the L5K scanner on generated L5K projects (the same projects as the L5X ones), use --scales 1 10 100 for large files.
+7. Run "python benchmark_xml_manipulation_tool_rockwell.py suite --save-baseline baseline.json" to time every operation of the menu (wall time, peak memory and time spent in garbage collection, each in a process of its own) on one generated project and save the results.
+   Run it again with --baseline baseline.json to compare with the saved results, the exit code is 1 when an operation got slower or uses more memory than --tolerance allows.
+   The project is set with --format, --tasks, --programs, --routines, --rungs, --bus-density, --duplicate-ratio and --comment-coverage, --repeat keeps the fastest of several runs.
+
+The generated files are written to a temporary folder and removed afterwards.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import sys
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import xml_manipulation_tool_rockwell as tool
+
+# Name of the n-th task of a generated project
+def task_name(n):
+    return "MainTask" if n == 0 else f"Task_{n}"
+
+# Function to generate a synthetic L5X project with Bus[n].Obj references, duplicate buses and rung comments
+# The programs are shared out between the tasks in turn, bus_density is the share of rungs that use a bus,
+# duplicate_ratio the share of those that reuse a number already given out and comment_coverage the share of
+# rungs with a comment. Returns the highest bus number.
+def generate_l5x(path, programs=10, routines=5, rungs=100, seed=0, tasks=1, bus_density=0.5, duplicate_ratio=0.1, comment_coverage=0.5):
+    rnd = random.Random(seed)
+    bus = 0
+    with open(path, 'w', encoding="UTF-8") as file:
+        file.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+        file.write('<RSLogix5000Content SchemaRevision="1.0" TargetName="Benchmark" TargetType="Controller">\n')
+        file.write('<Controller Use="Target" Name="Benchmark">\n<Programs>\n')
+        for p in range(programs):
+            file.write(f'<Program Name="Program_{p}" MainRoutineName="Routine_0">\n<Routines>\n')
+            for r in range(routines):
+                file.write(f'<Routine Name="Routine_{r}" Type="RLL">\n<RLLContent>\n')
+                for n in range(rungs):
+                    file.write(f'<Rung Number="{n}" Type="N">\n')
+                    if rnd.random() < comment_coverage:
+                        file.write(f'<Comment>\n<LocalizedComment Lang="en-US">\n<![CDATA[Rung {n} of Routine_{r}]]>\n</LocalizedComment>\n</Comment>\n')
+                    if rnd.random() < bus_density:
+                        bus += 1
+                        number = bus if rnd.random() > duplicate_ratio else rnd.randint(1, bus)
+                        text = f"XIC(Start_{p}_{r}_{n})Motor_AOI(M_{p}_{r}_{n},Bus[{number}].Obj,Cfg_{n});"
+                    else:
+                        text = f"[XIC(A_{p}_{n}) ,XIO(B_{p}_{n}) ]OTE(Out_{p}_{r}_{n});"
+                    file.write(f'<Text>\n<![CDATA[{text}]]>\n</Text>\n</Rung>\n')
+                file.write('</RLLContent>\n</Routine>\n')
+            file.write('</Routines>\n</Program>\n')
+        file.write('</Programs>\n<Tasks>\n')
+        for t in range(tasks):
+            file.write(f'<Task Name="{task_name(t)}" Type="{"CONTINUOUS" if t == 0 else "PERIODIC"}">\n<ScheduledPrograms>\n')
+            for p in range(t, programs, tasks):
+                file.write(f'<ScheduledProgram Name="Program_{p}"/>\n')
+            file.write('</ScheduledPrograms>\n</Task>\n')
+        file.write('</Tasks>\n</Controller>\n</RSLogix5000Content>\n')
+    return bus
+
+# Function to generate a synthetic L5K project, the same seed gives the same project as generate_l5x
+def generate_l5k(path, programs=10, routines=5, rungs=100, seed=0, tasks=1, bus_density=0.5, duplicate_ratio=0.1, comment_coverage=0.5):
+    rnd = random.Random(seed)
+    bus = 0
+    with open(path, 'w', encoding="cp1252", newline='\r\n') as file:
+        file.write('IE_VER := 2.28;\n\nCONTROLLER Benchmark (ProcessorType := "1756-L83E",\n                      Major := 32)\n')
+        for p in range(programs):
+            file.write(f'\tPROGRAM Program_{p} (MAIN := "Routine_0",\n\t                   MODE := 0,\n\t                   DisableFlag := 0)\n')
+            file.write(f'\t\tTAG\n\t\t\tStart_{p} : BOOL (RADIX := Decimal) := 0;\n\t\tEND_TAG\n\n')
+            for r in range(routines):
+                file.write(f'\t\tROUTINE Routine_{r} \n')
+                for n in range(rungs):
+                    if rnd.random() < comment_coverage:
+                        file.write(f'\t\t\t\tRC: "Rung {n} of Routine_{r}";\n')
+                    if rnd.random() < bus_density:
+                        bus += 1
+                        number = bus if rnd.random() > duplicate_ratio else rnd.randint(1, bus)
+                        text = f"XIC(Start_{p}_{r}_{n})Motor_AOI(M_{p}_{r}_{n},Bus[{number}].Obj,Cfg_{n});"
+                    else:
+                        text = f"[XIC(A_{p}_{n}) ,XIO(B_{p}_{n}) ]OTE(Out_{p}_{r}_{n});"
+                    file.write(f'\t\t\t\tN: {text}\n')
+                file.write('\t\tEND_ROUTINE\n\n')
+            file.write('\tEND_PROGRAM\n\n')
+        for t in range(tasks):
+            file.write(f'\tTASK {task_name(t)} (Type := {"CONTINUOUS" if t == 0 else "PERIODIC"},\n\t               Rate := 10)\n')
+            for p in range(t, programs, tasks):
+                file.write(f'\t\t\tProgram_{p};\n')
+            file.write('\tEND_TASK\n\n')
+        file.write('END_CONTROLLER\n')
+    return bus
+
+# Function to time the L5K scanner: the bus reports, the comment rows and a rewrite of every bus number
+def benchmark_l5k(programs, routines, rungs, scales):
+    folder = tempfile.mkdtemp()
+    cache_dir = tool.CACHE_DIR
+    tool.CACHE_DIR = ''
+    try:
+        print(f"{'Scale':>6} {'Size MB':>9} {'Rungs':>9} {'Buses s':>9} {'Comments s':>11} {'Rewrite s':>10} {'MB/s':>7} {'Peak MB':>8}")
+        for scale in scales:
+            source = os.path.join(folder, f"benchmark_{scale}.L5K")
+            generate_l5k(source, programs * scale, routines, rungs)
+            size = os.path.getsize(source) / 1e6
+            start = time.perf_counter()
+            tool.bus_reports(source)
+            buses = time.perf_counter() - start
+            start = time.perf_counter()
+            tool.comment_rows(source)
+            comments = time.perf_counter() - start
+            seconds, _ = time_rewrite(source, os.path.join(folder, f"benchmark_{scale}_out.L5K"))
+            peak = tool.peak_memory()
+            print(f"{scale:>6} {size:>9.2f} {programs * scale * routines * rungs:>9} {buses:>9.3f} {comments:>11.3f} {seconds:>10.3f}"
+                  f" {size / buses:>7.1f} {peak if peak is not None else float('nan'):>8.1f}")
+    finally:
+        tool.CACHE_DIR = cache_dir
+        shutil.rmtree(folder)
+
+# Function to renumber every bus of a rung, used as the edit for the rewrite benchmark
+def _renumber(text):
+    return re.sub(r'Bus\[(\d+)\]\.Obj', lambda match: f"Bus[{int(match.group(1)) + 1000}].Obj", text)
+
+# Function to time the rewrite engine: load, rewrite every Text element and save
+def time_rewrite(source, dest):
+    start = time.perf_counter()
+    doc = tool.load_document(source)
+    changed = tool.rewrite_texts(doc, _renumber)
+    doc.save(dest)
+    return time.perf_counter() - start, changed
+
+# Function to time the old approach of calling xml_content.replace once per Text element
+def time_legacy_rewrite(source, dest):
+    start = time.perf_counter()
+    with open(source, 'r', encoding="UTF-8") as file:
+        xml_content = file.read()
+    changed = 0
+    for text_tag in tool.ET.fromstring(xml_content).findall('.//Text'):
+        original_text = text_tag.text.strip() if text_tag.text is not None else ''
+        modified_text = _renumber(original_text)
+        if modified_text != original_text:
+            changed += 1
+        xml_content = xml_content.replace(original_text, modified_text)
+    with open(dest, 'w', encoding="UTF-8") as file:
+        file.write(xml_content)
+    return time.perf_counter() - start, changed
+
+# Function to replace tags the old way, one text.replace per key of the mapping
+def _legacy_replace_tags(text, replacement_dict):
+    if re.search(r'Bus\[\d+\]\.Obj', text):
+        for key in replacement_dict.keys():
+            text = text.replace(key, replacement_dict[key], 1)
+    return text
+
+# Function to time the TagReplacer against the old replace loop on generated rung texts
+# The old loop is timed on the first legacy_texts rungs only and extrapolated to all of them
+def benchmark_replacer(keys, texts, legacy_texts=200):
+    mapping = {f"M_{i}": f"Motor_{i}" for i in range(keys)}
+    rungs = [f"XIC(Start_{n})Motor_AOI(M_{(n * 7) % (keys * 2)},Bus[{n}].Obj,Cfg_{n})OTE(M_{n % keys}.Run);" for n in range(texts)]
+
+    start = time.perf_counter()
+    replacer = tool.TagReplacer(mapping)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in rungs:
+        tool.replace_tags(text, replacer)
+    compiled = time.perf_counter() - start
+
+    sample = rungs[:legacy_texts]
+    start = time.perf_counter()
+    for text in sample:
+        _legacy_replace_tags(text, mapping)
+    legacy = (time.perf_counter() - start) * len(rungs) / max(len(sample), 1)
+
+    print(f"Keys: {keys}, Rungs: {texts}")
+    print(f"TagReplacer build:        {build:.3f} s")
+    print(f"TagReplacer replace:      {compiled:.3f} s ({compiled / texts * 1e6:.1f} us per rung)")
+    print(f"Old replace loop (est.):  {legacy:.3f} s ({legacy / texts * 1e6:.1f} us per rung)")
+    print(f"Speed-up:                 {legacy / max(build + compiled, 1e-9):.0f}x")
+
+# Function to run the rewrite benchmark over a list of size multipliers and print the time per MB
+# Returns 1 when the time per MB of the largest project is more than scaling_tolerance above the one of the smallest
+def benchmark_rewrite(programs, routines, rungs, scales, legacy=False, scaling_tolerance=1.0):
+    folder = tempfile.mkdtemp()
+    per_mb = {}
+    try:
+        print(f"{'Scale':>6} {'Size MB':>9} {'Rungs':>9} {'Changed':>8} {'Seconds':>9} {'s/MB':>8}" + (f" {'Legacy s':>9}" if legacy else ""))
+        for scale in scales:
+            source = os.path.join(folder, f"benchmark_{scale}.L5X")
+            dest = os.path.join(folder, f"benchmark_{scale}_out.L5X")
+            generate_l5x(source, programs * scale, routines, rungs)
+            size = os.path.getsize(source) / 1e6
+            seconds, changed = time_rewrite(source, dest)
+            per_mb[scale] = seconds / size
+            line = f"{scale:>6} {size:>9.2f} {programs * scale * routines * rungs:>9} {changed:>8} {seconds:>9.3f} {seconds / size:>8.3f}"
+            if legacy:
+                legacy_seconds, _ = time_legacy_rewrite(source, dest)
+                line += f" {legacy_seconds:>9.3f}"
+            print(line)
+    finally:
+        shutil.rmtree(folder)
+    smallest, largest = min(per_mb), max(per_mb)
+    growth = per_mb[largest] / per_mb[smallest] - 1
+    if growth > scaling_tolerance:
+        print(f"Error: the time per MB grew by {growth:.0%} from scale {smallest} to scale {largest}, the rewrite is not linear in the size of the file")
+        return 1
+    return 0
+
+# Function to run the dedupe and renumber workflow the manual way, every stage goes through a csv file and an L5X file
+def time_csv_workflow(source, folder, start_number, end_number):
+    step = os.path.join(folder, "csv_step.L5X")
+    dest = os.path.join(folder, "csv_out.L5X")
+    start = time.perf_counter()
+    tool.list_bus(source, folder, stream=False)
+    tool.replace_bus_tags(source, step, folder, [], start_number=start_number, end_number=end_number)
+    file_name = tool.bus_xml_list(step, folder, stream=False)
+    rows = tool.read_csv_rows(file_name)
+    tool.write_csv(file_name, ['Bus Number', 'Replacement Bus Number'],
+                   [[row['Bus Number'], int(row['Bus Number']) + 1000] for row in rows])
+    tool.bus_xml_replacement(step, dest, folder)
+    return time.perf_counter() - start, dest
+
+# Function to run the same workflow through the Pipeline
+def time_pipeline(source, folder, start_number, end_number):
+    dest = os.path.join(folder, "pipeline_out.L5X")
+    start = time.perf_counter()
+    pipeline = tool.Pipeline(source)
+    pipeline.dedupe_buses(start_number, end_number)
+    pipeline.renumber_buses(lambda number: number + 1000)
+    pipeline.save(dest)
+    return time.perf_counter() - start, dest
+
+# Function to compare the csv workflow with the Pipeline over a list of size multipliers
+# Returns 1 when the two do not write the same L5X file for every scale
+def benchmark_pipeline(programs, routines, rungs, scales):
+    folder = tempfile.mkdtemp()
+    cache_dir = tool.CACHE_DIR
+    tool.CACHE_DIR = ''
+    different = []
+    try:
+        print(f"{'Scale':>6} {'Size MB':>9} {'CSV s':>9} {'Pipeline s':>11} {'Speed-up':>9} {'Same':>5}")
+        for scale in scales:
+            source = os.path.join(folder, f"benchmark_{scale}.L5X")
+            buses = generate_l5x(source, programs * scale, routines, rungs)
+            size = os.path.getsize(source) / 1e6
+            csv_seconds, csv_dest = time_csv_workflow(source, folder, buses + 1, buses * 3)
+            pipeline_seconds, pipeline_dest = time_pipeline(source, folder, buses + 1, buses * 3)
+            with open(csv_dest, 'rb') as first, open(pipeline_dest, 'rb') as second:
+                same = first.read() == second.read()
+            if not same:
+                different.append(scale)
+            print(f"{scale:>6} {size:>9.2f} {csv_seconds:>9.3f} {pipeline_seconds:>11.3f} {csv_seconds / pipeline_seconds:>8.1f}x {str(same):>5}")
+    finally:
+        tool.CACHE_DIR = cache_dir
+        shutil.rmtree(folder)
+    for scale in different:
+        print(f"Error: the Pipeline and the csv workflow wrote different files at scale {scale}")
+    return 1 if different else 0
+
+# Operations of the suite in the order they are run, list_bus and bus_xml_list come first because the csv files
+# they write are the input of the others
+SUITE_OPERATIONS = ["list_bus", "bus_xml_list", "replace_tags_xml", "replace_bus_tags", "num_par_tag",
+                    "bus_xml_replacement", "extract_comments"]
+
+# Function to run one operation of the menu on a source file in the folder of its csv files
+def run_operation(operation, source, folder, dest, start_number, end_number, label):
+    if operation == "list_bus":
+        return tool.list_bus(source, folder)
+    elif operation == "bus_xml_list":
+        return tool.bus_xml_list(source, folder)
+    elif operation == "replace_tags_xml":
+        return tool.replace_tags_xml(source, dest, folder)
+    elif operation == "replace_bus_tags":
+        return tool.replace_bus_tags(source, dest, folder, [], start_number=start_number, end_number=end_number)
+    elif operation == "num_par_tag":
+        return tool.num_par_tag(source, dest, folder, label)
+    elif operation == "bus_xml_replacement":
+        return tool.bus_xml_replacement(source, dest, folder)
+    elif operation == "extract_comments":
+        return tool.extract_comments(source, folder)
+    raise ValueError(f"Unknown operation {operation}")
+
+# Function to time one operation, it runs in a new process so that the peak memory is the peak of that operation
+# The cache is turned off so every operation reads the source file and the output of the operation is not printed
+# The time of the garbage collections during the operation is taken with the callback of the instrumentation
+def time_operation(operation, source, folder, dest, start_number, end_number, label):
+    tool.CACHE_DIR = ''
+    collections = tool.Instrumentation(operation)
+    gc.callbacks.append(collections.gc_callback)
+    try:
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            start = time.perf_counter()
+            result = run_operation(operation, source, folder, dest, start_number, end_number, label)
+            seconds = time.perf_counter() - start
+    finally:
+        gc.callbacks.remove(collections.gc_callback)
+    return seconds, tool.peak_memory(), collections.gc_seconds, result
+
+# Function to fill the replacement columns of the csv files the way an engineer would: every tag that has a bus of
+# its own gets a new name and every bus number is moved up by offset
+def fill_replacements(tags_file, numbers_file, offset):
+    rows = tool.read_csv_rows(tags_file)
+    tool.write_csv(tags_file, ['Bus Tags', 'Count', 'Original Tags', 'Replace Tags'],
+                   [[row['Bus Tags'], row['Count'], row['Original Tags'],
+                     row['Original Tags'].strip("[]'") + "_NEW" if row['Count'] == '1' else ''] for row in rows])
+    rows = tool.read_csv_rows(numbers_file)
+    tool.write_csv(numbers_file, ['Bus Number', 'Replacement Bus Number'],
+                   [[row['Bus Number'], int(row['Bus Number']) + offset] for row in rows])
+
+# Function to time every operation of the menu on a generated project, returns the results by operation
+def run_suite(source, folder, repeat):
+    buses = max(tool.bus_reports(source)[1] or [0])
+    dest = os.path.join(folder, "suite_out" + os.path.splitext(source)[1])
+    start_number, end_number = buses + 1, buses * 3 + 1
+    label = "M-0-0-1"
+    results = {}
+    csv_files = {}
+    context = multiprocessing.get_context("spawn")
+    for operation in SUITE_OPERATIONS:
+        if operation == "replace_tags_xml":
+            fill_replacements(csv_files["list_bus"], csv_files["bus_xml_list"], buses)
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(time_operation, operation, source, folder, dest, start_number, end_number, label).result())
+        seconds, peak, gc_seconds, result = min(runs, key=lambda run: run[0])
+        if result is None:
+            print(f"{operation} failed, see the output of the tool")
+        csv_files[operation] = result
+        results[operation] = {"seconds": round(seconds, 4), "peak_mb": round(peak, 1) if peak is not None else None,
+                              "gc_seconds": round(gc_seconds, 4)}
+    return results
+
+# Function to compare the results of a run with a baseline, returns the operations that are slower or use more memory
+# than the baseline by more than tolerance (0.2 is 20 percent)
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    print(f"{'Operation':<20} {'Seconds':>9} {'Baseline':>9} {'Change':>8} {'Peak MB':>8} {'Baseline':>9} {'Change':>8}"
+          f" {'GC s':>7} {'Baseline':>9}")
+    for operation, result in results.items():
+        base = baseline.get("results", {}).get(operation)
+        if base is None:
+            print(f"{operation:<20} {result['seconds']:>9.3f} {'-':>9}")
+            continue
+        line = f"{operation:<20} {result['seconds']:>9.3f} {base['seconds']:>9.3f} {_change(result['seconds'], base['seconds']):>8}"
+        if result['peak_mb'] is not None and base.get('peak_mb') is not None:
+            line += f" {result['peak_mb']:>8.1f} {base['peak_mb']:>9.1f} {_change(result['peak_mb'], base['peak_mb']):>8}"
+        else:
+            line += f" {'-':>8} {'-':>9} {'-':>8}"
+        # baselines saved before the garbage collection time was measured do not have it
+        line += f" {result['gc_seconds']:>7.3f} {base['gc_seconds'] if 'gc_seconds' in base else '-':>9}"
+        print(line)
+        if result['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(f"{operation} is {_change(result['seconds'], base['seconds'])} slower")
+        if result['peak_mb'] is not None and base.get('peak_mb') and result['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+            regressions.append(f"{operation} uses {_change(result['peak_mb'], base['peak_mb'])} more memory")
+    return regressions
+
+# Function to format the change from a baseline value as a percentage
+def _change(value, base):
+    return f"{(value - base) / base * 100:+.0f}%" if base else "-"
+
+# Function to run the suite on a generated project, save it as a baseline or compare it with one
+# Returns the exit code: 1 when an operation regressed against the baseline, 0 otherwise
+def benchmark_suite(args):
+    project = {"format": args.format, "tasks": args.tasks, "programs": args.programs, "routines": args.routines,
+               "rungs": args.rungs, "bus_density": args.bus_density, "duplicate_ratio": args.duplicate_ratio,
+               "comment_coverage": args.comment_coverage}
+    folder = tempfile.mkdtemp()
+    try:
+        source = os.path.join(folder, "suite." + args.format)
+        generate = generate_l5k if args.format == "L5K" else generate_l5x
+        generate(source, args.programs, args.routines, args.rungs, tasks=args.tasks, bus_density=args.bus_density,
+                 duplicate_ratio=args.duplicate_ratio, comment_coverage=args.comment_coverage)
+        size = os.path.getsize(source)
+        print(f"Project: {project}, {size / 1e6:.2f} MB")
+        results = run_suite(source, folder, args.repeat)
+    finally:
+        shutil.rmtree(folder)
+
+    run = {"project": project, "size": size, "python": platform.python_version(), "platform": platform.platform(),
+           "results": results}
+    regressions = []
+    if args.baseline is not None and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="UTF-8") as file:
+            baseline = json.load(file)
+        if baseline.get("project") != project:
+            print(f"Warning: the baseline was run on another project {baseline.get('project')}")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+    else:
+        print(f"{'Operation':<20} {'Seconds':>9} {'Peak MB':>8} {'GC s':>7}")
+        for operation, result in results.items():
+            peak = result['peak_mb']
+            print(f"{operation:<20} {result['seconds']:>9.3f} {peak if peak is not None else float('nan'):>8.1f} {result['gc_seconds']:>7.3f}")
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w', encoding="UTF-8") as file:
+            json.dump(run, file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    for regression in regressions:
+        print("Regression: " + regression)
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Rockwell XML manipulation tool")
+    parser.add_argument("benchmark", choices=["rewrite", "replacer", "pipeline", "l5k", "suite"], help="Benchmark to run")
+    parser.add_argument("--programs", type=int, default=20, help="Number of programs at scale 1")
+    parser.add_argument("--routines", type=int, default=5, help="Number of routines per program")
+    parser.add_argument("--rungs", type=int, default=100, help="Number of rungs per routine")
+    parser.add_argument("--scales", type=int, nargs='+', default=[1, 2, 4, 8], help="Size multipliers")
+    parser.add_argument("--legacy", action="store_true", help="Also time the old xml_content.replace loop")
+    parser.add_argument("--keys", type=int, default=20000, help="Number of mapping rows for the replacer benchmark")
+    parser.add_argument("--texts", type=int, default=60000, help="Number of rungs for the replacer benchmark")
+    parser.add_argument("--format", choices=["L5X", "L5K"], default="L5X", help="Format of the project of the suite")
+    parser.add_argument("--tasks", type=int, default=1, help="Number of tasks the programs are shared out between")
+    parser.add_argument("--bus-density", type=float, default=0.5, help="Share of rungs that use a bus")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Share of bus rungs that reuse a bus number")
+    parser.add_argument("--comment-coverage", type=float, default=0.5, help="Share of rungs with a comment")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs of every operation of the suite, the fastest is kept")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare the suite with")
+    parser.add_argument("--save-baseline", help="Write the results of the suite to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slow-down or memory growth over the baseline that counts as a regression")
+    parser.add_argument("--scaling-tolerance", type=float, default=1.0,
+                        help="Growth of the rewrite time per MB from the smallest to the largest project that counts as not linear")
+    args = parser.parse_args()
+
+    if args.benchmark == "rewrite":
+        return benchmark_rewrite(args.programs, args.routines, args.rungs, args.scales, args.legacy, args.scaling_tolerance)
+    elif args.benchmark == "replacer":
+        benchmark_replacer(args.keys, args.texts)
+    elif args.benchmark == "pipeline":
+        return benchmark_pipeline(args.programs, args.routines, args.rungs, args.scales)
+    elif args.benchmark == "l5k":
+        benchmark_l5k(args.programs, args.routines, args.rungs, args.scales)
+    elif args.benchmark == "suite":
+        return benchmark_suite(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# the scripts are modules at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xml_manipulation_tool_rockwell as tool
+
+# Folder of the fixture exports and of the reports the first version of the tool made from them
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+# The cache and the project index are turned off so every test reads its file, also for the front ends that turn the
+# cache on, the tests of the cache turn it on in a folder of their own
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setenv('XML_TOOL_CACHE_DIR', '')
+    monkeypatch.setattr(tool, 'CACHE_DIR', '')
+    monkeypatch.setattr(tool, 'INDEX_DB', '')
+
+
+# Function to copy a fixture export to a test folder, so a test can write over it
+@pytest.fixture
+def fixture_copy(tmp_path):
+    def copy(name):
+        path = tmp_path / name
+        shutil.copyfile(os.path.join(FIXTURES, name), path)
+        return str(path)
+    return copy
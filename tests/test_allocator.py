@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+# Buses shared by more than one tag in plant.L5X
+SHARED_BUSES = ['Bus[1].Obj', 'Bus[2].Obj', 'Bus[3].Obj']
+
+
+# The lowest free number is taken, the numbers in use and the reserved ranges are skipped
+def test_allocate_skips_allocated_and_reserved():
+    allocator = tool.BusNumberAllocator(10, 20, allocated=[10, 12, 25], reserved=[(13, 15), (19, 30)])
+    assert [allocator.allocate() for _ in range(5)] == [11, 16, 17, 18, -1]
+    assert allocator.free_count() == 0
+
+
+# A full range keeps answering -1 and a released number is handed out again
+def test_allocate_exhaustion_and_release():
+    allocator = tool.BusNumberAllocator(1, 3)
+    assert [allocator.allocate() for _ in range(4)] == [1, 2, 3, -1]
+    assert allocator.allocate() == -1
+    allocator.release(2)
+    assert allocator.allocate() == 2
+    assert allocator.allocate() == -1
+
+
+# Every area has its own cursor inside the range, the areas that are not configured share the cursor of the range
+def test_allocate_areas():
+    allocator = tool.BusNumberAllocator(1, 10, allocated=[2], areas={'Conveyor': (6, 7)})
+    assert allocator.allocate('Conveyor') == 6
+    assert allocator.allocate('Mixer') == 1
+    assert allocator.allocate('Spare') == 3
+    assert allocator.allocate('Conveyor') == 7
+    assert allocator.allocate('Conveyor') == -1
+    assert allocator.allocate() == 4
+    assert set(allocator.cursors) == {None, 'Conveyor'}
+    assert allocator.capacity() == {None: (1, 10, 4, 10), 'Conveyor': (6, 7, 0, 2)}
+
+
+@pytest.mark.parametrize('start_number,end_number,areas', [(10, 5, None), (1, 10, {'Conveyor': (5, 11)}),
+                                                           (1, 10, {'Conveyor': (6, 5)})])
+def test_allocator_rejects_bad_ranges(start_number, end_number, areas):
+    with pytest.raises(ValueError):
+        tool.BusNumberAllocator(start_number, end_number, areas=areas)
+
+
+def test_parse_ranges():
+    assert tool.parse_ranges("100-199, 250,300-310,") == [(100, 199), (250, 250), (300, 310)]
+
+
+# Every tag but the first of a shared bus gets a free number, the rungs of the other tags are left alone
+def test_dedupe_buses():
+    doc = tool.load_document(os.path.join(FIXTURES, "plant.L5X"))
+    moves, allocator = tool.dedupe_buses(doc, SHARED_BUSES, 20, 30, reserved=[(20, 21)])
+    assert moves == {('Bus[1].Obj', 'M1_0_10'): 'Bus[22].Obj', ('Bus[2].Obj', 'Spare_2'): 'Bus[23].Obj',
+                     ('Bus[3].Obj', 'Pump_1'): 'Bus[24].Obj'}
+    rows = tool.bus_index(doc).rows()
+    assert [row for row in rows if row[1] > 1] == []
+    assert ['Bus[1].Obj', 1, ['M1_0_1']] in rows
+    assert ['Bus[22].Obj', 1, ['M1_0_10']] in rows
+    assert allocator.free_count() == 6
+
+
+# The numbers of a program come from its area
+def test_dedupe_buses_with_areas():
+    doc = tool.load_document(os.path.join(FIXTURES, "plant.L5X"))
+    moves, _ = tool.dedupe_buses(doc, SHARED_BUSES, 20, 40, areas={'Spare': (35, 40)})
+    assert moves == {('Bus[1].Obj', 'M1_0_10'): 'Bus[20].Obj', ('Bus[2].Obj', 'Spare_2'): 'Bus[35].Obj',
+                     ('Bus[3].Obj', 'Pump_1'): 'Bus[21].Obj'}
+
+
+# Nothing is changed when the range runs out of numbers
+def test_dedupe_buses_exhausted():
+    doc = tool.load_document(os.path.join(FIXTURES, "plant.L5X"))
+    moves, allocator = tool.dedupe_buses(doc, SHARED_BUSES, 20, 21)
+    assert moves is None
+    assert doc.edits == {}
+    assert allocator.free_count() == 0
+
+
+# The buses of the rungs that use an HWBus are in use too, COP(HWBus[1].Obj,Bus[7].Obj,1) keeps 7 from being taken
+def test_dedupe_buses_skips_the_buses_of_hwbus_rungs(tmp_path):
+    path = os.path.join(FIXTURES, "plant.L5X")
+    assert 7 in tool.bus_index(path).bus_numbers()
+    moves, _ = tool.dedupe_buses(tool.load_document(path), SHARED_BUSES, 1, 20)
+    assert moves == {('Bus[1].Obj', 'M1_0_10'): 'Bus[5].Obj', ('Bus[2].Obj', 'Spare_2'): 'Bus[6].Obj',
+                     ('Bus[3].Obj', 'Pump_1'): 'Bus[8].Obj'}
+    # the numbers of a selection are taken from the bytes of the whole project
+    doc = tool.load_document(path, tool.routine_selection(programs=["Mixer"]))
+    moves, _ = tool.dedupe_buses(doc, ['Bus[3].Obj'], 7, 8)
+    assert moves == {('Bus[3].Obj', 'Pump_1'): 'Bus[8].Obj'}
+    # the reviewed csv of list_bus leads to the same numbers
+    dest = str(tmp_path / "plant.L5X")
+    tool.list_bus(path, str(tmp_path))
+    assert tool.replace_bus_tags(path, dest, str(tmp_path), start_number=1, end_number=20) == 3
+    assert 'Bus[7].Obj' not in [row[0] for row in tool.bus_index(dest).rows()]
+    assert ['Bus[8].Obj', 1, ['Pump_1']] in tool.bus_index(dest).rows()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+
+
+# Function to write a file in place with a new modification time, so a change of the same size is seen
+def write_file(path, content):
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'wb') as file:
+        file.write(content)
+    os.utime(path, ns=(mtime + 1000000000, mtime + 1000000000))
+
+
+# The index cache of a test folder
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool, 'CACHE_DIR', str(tmp_path / "cache"))
+    return tool.index_cache()
+
+
+# Function to make bus_index fail, so a report can only come from the cache
+def cache_only(monkeypatch):
+    def bus_index(source, stream=None):
+        raise AssertionError("the reports were not taken from the cache")
+    monkeypatch.setattr(tool, 'bus_index', bus_index)
+
+
+# The entry of a file is keyed by the blake2b hash of its content, a copy under another name finds it
+def test_reports_are_read_from_the_cache(cache, fixture_copy, monkeypatch):
+    path = fixture_copy("plant.L5X")
+    reports = tool.bus_reports(path)
+    with open(path, 'rb') as file:
+        key = hashlib.blake2b(file.read(), digest_size=20).hexdigest()
+    assert cache.file_key(path) == key
+    assert os.path.exists(cache.entry_path(key, 'bus_reports'))
+    copy = os.path.join(os.path.dirname(path), "copy.L5X")
+    os.rename(path, copy)
+    cache_only(monkeypatch)
+    assert tool.bus_reports(copy) == reports
+
+
+# A file that changed is hashed again even when its size is the same, its reports are built again
+def test_changed_file_is_not_read_from_the_cache(cache, fixture_copy):
+    path = fixture_copy("plant.L5X")
+    key = cache.file_key(path)
+    assert 4 in tool.bus_reports(path)[1]
+    with open(path, 'rb') as file:
+        content = file.read()
+    write_file(path, content.replace(b"Bus[4].Obj", b"Bus[5].Obj"))
+    assert cache.file_key(path) != key
+    numbers = tool.bus_reports(path)[1]
+    assert 5 in numbers and 4 not in numbers
+
+
+# The routines of a file are stored while they are read and read back from the cache the next time
+def test_routines_are_read_from_the_cache(cache, fixture_copy, monkeypatch):
+    path = fixture_copy("plant.L5X")
+    routines = list(tool.iter_source_routines(path, True))
+    assert os.path.exists(cache.entry_path(cache.file_key(path), 'routines'))
+    monkeypatch.setattr(tool, 'load_document', None)
+    assert list(tool.iter_source_routines(path, True)) == routines
+
+
+# The least recently used entries are removed when the cache goes over its size limit
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = tool.IndexCache(str(tmp_path / "cache"), size_limit=2500)
+    for key in ("a", "b"):
+        cache.get(key, 'data', lambda: bytes(1000))
+    os.utime(cache.entry_path("a", 'data'), (1000000000, 1000000000))
+    os.utime(cache.entry_path("b", 'data'), (1000000100, 1000000100))
+    # reading an entry makes it the most recently used one
+    assert cache.get("a", 'data', lambda: None) == bytes(1000)
+    cache.get("c", 'data', lambda: bytes(1000))
+    assert [os.path.exists(cache.entry_path(key, 'data')) for key in ("a", "b", "c")] == [True, False, True]
+
+
+# clear_cache removes every file of the cache
+def test_clear_cache(cache, fixture_copy):
+    tool.bus_reports(fixture_copy("plant.L5X"))
+    files = len(os.listdir(cache.folder))
+    assert files > 0
+    assert tool.clear_cache() == files
+    assert cache.size() == (0, 0)
+    assert os.listdir(cache.folder) == []
+
+
+# The entries are unpickled, so a folder other users can write to is refused and the cache is turned off with one error
+def test_folder_other_users_can_write_to_is_refused(tmp_path, monkeypatch, capsys):
+    folder = tmp_path / "cache"
+    folder.mkdir()
+    os.chmod(folder, 0o777)
+    with pytest.raises(PermissionError):
+        tool.IndexCache(str(folder))
+    monkeypatch.setattr(tool, 'CACHE_DIR', str(folder))
+    monkeypatch.setattr(tool, '_index_cache_error', None)
+    assert tool.index_cache() is None
+    assert tool.index_cache() is None
+    assert capsys.readouterr().out.count("Error: The cache is turned off") == 1
+
+
+# use_cache turns the cache on in its default folder and keeps the folder or the empty value of XML_TOOL_CACHE_DIR
+def test_use_cache(tmp_path, monkeypatch):
+    monkeypatch.delenv('XML_TOOL_CACHE_DIR')
+    tool.use_cache()
+    assert tool.CACHE_DIR == tool.DEFAULT_CACHE_DIR
+    assert os.environ['XML_TOOL_CACHE_DIR'] == tool.DEFAULT_CACHE_DIR
+    monkeypatch.setenv('XML_TOOL_CACHE_DIR', str(tmp_path))
+    tool.use_cache()
+    assert tool.CACHE_DIR == str(tmp_path)
+    monkeypatch.setenv('XML_TOOL_CACHE_DIR', '')
+    tool.use_cache()
+    assert tool.CACHE_DIR == ''
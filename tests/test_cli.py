@@ -0,0 +1,115 @@
+import csv
+import os
+import shutil
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+import xml_manipulation_tool_rockwell_cli as cli
+from conftest import FIXTURES
+
+PLANT = os.path.join(FIXTURES, "plant.L5X")
+
+
+# Function to read the bytes of a file
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+# Folder of the csv files, the relative paths of the arguments are in the test folder
+@pytest.fixture
+def csv_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "reports"
+    folder.mkdir()
+    return str(folder)
+
+
+# The report operations run in order and write the files of the first version
+def test_report_operations(csv_dir):
+    assert cli.main([PLANT, "--csv-dir", csv_dir, "list-bus", "bus-list"]) == 0
+    expected = os.path.join(FIXTURES, "expected", "plant")
+    assert read_bytes(os.path.join(csv_dir, "bus_list_numbers.csv")) == \
+        read_bytes(os.path.join(expected, "bus_list_numbers.csv"))
+    with open(os.path.join(csv_dir, "bus_count_with_tags.csv"), newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    with open(os.path.join(expected, "bus_count_with_tags.csv"), newline='', encoding='utf-8') as file:
+        assert sorted(rows) == sorted(csv.reader(file))
+
+
+# A file whose name looks like a glob pattern is a single source and not a fleet scan
+def test_file_with_glob_characters(csv_dir, tmp_path):
+    source = str(tmp_path / "Line[1].L5X")
+    shutil.copyfile(PLANT, source)
+    assert cli.main([source, "--csv-dir", csv_dir, "bus-list"]) == 0
+    assert read_bytes(os.path.join(csv_dir, "bus_list_numbers.csv")) == \
+        read_bytes(os.path.join(FIXTURES, "expected", "plant", "bus_list_numbers.csv"))
+
+
+# The operations of a chain run on one document that is written once to dest, an operation reads the csv files
+# written before it and the reports see the edits made before them
+def test_chained_edits(csv_dir, tmp_path):
+    dest = str(tmp_path / "plant_new.L5X")
+    assert cli.main([PLANT, "--csv-dir", csv_dir, "--dest", dest, "list-bus", "dedupe-buses", "bus-list",
+                     "--start-number", "20", "--end-number", "30"]) == 0
+    rows = tool.bus_index(dest).rows()
+    assert [row for row in rows if row[1] > 1] == []
+    assert ['Bus[20].Obj', 1, ['M1_0_10']] in rows
+    with open(os.path.join(csv_dir, "bus_list_numbers.csv"), newline='', encoding='utf-8') as file:
+        assert ['20'] in list(csv.reader(file))
+    assert b"Bus[20].Obj" not in read_bytes(PLANT)
+
+
+# --in-place writes the edits back to the source
+def test_in_place(csv_dir, fixture_copy):
+    source = fixture_copy("plant.L5X")
+    assert cli.main([source, "--csv-dir", csv_dir, "--in-place", "list-bus", "dedupe-buses",
+                     "--start-number", "20", "--end-number", "30"]) == 0
+    assert ['Bus[20].Obj', 1, ['M1_0_10']] in tool.bus_index(source).rows()
+
+
+# Invalid arguments exit with 2 before any operation runs
+@pytest.mark.parametrize('arguments', [
+    [PLANT, "dedupe-buses", "--start-number", "20", "--end-number", "30"],
+    [PLANT, "--dest", "plant_new.L5X", "--in-place", "list-bus"],
+    [PLANT, "--dest", "plant_new.L5X", "dedupe-buses"],
+    [PLANT, "--dest", "plant_new.L5X", "count-label"],
+    [PLANT, "--reserved", "20-x", "list-bus"],
+    [os.path.join(FIXTURES, "missing.L5X"), "list-bus"],
+    [PLANT, "rename-buses"],
+])
+def test_invalid_arguments(arguments, csv_dir, tmp_path):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(arguments + ["--csv-dir", csv_dir])
+    assert exit_info.value.code == 2
+    assert os.listdir(tmp_path) == ["reports"]
+
+
+# An operation that fails stops the chain with 1 and the L5X file is not written
+def test_failed_operation_does_not_write_the_file(csv_dir, tmp_path):
+    dest = str(tmp_path / "plant_new.L5X")
+    # replace-bus-numbers needs the bus_list_numbers.csv of bus-list
+    assert cli.main([PLANT, "--csv-dir", csv_dir, "--dest", dest, "replace-bus-numbers", "list-bus"]) == 1
+    assert not os.path.exists(dest)
+    assert not os.path.exists(os.path.join(csv_dir, "bus_count_with_tags.csv"))
+
+
+
+# A hand-edited csv file with a cell that is not a number stops the chain with 1, the error names the row and the
+# L5X file is not written
+@pytest.mark.parametrize('operation,file_name,content,row', [
+    ("dedupe-buses", "bus_count_with_tags.csv",
+     "Bus Tags,Count,Original Tags,Replace Tags\nBus[1].Obj,two,\"['M1_0_1', 'M1_0_10']\",\n", 2),
+    ("replace-tags", "bus_count_with_tags.csv",
+     "Bus Tags,Count,Original Tags,Replace Tags\nBus[4].Obj,one,['Valve_1'],Valve_9\n", 2),
+    ("replace-bus-numbers", "bus_list_numbers.csv", "Bus Number,Replacement Bus Number\n4,40\n4x,41\n", 3),
+])
+def test_csv_cell_that_is_not_a_number(operation, file_name, content, row, csv_dir, tmp_path, capsys):
+    with open(os.path.join(csv_dir, file_name), 'w', encoding='utf-8') as file:
+        file.write(content)
+    dest = str(tmp_path / "plant_new.L5X")
+    assert cli.main([PLANT, "--csv-dir", csv_dir, "--dest", dest, operation,
+                     "--start-number", "20", "--end-number", "30"]) == 1
+    assert not os.path.exists(dest)
+    assert f"in row {row} of '{os.path.join(csv_dir, file_name)}' is not a number" in capsys.readouterr().out
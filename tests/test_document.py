@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+
+# Function to read the bytes of a file
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+# Function to find the position of the first text of a document that holds a string
+def text_position(doc, part):
+    return next(index for index, text in doc.iter_texts() if part in text)
+
+
+# A document that was not edited is written back byte for byte
+@pytest.mark.parametrize('name', ["plant.L5X", "generated.L5X", "generated.L5K"])
+def test_unedited_save_is_byte_identical(name, tmp_path):
+    source = os.path.join(FIXTURES, name)
+    dest = str(tmp_path / name)
+    tool.load_document(source).save(dest)
+    assert read_bytes(dest) == read_bytes(source)
+
+
+# An edit only changes the bytes of its own Text element
+def test_edit_is_spliced_into_the_original_bytes(tmp_path):
+    source = os.path.join(FIXTURES, "plant.L5X")
+    dest = str(tmp_path / "plant.L5X")
+    doc = tool.load_document(source)
+    doc.set_text(text_position(doc, "Bus[12].Obj"), "MOV(Spd_1,Bus[13].Obj);")
+    doc.save(dest)
+    original, written = read_bytes(source), read_bytes(dest)
+    assert written == original.replace(b"CPT(Speed[Idx[2]],(Ref_1+Ofs)*2)MOV(Spd_1,Bus[12].Obj);",
+                                       b"MOV(Spd_1,Bus[13].Obj);")
+
+
+# Escaped character data is written back escaped
+def test_edit_of_escaped_text(tmp_path):
+    dest = str(tmp_path / "plant.L5X")
+    doc = tool.load_document(os.path.join(FIXTURES, "plant.L5X"))
+    doc.set_text(text_position(doc, "Level_Lo"), "GRT(Level,10)LES(Level,<90>)OTE(AB-2.Cmd);")
+    doc.save(dest)
+    assert b"<Text>GRT(Level,10)LES(Level,&lt;90&gt;)OTE(AB-2.Cmd);</Text>" in read_bytes(dest)
+    reloaded = tool.load_document(dest)
+    assert reloaded.get_text(text_position(reloaded, "Level")) == "GRT(Level,10)LES(Level,<90>)OTE(AB-2.Cmd);"
+
+
+# A text that holds ]]> is written as a run of CDATA sections, it is read back whole and can be edited again
+def test_cdata_end_in_text_round_trip(tmp_path):
+    first = str(tmp_path / "first.L5X")
+    second = str(tmp_path / "second.L5X")
+    doc = tool.load_document(os.path.join(FIXTURES, "plant.L5X"))
+    index = text_position(doc, "Valve_1")
+    doc.set_text(index, "MOV(Valve]]>1,Bus[4].Obj)OTE(AB-1.Cmd);")
+    doc.save(first)
+
+    reloaded = tool.load_document(first)
+    assert reloaded.text_count() == doc.text_count()
+    assert reloaded.get_text(index) == "MOV(Valve]]>1,Bus[4].Obj)OTE(AB-1.Cmd);"
+    # the byte scan of the reports reads the same text as the parsed tree
+    assert ['Bus[4].Obj', 1, ['Valve]]>1']] in tool.bus_reports(first)[0]
+    assert tool.bus_reports(first) == tool.bus_index(reloaded).reports()
+
+    reloaded.set_text(index, reloaded.get_text(index).replace("Bus[4]", "Bus[5]"))
+    reloaded.save(second)
+    again = tool.load_document(second)
+    assert again.get_text(index) == "MOV(Valve]]>1,Bus[5].Obj)OTE(AB-1.Cmd);"
+    assert ['Bus[5].Obj', 1, ['Valve]]>1']] in tool.bus_reports(second)[0]
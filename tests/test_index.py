@@ -0,0 +1,119 @@
+import os
+import shutil
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+
+# Function to get the routines of a source without the Text positions
+def routine_contents(routines):
+    return [(routine.task, routine.program, routine.routine,
+             [(rung.number, rung.type, rung.text, rung.comments) for rung in routine.rungs])
+            for routine in routines]
+
+
+# Function to write a file in place with a new modification time, so a change of the same size is seen
+def write_file(path, content):
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'wb') as file:
+        file.write(content)
+    os.utime(path, ns=(mtime + 1000000000, mtime + 1000000000))
+
+
+# Function to check that an incremental index holds what a full read of its file gives
+def assert_matches_full_read(index):
+    doc = tool.load_document(index.path)
+    assert routine_contents(index.iter_routines(True)) == routine_contents(doc.iter_routines(True))
+    assert index.bus_reports() == tool.bus_index(doc).reports()
+    selection = tool.routine_selection(programs=["Mixer"])
+    assert index.bus_reports(selection) == tool.bus_reports(index.path, None, selection)
+
+
+# After an edit only the changed routine is parsed again and the index matches a full read
+def test_incremental_index_matches_a_rebuild_after_an_edit(tmp_path):
+    path = str(tmp_path / "plant.L5X")
+    shutil.copyfile(os.path.join(FIXTURES, "plant.L5X"), path)
+    index = tool.IncrementalIndex(path)
+    assert index.refresh() is not None
+    assert_matches_full_read(index)
+    assert index.refresh() is None
+
+    with open(path, 'rb') as file:
+        content = file.read()
+    write_file(path, content.replace(b"MOV(Valve_1,Bus[4].Obj)", b"MOV(Valve_1,Bus[1].Obj)MOV(Valve_2,Bus[40].Obj)"))
+    parsed, routines = index.refresh()
+    assert parsed == 1
+    assert index.records is None
+    assert_matches_full_read(index)
+    assert ['Bus[1].Obj', 3, ['M1_0_1', 'M1_0_10', 'Valve_1']] in index.bus_reports()[0]
+
+
+# Programs that are removed or scheduled in another task are seen by the next refresh
+def test_incremental_index_after_a_structural_change(tmp_path):
+    path = str(tmp_path / "plant.L5X")
+    shutil.copyfile(os.path.join(FIXTURES, "plant.L5X"), path)
+    index = tool.IncrementalIndex(path)
+    index.refresh()
+    with open(path, 'rb') as file:
+        content = file.read()
+    start = content.index(b'<Program Name="Spare"')
+    end = content.index(b'</Program>', start) + len(b'</Program>\n')
+    content = content[:start] + content[end:]
+    # Conveyor moves from MainTask to Task2
+    content = content.replace(b'<ScheduledProgram Name="Conveyor"/>\n', b'')
+    content = content.replace(b'<ScheduledProgram Name="Mixer"/>', b'<ScheduledProgram Name="Mixer"/>\n<ScheduledProgram Name="Conveyor"/>')
+    write_file(path, content)
+    index.refresh()
+    assert_matches_full_read(index)
+    assert {routine.task for routine in index.iter_routines()} == {"Task2"}
+
+
+# L5K files are read as a whole on every refresh
+def test_incremental_index_of_an_l5k_file(tmp_path):
+    path = str(tmp_path / "generated.L5K")
+    shutil.copyfile(os.path.join(FIXTURES, "generated.L5K"), path)
+    index = tool.IncrementalIndex(path)
+    index.refresh()
+    with open(path, 'rb') as file:
+        content = file.read()
+    write_file(path, content.replace(b"Bus[3].Obj", b"Bus[30].Obj"))
+    index.refresh()
+    assert index.records is not None
+    assert index.bus_reports() == tool.bus_reports(path)
+    assert 30 in index.bus_reports()[1]
+
+
+# Function to get the SQLite project index of a fixture export
+def project_index(tmp_path, name):
+    index = tool.ProjectIndex(str(tmp_path / "index.sqlite"))
+    path = os.path.join(FIXTURES, name)
+    index.refresh(path, lambda: tool.iter_source_routines(path, include_aoi=True))
+    return index
+
+
+# The reports of the project index are the reports of the file
+def test_project_index_reports(tmp_path):
+    index = project_index(tmp_path, "plant.L5X")
+    assert index.bus_reports() == tool.bus_reports(os.path.join(FIXTURES, "plant.L5X"))
+    index.close()
+
+
+# Add-On Instructions have no task and the programs that are not in any task are named like in the comment export
+def test_project_index_task_names(tmp_path):
+    index = project_index(tmp_path, "plant.L5X")
+    assert index.programs_with_uncommented_rungs() == [
+        ("MainTask", "Conveyor", 3), ("Task2", "Mixer", 2), (tool.UNSCHEDULED_TASK, "Spare", 1)]
+    assert [(rung.task, rung.program) for rung in index.uncommented_rungs()][-1] == (tool.UNSCHEDULED_TASK, "Spare")
+    assert [rung.task for rung in index.rungs_using("Run")] == [None]
+    index.close()
+
+
+# A bus number is found in every [n].Obj operand, HWBus and later operands included
+def test_project_index_rungs_using_bus(tmp_path):
+    index = project_index(tmp_path, "plant.L5X")
+    assert [(rung.program, rung.number) for rung in index.rungs_using_bus(1)] == [
+        ("Conveyor", "0"), ("Conveyor", "1"), ("Conveyor", "4")]
+    assert [(rung.program, rung.number) for rung in index.rungs_using_bus(7)] == [("Conveyor", "4")]
+    assert index.rungs_using_bus(7) == index.rungs_using("Bus[7].Obj")
+    assert [(rung.program, rung.number) for rung in index.rungs_using_bus(2)] == [("Conveyor", "2"), ("Spare", "0")]
+    index.close()
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+# The same generated project exported as L5X and as L5K
+L5X = os.path.join(FIXTURES, "generated.L5X")
+L5K = os.path.join(FIXTURES, "generated.L5K")
+
+
+# Function to get the routines of a source without the Text positions and the comment languages, which an L5K
+# export does not have
+def routine_contents(source, selection=None):
+    return [(routine.task, routine.program, routine.routine,
+             [(rung.number, rung.type, rung.text, None if rung.comments is None else [text for _, text in rung.comments])
+              for rung in routine.rungs])
+            for routine in tool.load_document(source, selection).iter_routines(True)]
+
+
+def test_l5k_routines_match_l5x():
+    assert routine_contents(L5K) == routine_contents(L5X)
+
+
+@pytest.mark.parametrize('selection', [None, tool.routine_selection(tasks=["Task_1"]),
+                                       tool.routine_selection(programs=["Program_1"], routines=["Routine_1"])])
+def test_l5k_bus_reports_match_l5x(selection):
+    assert tool.bus_reports(L5K, None, selection) == tool.bus_reports(L5X, None, selection)
+    assert routine_contents(L5K, selection) == routine_contents(L5X, selection)
+
+
+# The report files are the same but for the language of the comments
+def test_l5k_report_files_match_l5x(tmp_path):
+    for name, source in (("l5x", L5X), ("l5k", L5K)):
+        folder = tmp_path / name
+        folder.mkdir()
+        tool.list_bus(source, str(folder))
+        tool.bus_xml_list(source, str(folder))
+        tool.extract_comments(source, str(folder))
+    for name in ("bus_count_with_tags.csv", "bus_list_numbers.csv"):
+        assert (tmp_path / "l5k" / name).read_bytes() == (tmp_path / "l5x" / name).read_bytes()
+    l5x_comments = (tmp_path / "l5x" / "extracted_comments_under_rungs.csv").read_text(encoding='utf-8')
+    l5k_comments = (tmp_path / "l5k" / "extracted_comments_under_rungs.csv").read_text(encoding='utf-8')
+    assert l5k_comments == l5x_comments.replace(",en-US,", ",,")
+
+
+# A renumbered L5K export only changes the renumbered rungs and reads back like the renumbered L5X export
+def test_l5k_renumber_matches_l5x(tmp_path):
+    replacement = tool.bus_replacements([(3, 103), (7, 107)])
+    saved = {}
+    for source in (L5X, L5K):
+        doc = tool.load_document(source)
+        assert tool.renumber_buses(doc, replacement) == 4
+        saved[source] = str(tmp_path / os.path.basename(source))
+        doc.save(saved[source])
+    assert tool.bus_reports(saved[L5K]) == tool.bus_reports(saved[L5X])
+    with open(L5K, 'rb') as file:
+        original = file.read()
+    with open(saved[L5K], 'rb') as file:
+        written = file.read()
+    assert written == original.replace(b"Bus[3].Obj", b"Bus[103].Obj").replace(b"Bus[7].Obj", b"Bus[107].Obj")
@@ -0,0 +1,43 @@
+import os
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+PLANT = os.path.join(FIXTURES, "plant.L5X")
+
+
+# Every label is counted in one pass, a label inside another one is counted like str.count
+def test_count_labels():
+    with open(PLANT, encoding='utf-8') as file:
+        content = file.read()
+    assert tool.count_labels(content, ["AB-1", "AB-2", "M2-0-1"]) == {"AB-1": 4, "AB-2": 1, "M2-0-1": 0}
+    assert tool.count_labels("AB-10 AB-1", ["AB-1", "AB-10"]) == {"AB-1": 2, "AB-10": 1}
+
+
+# Every label of the csv file is counted in one pass and the instances of the chosen label are numbered in order
+def test_num_par_tag(tmp_path):
+    (tmp_path / "bus_count_with_tags.csv").write_text(
+        "Bus Tags,Count,Original Tags,Replace Tags\nBus[4].Obj,1,['AB_1'],\nBus[3].Obj,2,\"['AB_2', 'M2_0_1']\",\n",
+        encoding='utf-8')
+    dest = str(tmp_path / "plant.L5X")
+    counts = {}
+    numbered = tool.num_par_tag(PLANT, dest, str(tmp_path), lambda label_dict: counts.update(label_dict) or "AB-1")
+    assert counts == {"AB-1": 4, "AB-2": 1, "M2-0-1": 0}
+    assert numbered == 4
+    with open(PLANT, 'rb') as file:
+        expected = file.read()
+    expected = expected.replace(b"[XIC(AB-1.Ok) ,XIO(AB-1.Fault) ]OTE(AB-1.Cmd);",
+                                b"[XIC(AB-1type1.Ok) ,XIO(AB-1type2.Fault) ]OTE(AB-1type3.Cmd);")
+    expected = expected.replace(b"OTE(AB-1.Cmd);", b"OTE(AB-1type4.Cmd);")
+    with open(dest, 'rb') as file:
+        assert file.read() == expected
+
+
+# A label that is not in the csv file numbers nothing and the file is written unchanged
+def test_num_par_tag_unknown_label(tmp_path):
+    (tmp_path / "bus_count_with_tags.csv").write_text(
+        "Bus Tags,Count,Original Tags,Replace Tags\nBus[4].Obj,1,['AB_1'],\n", encoding='utf-8')
+    dest = str(tmp_path / "plant.L5X")
+    assert tool.num_par_tag(PLANT, dest, str(tmp_path), "AB-9") == 0
+    with open(PLANT, 'rb') as source, open(dest, 'rb') as file:
+        assert file.read() == source.read()
@@ -0,0 +1,46 @@
+import json
+import os
+import stat
+import threading
+from multiprocessing.connection import Listener
+
+import xml_manipulation_tool_rockwell_process as process
+
+
+def test_process_file_is_only_readable_by_the_user(tmp_path):
+    path = str(tmp_path / "cache" / "server.json")
+    process.write_process_file(path, "address", b"key")
+    with open(path, encoding="UTF-8") as file:
+        assert json.load(file) == {'address': "address", 'authkey': b"key".hex(), 'pid': os.getpid()}
+    if os.name != 'nt':
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_only_the_own_process_file_is_removed(tmp_path):
+    path = str(tmp_path / "server.json")
+    with open(path, 'w', encoding="UTF-8") as file:
+        json.dump({'pid': os.getpid() + 1}, file)
+    process.remove_process_file(path)
+    assert os.path.exists(path)
+    process.write_process_file(path, "address", b"key")
+    process.remove_process_file(path)
+    assert not os.path.exists(path)
+
+
+def test_connect_to_the_address_of_the_file(tmp_path):
+    path = str(tmp_path / "worker.json")
+    assert process.connect_process(path) is None
+    authkey = os.urandom(32)
+    with Listener(('localhost', 0), authkey=authkey) as listener:
+        process.write_process_file(path, listener.address, authkey)
+
+        def answer():
+            with listener.accept() as connection:
+                connection.send(connection.recv() + 1)
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+        with process.connect_process(path) as connection:
+            connection.send(41)
+            assert connection.recv() == 42
+        thread.join()
@@ -0,0 +1,109 @@
+import csv
+import json
+import os
+
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+# Fixture exports with the folder of the reports the first version of the tool made from them
+PROJECTS = [("plant.L5X", "plant"), ("generated.L5X", "generated")]
+
+
+# Function to read the rows of a csv file
+def csv_rows(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+# Function to read the bytes of a file
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+# Function to get the source of an operation the way it is given: a path (scanned from its bytes), a parsed
+# document or a path read in streaming mode
+def report_source(name, kind):
+    path = os.path.join(FIXTURES, name)
+    if kind == 'document':
+        return path, tool.load_document(path), None
+    return path, path, kind == 'stream'
+
+
+SOURCE_KINDS = ['path', 'document', 'stream']
+
+
+# The bus list has the rows of the first version, which wrote them in no particular order
+@pytest.mark.parametrize('kind', SOURCE_KINDS)
+@pytest.mark.parametrize('name,expected', PROJECTS)
+def test_list_bus_matches_the_first_version(name, expected, kind, tmp_path):
+    _, source, stream = report_source(name, kind)
+    written = tool.list_bus(source, str(tmp_path), stream)
+    rows = csv_rows(written)
+    expected_rows = csv_rows(os.path.join(FIXTURES, "expected", expected, "bus_count_with_tags.csv"))
+    assert rows[0] == expected_rows[0]
+    assert sorted(rows[1:]) == sorted(expected_rows[1:])
+    # the rows are sorted by bus number
+    numbers = [tool.bus_number(row[0]) for row in rows[1:]]
+    assert numbers == sorted(numbers)
+
+
+# The bus number list is byte for byte the file of the first version
+@pytest.mark.parametrize('kind', SOURCE_KINDS)
+@pytest.mark.parametrize('name,expected', PROJECTS)
+def test_bus_xml_list_matches_the_first_version(name, expected, kind, tmp_path):
+    _, source, stream = report_source(name, kind)
+    written = tool.bus_xml_list(source, str(tmp_path), stream)
+    assert read_bytes(written) == read_bytes(os.path.join(FIXTURES, "expected", expected, "bus_list_numbers.csv"))
+
+
+# Rungs with an HWBus are left out of the bus reports, the description of the Bus tag is not a rung
+def test_bus_reports_skip_hwbus_rungs_and_tag_descriptions():
+    rows, numbers = tool.bus_reports(os.path.join(FIXTURES, "plant.L5X"))
+    assert 7 not in numbers
+    assert [row for row in rows if row[0] == 'Bus[1].Obj'] == [['Bus[1].Obj', 2, ['M1_0_1', 'M1_0_10']]]
+
+
+# A selection only reports the buses of the selected routines
+def test_bus_reports_of_a_selection():
+    path = os.path.join(FIXTURES, "plant.L5X")
+    selection = tool.routine_selection(programs=["Mixer"], routines=["Dosing"])
+    assert tool.bus_reports(path, None, selection) == ([['Bus[4].Obj', 1, ['Valve_1']]], [4])
+    assert tool.bus_reports(tool.load_document(path, selection)) == ([['Bus[4].Obj', 1, ['Valve_1']]], [4])
+
+
+# The txt and csv comment files are byte for byte the files of the first version
+@pytest.mark.parametrize('kind', SOURCE_KINDS)
+@pytest.mark.parametrize('name,expected', PROJECTS)
+def test_extract_comments_matches_the_first_version(name, expected, kind, tmp_path):
+    _, source, stream = report_source(name, kind)
+    written = tool.extract_comments(source, str(tmp_path), stream)
+    assert [os.path.basename(path) for path in written] == ["extracted_comments_under_rungs.txt",
+                                                            "extracted_comments_under_rungs.csv"]
+    for path in written:
+        assert read_bytes(path) == read_bytes(os.path.join(FIXTURES, "expected", expected, os.path.basename(path)))
+
+
+# Every language of a comment gets a row and the jsonl records hold them together
+def test_comments_of_every_language(tmp_path):
+    rung = tool.RungRecord(0, "MainTask", "Conveyor", "Main", "0", "N", "XIC(A)OTE(B);",
+                           (("en-US", "Infeed motor"), ("de-DE", "Einlaufmotor")))
+    assert tool.rung_comment_rows(rung) == [["MainTask", "Conveyor", "Main", "0", "N", "en-US", "Infeed motor"],
+                                            ["MainTask", "Conveyor", "Main", "0", "N", "de-DE", "Einlaufmotor"]]
+    assert tool.rung_comment_record(rung)['comments'] == [{'language': "en-US", 'comment': "Infeed motor"},
+                                                          {'language': "de-DE", 'comment': "Einlaufmotor"}]
+
+
+# The jsonl file has a record of every ladder rung and a selection only exports the selected routines
+def test_extract_comments_jsonl_of_a_selection(tmp_path):
+    selection = tool.routine_selection(programs=["Mixer"])
+    written = tool.extract_comments(os.path.join(FIXTURES, "plant.L5X"), str(tmp_path), formats=('jsonl',),
+                                    selection=selection)
+    with open(written[0], encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+    assert [(record['program'], record['routine'], record['rung']) for record in records] == [
+        ("Mixer", "Main", "0"), ("Mixer", "Main", "1"), ("Mixer", "Dosing", "0")]
+    assert records[0]['comments'] == [{'language': "en-US", 'comment': "Agitator"}]
+    assert records[1]['comments'] == []
@@ -0,0 +1,71 @@
+import pytest
+
+import xml_manipulation_tool_rockwell as tool
+
+
+# A key only matches a whole operand or the part of it before a member or index access
+@pytest.mark.parametrize('replacement,text,expected', [
+    ({'Bus[1].Obj': 'Bus[5].Obj'}, "COP(HWBus[1].Obj,Bus[1].Obj,1)MOV(A,Bus[12].Obj);",
+     "COP(HWBus[1].Obj,Bus[5].Obj,1)MOV(A,Bus[12].Obj);"),
+    ({'M1_0_1': 'M9'}, "MOV(M1_0_10,M1_0_1)XIC(M1_0_1_B);", "MOV(M1_0_10,M9)XIC(M1_0_1_B);"),
+    ({'M1_0_1': 'M9'}, "XIC(M1_0_1.Run)XIC(Arr[M1_0_1])OTE(M1_0_1[2]);", "XIC(M9.Run)XIC(Arr[M9])OTE(M9[2]);"),
+    ({'Start': 'Go'}, "XIC(Start)Start(A);", "XIC(Go)Start(A);"),
+    ({'A': 'B', 'B': 'A'}, "MOV(A,B);", "MOV(B,A);"),
+])
+def test_tag_replacer_token_boundaries(replacement, text, expected):
+    assert tool.TagReplacer(replacement).replace(text) == expected
+
+
+# Only the first occurrence of every key is replaced when first_only is set
+def test_tag_replacer_first_only():
+    replacer = tool.TagReplacer({'M1_0_1': 'M9', 'Cfg_1': 'Cfg_9'})
+    assert replacer.replace("MOV(M1_0_1,M1_0_1)MOV(Cfg_1,Cfg_1);", first_only=True) == "MOV(M9,M1_0_1)MOV(Cfg_9,Cfg_1);"
+
+
+# Keys that are not operands are found as literals between word boundaries
+def test_tag_replacer_literal_keys():
+    replacer = tool.TagReplacer({'Ref_1+Ofs': 'Ref_2+Ofs'})
+    assert replacer.replace("CPT(Speed,(Ref_1+Ofs)*2)CPT(Speed,(XRef_1+Ofs)*2);") == \
+        "CPT(Speed,(Ref_2+Ofs)*2)CPT(Speed,(XRef_1+Ofs)*2);"
+
+
+# replace_tags only changes the rungs that use a bus
+def test_replace_tags_only_in_bus_rungs():
+    replacement = {'M1_0_1': 'M9'}
+    assert tool.replace_tags("XIC(M1_0_1)OTE(Out);", replacement) == "XIC(M1_0_1)OTE(Out);"
+    assert tool.replace_tags("Motor_AOI(M1_0_1,Bus[1].Obj,M1_0_1);", replacement) == "Motor_AOI(M9,Bus[1].Obj,M1_0_1);"
+
+
+# Operands are split at the commas outside parentheses, brackets and strings, the branches are skipped
+def test_parse_rung_nesting():
+    text = "[XIC(A) ,XIO(B[C[1]]) ]CPT(Dest,(A+B)*2)MOV('a,b',Tag[Idx[2],3]);"
+    instructions = tool.parse_rung(text)
+    assert [(instruction.name, instruction.operands) for instruction in instructions] == [
+        ('XIC', ('A',)), ('XIO', ('B[C[1]]',)), ('CPT', ('Dest', '(A+B)*2')), ('MOV', ("'a,b'", 'Tag[Idx[2],3]'))]
+    for instruction in instructions:
+        assert text[instruction.start:].startswith(instruction.name + '(')
+        for start, operand in zip(tool.operand_starts(instruction), instruction.operands):
+            assert text[start:start + len(operand)] == operand
+
+
+# Instructions without operands and rungs without instructions
+@pytest.mark.parametrize('text,expected', [
+    ("XIC(A)NOP();", [('XIC', ('A',)), ('NOP', ('',))]),
+    ("NOP();", [('NOP', ('',))]),
+    ("", []),
+    ("[,];", []),
+])
+def test_parse_rung_edge_cases(text, expected):
+    assert [(instruction.name, instruction.operands) for instruction in tool.parse_rung(text)] == expected
+
+
+# An unclosed operand list runs to the end of the rung
+def test_parse_rung_unclosed():
+    assert tool.parse_rung("MOV(A,(B")[0].operands == ('A', '(B')
+
+
+# The bus operands and the tag of every use of a bus, a rung with an HWBus has none
+def test_rung_buses():
+    assert tool.rung_buses("Motor_AOI(M1,Bus[1].Obj,Cfg)MOV(Spd,Bus[12].Obj);") == (
+        [1, 12], [('Bus[1].Obj', 'M1'), ('Bus[12].Obj', 'Spd')])
+    assert tool.rung_buses("COP(HWBus[1].Obj,Bus[7].Obj,1);") == ([], [])
@@ -0,0 +1,56 @@
+import os
+
+import xml_manipulation_tool_rockwell as tool
+from conftest import FIXTURES
+
+PLANT = os.path.join(FIXTURES, "plant.L5X")
+
+
+# Function to read the bytes of a file
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+# A document loaded with a selection only walks the texts of the selected routines
+def test_selection_only_walks_the_selected_routines():
+    doc = tool.load_document(PLANT, tool.routine_selection(programs=["Mixer", "Spare"], routines=["Main"]))
+    assert [text for _, text in doc.iter_texts()] == [
+        "XIC(Start_3)Motor_AOI(M2_0_1,Bus[3].Obj,Cfg_3);",
+        "XIC(Level_Lo)MOV(Pump_1,Bus[3].Obj)GRT(Level,10)OTE(AB-2.Cmd);",
+        "XIC(Spare_1)MOV(Spare_2,Bus[2].Obj);"]
+    assert [(routine.task, routine.program, routine.routine) for routine in doc.iter_routines(True)] == [
+        ("Task2", "Mixer", "Main"), ("Program not found in any task", "Spare", "Main")]
+
+
+# An edit of a selected routine is saved with every other byte of the file as it was
+def test_selective_save_leaves_the_other_bytes_unchanged(tmp_path):
+    dest = str(tmp_path / "plant.L5X")
+    doc = tool.load_document(PLANT, tool.routine_selection(programs=["Spare"]))
+    # Bus[2].Obj is also used by the Conveyor program, which is not selected
+    assert tool.renumber_buses(doc, tool.bus_replacements([(2, 22)])) == 1
+    doc.save(dest)
+    assert read_bytes(dest) == read_bytes(PLANT).replace(b"MOV(Spare_2,Bus[2].Obj)", b"MOV(Spare_2,Bus[22].Obj)")
+
+
+# The labels are only counted and numbered inside the selected routines
+def test_label_numbering_of_a_selection(tmp_path):
+    (tmp_path / "bus_count_with_tags.csv").write_text(
+        "Bus Tags,Count,Original Tags,Replace Tags\nBus[4].Obj,1,['AB_1'],\n", encoding='utf-8')
+    dest = str(tmp_path / "plant.L5X")
+    selection = tool.routine_selection(programs=["Mixer"], routines=["Dosing"])
+    counts = {}
+    numbered = tool.num_par_tag(PLANT, dest, str(tmp_path), lambda label_dict: counts.update(label_dict) or "AB-1",
+                                selection)
+    assert counts == {"AB-1": 1}
+    assert numbered == 1
+    assert read_bytes(dest) == read_bytes(PLANT).replace(b"XIC(Dose_Req)MOV(Valve_1,Bus[4].Obj)OTE(AB-1.Cmd);",
+                                                         b"XIC(Dose_Req)MOV(Valve_1,Bus[4].Obj)OTE(AB-1type1.Cmd);")
+
+
+# A task selects its scheduled programs, the programs that are not in any task are selected by the task name the
+# reports give them
+def test_selection_of_tasks():
+    selection = tool.routine_selection(tasks=["MainTask"])
+    assert tool.bus_reports(PLANT, None, selection)[1] == [1, 2, 12]
+    assert tool.bus_reports(PLANT, None, tool.routine_selection(tasks=["Program not found in any task"]))[1] == [2]
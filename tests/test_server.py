@@ -0,0 +1,48 @@
+import gc
+import os
+import weakref
+
+import xml_manipulation_tool_rockwell as tool
+import xml_manipulation_tool_rockwell_server as server
+
+from conftest import FIXTURES
+
+
+# Class of an object that refers to itself, so only the garbage collector can free it
+class Cycle:
+    def __init__(self):
+        self.cycle = self
+
+
+def test_dropped_projects_are_not_kept_frozen(monkeypatch):
+    monkeypatch.setattr(server, 'tool', tool)
+    projects = server.ProjectServer()
+    project = projects.project(os.path.join(FIXTURES, "plant.L5X"))
+    project.index = tool.IncrementalIndex(project.path)
+    project.cycle = Cycle()
+    cycle = weakref.ref(project.cycle)
+    try:
+        projects.evict()
+        assert gc.get_freeze_count() > 0
+        del project
+        projects.memory_limit = 0
+        projects.evict()
+        assert not projects.projects
+        assert cycle() is None
+    finally:
+        gc.unfreeze()
+
+
+def test_forgotten_projects_are_not_kept_frozen():
+    projects = server.ProjectServer()
+    project = projects.project(os.path.join(FIXTURES, "plant.L5X"))
+    project.cycle = Cycle()
+    cycle = weakref.ref(project.cycle)
+    try:
+        projects.forget("Other.L5X")
+        assert gc.get_freeze_count() > 0
+        del project
+        projects.forget()
+        assert cycle() is None
+    finally:
+        gc.unfreeze()
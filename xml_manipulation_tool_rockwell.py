@@ -9,17 +9,17 @@ Dependencies:
 - xml.etree.ElementTree
 - csv
 - re
-- numpy
-- pandas
 - os
 
 Instructions:
-1. Run the script, providing the path to the source L5X/L5K file.
+1. Run the script, providing the path to the source L5X/L5K file and optionally the programs and routines to work on (only those are parsed and changed).
 2. Choose from the menu options to perform specific tasks, such as replacing tags, managing bus numbers, or listing tags with associated bus information.
 3. Follow on-screen prompts for additional inputs and configurations.
-4. The modified XML file and associated CSV files will be generated based on the chosen operations.
+4. The associated CSV files will be generated based on the chosen operations, the changes to the XML file are kept in memory and written to the destination file with option 8 or when quitting.
 
-Note: Please ensure that the necessary Python libraries, such as xml.etree.ElementTree, csv, re, numpy, pandas, and os, are installed before running the script.
+The functions of the options can also be imported and called from other programs. They take the paths of the files and the csv folder and every value they need as arguments, never change the working directory or ask for input, return what they made and can run side by side in the threads of a pool as long as a loaded document is only used by one thread at a time.
+
+Note: Please ensure that the necessary Python libraries, such as xml.etree.ElementTree, csv, re, and os, are installed before running the script.
 
 Author: Anubroto Ghose
 Date: 07/12/2023
@@ -27,504 +27,2882 @@ Date: 07/12/2023
 import xml.etree.ElementTree as ET
 import csv
 import re
-import numpy as np
-import pandas as pd
 import os
+import sys
+import mmap
+import hashlib
+import bisect
+import pickle
+import sqlite3
+import cProfile
+import json
+import time
+import gc
+import threading
+from array import array
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import cached_property, lru_cache, wraps
+from xml.sax.saxutils import escape, unescape
+try:
+    import resource
+except ImportError:
+    # resource is missing on Windows, the peak memory is not sampled there
+    resource = None
+
+# Record of a single rung (or a free Text element of a non-ladder routine) with its place in the project
+# index is the position of the Text element in document order, comments is a tuple of (Lang, Comment) pairs
+# and is None for Text elements that are not inside a Rung
+RungRecord = namedtuple('RungRecord', ['index', 'task', 'program', 'routine', 'number', 'type', 'text', 'comments'])
+
+# Record of a routine with its rungs, routine is None for a Program that has no routines
+RoutineRecord = namedtuple('RoutineRecord', ['task', 'program', 'routine', 'rungs'])
+
+# Task name of the programs that are not scheduled in any task
+UNSCHEDULED_TASK = "Program not found in any task"
+
+# Selection of the routines to walk by the names of their task, program and routine, a field that is None selects
+# every name. Add-On Instructions have no task so they are left out when tasks are selected.
+class RoutineSelection(namedtuple('RoutineSelection', ['tasks', 'programs', 'routines'])):
+    __slots__ = ()
+
+    # Function to tell if the routines of a program (or Add-On Instruction) are walked
+    def selects_program(self, task_name, program_name):
+        return (self.tasks is None or task_name in self.tasks) and (self.programs is None or program_name in self.programs)
+
+    # Function to tell if a routine is walked, a program without routines (routine_name None) only is when no
+    # routines are selected
+    def selects_routine(self, routine_name):
+        return self.routines is None or routine_name in self.routines
+
+    # Function to tell if a RoutineRecord is selected
+    def selects(self, routine):
+        return self.selects_program(routine.task, routine.program) and self.selects_routine(routine.routine)
+
+# Function to build a RoutineSelection from lists of names, None when nothing is selected so everything is walked
+def routine_selection(tasks=None, programs=None, routines=None):
+    if not tasks and not programs and not routines:
+        return None
+    return RoutineSelection(frozenset(tasks) if tasks else None, frozenset(programs) if programs else None,
+                            frozenset(routines) if routines else None)
+
+# Byte span of the stripped text of a Text element, cdata tells how new text is written back
+# (True inside a CDATA section, False as escaped character data, None for an empty <Text/> element)
+TextSpan = namedtuple('TextSpan', ['start', 'end', 'cdata'])
+
+# Instrumentation of the operations, it is off unless XML_TOOL_PROFILE is set (or one of the two settings below)
+# Every operation then prints the time, the calls and the peak memory of each of its phases, the counters of what it
+# did and the time spent in garbage collection. XML_TOOL_PROFILE_JSON is a file a JSON record of every run is appended to and XML_TOOL_PROFILE_STATS a
+# folder the cProfile stats of the phase that took the longest are written to. The paths are made absolute so that a
+# program that changes its working directory still writes to them.
+PROFILE = os.environ.get('XML_TOOL_PROFILE', '') not in ('', '0')
+PROFILE_JSON = os.path.abspath(os.environ['XML_TOOL_PROFILE_JSON']) if os.environ.get('XML_TOOL_PROFILE_JSON') else ''
+PROFILE_STATS = os.path.abspath(os.environ['XML_TOOL_PROFILE_STATS']) if os.environ.get('XML_TOOL_PROFILE_STATS') else ''
+
+# Instrumentation of the run in progress, None when there is none
+INSTRUMENTATION = ContextVar('instrumentation', default=None)
+
+# Function to get the peak memory of the process in MB, None where the resource module is missing (Windows)
+def peak_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+# Class that records the calls, the time and the peak memory of every phase of a run and counters of what was done
+# Phases are nested, a phase is known by its path from the outermost phase and its self time leaves out the time of
+# the phases inside it. With profile set every phase gets a cProfile profile that only runs while it is the innermost.
+class Instrumentation:
+    def __init__(self, name, profile=False):
+        self.name = name
+        self.profile = profile
+        self.phases = {}
+        self.counters = {}
+        self.profiles = {}
+        self.stack = []
+        self.started = time.time()
+        self.gc_seconds = 0.0
+        self.gc_collections = 0
+        self.gc_started = None
+
+    @contextmanager
+    def phase(self, name):
+        path = self.stack[-1][0] + (name,) if self.stack else (name,)
+        record = self.phases.setdefault(path, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'peak_mb': None})
+        frame = [path, 0.0]
+        if self.profile:
+            if self.stack:
+                self.profiles[self.stack[-1][0]].disable()
+            self.profiles.setdefault(path, cProfile.Profile()).enable()
+        self.stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.stack.pop()
+            if self.profile:
+                self.profiles[path].disable()
+                if self.stack:
+                    self.profiles[self.stack[-1][0]].enable()
+            if self.stack:
+                self.stack[-1][1] += seconds
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['self_seconds'] += seconds - frame[1]
+            peak = peak_memory()
+            if peak is not None:
+                record['peak_mb'] = max(record['peak_mb'] or 0.0, peak)
+
+    # Function to add to a counter
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Function the garbage collector calls before and after every collection while the run is instrumented
+    def gc_callback(self, phase, info):
+        if phase == 'start':
+            self.gc_started = time.perf_counter()
+        elif self.gc_started is not None:
+            self.gc_seconds += time.perf_counter() - self.gc_started
+            self.gc_collections += 1
+            self.gc_started = None
+
+    # Path of the phase with the longest self time
+    def hottest_phase(self):
+        return max(self.phases, key=lambda path: self.phases[path]['self_seconds'], default=None)
+
+    # Function to write the cProfile stats of the hottest phase to a folder, returns the path of the stats file
+    def dump_stats(self, folder):
+        path = self.hottest_phase()
+        if path is None or path not in self.profiles:
+            return None
+        file_name = os.path.join(folder, re.sub(r'\W+', '_', "_".join(path)) + ".prof")
+        self.profiles[path].dump_stats(file_name)
+        return file_name
+
+    # Machine readable record of the run
+    def record(self):
+        return {'name': self.name, 'started': self.started,
+                'seconds': sum(record['seconds'] for path, record in self.phases.items() if len(path) == 1),
+                'peak_mb': peak_memory(),
+                'gc_seconds': self.gc_seconds, 'gc_collections': self.gc_collections,
+                'phases': [dict(phase="/".join(path), **record) for path, record in self.phases.items()],
+                'counters': self.counters}
+
+    # Human readable summary of the run
+    def summary(self):
+        record = self.record()
+        lines = [f"Profile of {self.name}: {record['seconds']:.3f} s" +
+                 (f", peak memory {record['peak_mb']:.1f} MB" if record['peak_mb'] is not None else "")]
+        lines.append(f"  {'Phase':<40} {'Calls':>6} {'Seconds':>9} {'Self s':>9} {'Peak MB':>8}")
+        for path, phase_record in self.phases.items():
+            name = "  " * (len(path) - 1) + path[-1]
+            peak = phase_record['peak_mb']
+            lines.append(f"  {name:<40} {phase_record['calls']:>6} {phase_record['seconds']:>9.3f} {phase_record['self_seconds']:>9.3f}"
+                         f" {peak if peak is not None else float('nan'):>8.1f}")
+        lines.append(f"  Garbage collection: {self.gc_seconds:.3f} s in {self.gc_collections} collections")
+        if self.counters:
+            lines.append("  Counters: " + ", ".join(f"{name} {value}" for name, value in self.counters.items()))
+        return "\n".join(lines)
+
+    # Function to print the summary, append the record to the JSON file and write the stats of the hottest phase
+    def report(self, json_file=None, stats_folder=None):
+        print(self.summary())
+        if stats_folder:
+            stats_file = self.dump_stats(stats_folder)
+            if stats_file is not None:
+                print(f"  cProfile stats of the hottest phase written to {stats_file}")
+        if json_file:
+            with open(json_file, 'a', encoding="UTF-8") as file:
+                file.write(json.dumps(self.record()) + "\n")
+
+# Function to tell if the operations are instrumented
+def profiling():
+    return PROFILE or bool(PROFILE_JSON) or bool(PROFILE_STATS)
+
+# Function to instrument a run, the run is the outermost phase and it is reported when it ends
+# Phases and counters of the code it calls are recorded by phase() and count()
+@contextmanager
+def instrument(name):
+    instrumentation = Instrumentation(name, bool(PROFILE_STATS))
+    token = INSTRUMENTATION.set(instrumentation)
+    gc.callbacks.append(instrumentation.gc_callback)
+    try:
+        with instrumentation.phase(name):
+            yield instrumentation
+    finally:
+        gc.callbacks.remove(instrumentation.gc_callback)
+        INSTRUMENTATION.reset(token)
+        instrumentation.report(PROFILE_JSON, PROFILE_STATS)
+
+# Function to time a phase of the run in progress, does nothing when no run is instrumented
+# Phases must not be opened around a yield because the caller's phases would be counted inside them
+def phase(name):
+    instrumentation = INSTRUMENTATION.get()
+    return nullcontext() if instrumentation is None else instrumentation.phase(name)
+
+# Function to add to a counter of the run in progress
+def count(name, amount=1):
+    instrumentation = INSTRUMENTATION.get()
+    if instrumentation is not None:
+        instrumentation.count(name, amount)
+
+# Function to pause the garbage collector while a tree, an index or the csv rows are built and a document is written
+# The millions of elements and records that are built hold no reference cycles, the collections that their allocation
+# sets off would only walk them (and a parsed tree that is alive) again and again
+# The collector is turned on again when the last paused section of every thread ends, and only if it was on before
+@contextmanager
+def gc_paused():
+    with _gc_pause_lock:
+        if _gc_pause['depth'] == 0:
+            _gc_pause['enabled'] = gc.isenabled()
+            gc.disable()
+        _gc_pause['depth'] += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pause['depth'] -= 1
+            if _gc_pause['depth'] == 0 and _gc_pause['enabled']:
+                gc.enable()
+
+_gc_pause = {'depth': 0, 'enabled': False}
+_gc_pause_lock = threading.Lock()
+
+# Progress of the operation in progress, None when nothing follows it
+PROGRESS = ContextVar('progress', default=None)
+
+# Exception a progress callback raises to stop the operation in progress
+# It is not an Exception so that the error handling of the operations lets it through
+class OperationCancelled(BaseException):
+    pass
+
+# Class that follows how far an operation is in its current step (the parse, the index, the replacements, the comments
+# and the write). A step has a total amount of work, rungs or bytes, that is done piece by piece, and at most every
+# interval seconds the callback gets the step, the rungs done in it, the fraction of the step that is done and the
+# seconds left. The fraction and the seconds left are None when the total is not known.
+# The callback can raise OperationCancelled to stop the operation.
+class Progress:
+    def __init__(self, callback, interval=0.5):
+        self.callback = callback
+        self.interval = interval
+        self.step = None
+        self.total = None
+        self.rungs = 0
+        self.work = 0
+        self.started = self.reported = time.perf_counter()
+
+    # Function to start a step, total is the amount of work of the step or a function that gives it so that it is
+    # only counted when the progress is followed (it is counted first, counting it can be a step of its own)
+    def start(self, step, total=None):
+        self.total = total() if callable(total) else total
+        self.step = step
+        self.rungs = 0
+        self.work = 0
+        self.started = self.reported = time.perf_counter()
+        self.callback(step, 0, 0.0 if self.total else None, None)
+
+    # Function to add the rungs that are done and the work they were, the rungs themselves when it is not given
+    def advance(self, rungs, work=None):
+        self.rungs += rungs
+        self.work += rungs if work is None else work
+        now = time.perf_counter()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.callback(self.step, self.rungs, *self.estimate(now))
+
+    # Fraction of the step that is done and the seconds left at the pace so far
+    def estimate(self, now):
+        if not self.total:
+            return None, None
+        fraction = min(self.work / self.total, 1.0)
+        return fraction, (now - self.started) * (1 - fraction) / fraction if fraction else None
+
+# Function to follow the progress of the operations that run inside it, see Progress
+@contextmanager
+def reporting_progress(callback, interval=0.5):
+    progress = Progress(callback, interval)
+    token = PROGRESS.set(progress)
+    try:
+        yield progress
+    finally:
+        PROGRESS.reset(token)
+
+# Function to start a step of the operation in progress, does nothing when its progress is not followed
+def progress_step(step, total=None):
+    progress = PROGRESS.get()
+    if progress is not None:
+        progress.start(step, total)
+
+# Function to add to the rungs done in the step of the operation in progress
+def advance(rungs, work=None):
+    progress = PROGRESS.get()
+    if progress is not None:
+        progress.advance(rungs, work)
+
+# Decorator of the operations: inside an instrumented run the operation is a phase of it, otherwise it is a run of
+# its own when profiling is on
+# The project index holds one file at a time, so while it is on the operations of the threads run one after the other
+def instrumented(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with _project_index_lock if INDEX_DB else nullcontext():
+            return _run_instrumented(function, args, kwargs)
+    return wrapper
+
+def _run_instrumented(function, args, kwargs):
+    instrumentation = INSTRUMENTATION.get()
+    if instrumentation is not None:
+        with instrumentation.phase(function.__name__):
+            return function(*args, **kwargs)
+    if not profiling():
+        return function(*args, **kwargs)
+    with instrument(function.__name__):
+        return function(*args, **kwargs)
+
+# Scanner for the Text elements of an L5X export, CDATA sections and comments are matched as a whole so
+# that markup inside them is never mistaken for a Text element. The CDATA group of a Text element runs to the last
+# ]]> before </Text>, so a text that holds ]]> and was written as a run of CDATA sections is matched as one group.
+TEXT_SPAN_PATTERN = re.compile(rb'<!\[CDATA\[.*?\]\]>|<!--.*?-->|<Text(?:\s[^>]*)?/>'
+                               rb'|<Text(?:\s[^>]*)?>(?:\s*<!\[CDATA\[(.*?)\]\]>\s*|([^<]*))</Text>', re.S)
+
+# Class with what the L5X and L5K documents share: the original bytes of the export, the pending edits of the rung
+# texts that are spliced into the original bytes when the document is saved and the indexes derived from the rungs,
+# which are kept in derived until the next edit. changed tells if there are edits that are not saved.
+# A document loaded with a RoutineSelection only walks and edits the texts of the selected routines, the rest of the
+# export is written back byte for byte.
+class ProjectDocument:
+    encoding = "UTF-8"
+    # names of the cached properties that are computed again when the content is replaced
+    cached_names = ()
+
+    def __init__(self, content, path=None, selection=None):
+        if isinstance(content, str):
+            content = content.encode(self.encoding)
+        self.path = path
+        self.selection = selection
+        self.content = content
+        self.edits = {}
+        self.derived = {}
+        self.changed = False
+
+    # Decoded content of the original file
+    @property
+    def xml_content(self):
+        return bytes(self.content).decode(self.encoding)
+
+    # Decoded content with all the edits applied
+    def content_text(self):
+        return self.to_bytes().decode(self.encoding) if self.edits else self.xml_content
+
+    # Function to tell if the content is still the content of the file at path, the file is mapped and not edited
+    def is_file_content(self):
+        return self.path is not None and isinstance(self.content, mmap.mmap) and not self.edits
+
+    # Bytes of the content with all the edits applied, the original bytes (or memory map) when there are no edits
+    def content_bytes(self):
+        return self.to_bytes() if self.edits else self.content
+
+    # Function to replace the text at a position of the document texts
+    def set_text(self, index, text):
+        self.edits[index] = text
+        self.derived.clear()
+        self.changed = True
+
+    # Function to yield the output in pieces, the unchanged regions are views on the original bytes
+    def iter_chunks(self):
+        view = memoryview(self.content)
+        position = 0
+        for index in sorted(self.edits):
+            span = self.text_spans[index]
+            yield view[position:span.start]
+            yield self.encode_text(self.edits[index], span)
+            position = span.end
+        yield view[position:]
+
+    # Function to get the bytes of the document with all the edits applied
+    def to_bytes(self):
+        return b''.join(self.iter_chunks())
+
+    # Function to replace the whole content, the pending edits are dropped and the content is parsed again when needed
+    def set_content(self, content):
+        if isinstance(content, str):
+            content = content.encode(self.encoding)
+        self.reset(content)
+        self.changed = True
+
+    def reset(self, content):
+        self.content = content
+        self.edits = {}
+        self.derived.clear()
+        for name in self.cached_names:
+            self.__dict__.pop(name, None)
+
+    # Function to write the document with all the edits applied, the new content goes to a temporary file first that
+    # replaces dest once it is complete, so a write that fails or is cancelled leaves dest as it was. The source file
+    # can be written over, it is mapped again once it has been replaced.
+    def save(self, dest):
+        temporary = temporary_path(dest)
+        try:
+            written = self.write(temporary)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        if isinstance(self.content, mmap.mmap) and os.path.exists(dest) and os.path.samefile(dest, self.path):
+            self.content.close()
+            os.replace(temporary, dest)
+            self.reset(_map_file(dest))
+        else:
+            os.replace(temporary, dest)
+        return written
+
+    # Function to write the document with all the edits applied in a single pass
+    def write(self, dest):
+        written = 0
+        with phase("write"), gc_paused(), open(dest, 'wb') as file:
+            # the spans of the edited texts are found before the step starts so that the scan is not taken for the write
+            if self.edits:
+                self.text_spans
+            progress_step("write", len(self.content))
+            for chunk in self.iter_chunks():
+                written += file.write(chunk)
+                advance(0, len(chunk))
+        count("bytes written", written)
+        self.changed = False
+        return written
+
+    # Name of the task a program is scheduled in
+    def task_of(self, program_name):
+        return self.program_tasks.get(program_name, UNSCHEDULED_TASK)
+
+    # Number of texts the document walks, the total of the progress of the steps that go over them
+    def text_count(self):
+        return len(self.text_spans)
+
+    # Function to yield the position and the current text of every text of the document
+    def iter_texts(self):
+        for index in range(len(self.text_spans)):
+            yield index, self.get_text(index)
+
+    # Function to yield a RungRecord for every rung of the walked routines
+    def iter_rungs(self, include_aoi=False):
+        for routine in self.iter_routines(include_aoi):
+            yield from routine.rungs
+
+# Class that parses an L5X export once and exposes the root, the Text elements and the Task/Program/Routine/Rung hierarchy
+# The tree is only built the first time it is needed so operations that work on the raw content never parse it
+# The texts of the document are its Text elements in document order
+class L5XDocument(ProjectDocument):
+    cached_names = ('root', 'subtrees', 'text_tags', 'text_positions', 'text_spans', 'tasks_dict', 'program_tasks')
+
+    # Function to open an L5X file, the file is memory mapped so the scans of the content read it through the page
+    # cache and the tree is parsed straight from the mapping
+    @classmethod
+    def load(cls, path, selection=None):
+        with phase("read"):
+            return cls(_map_file(path), path, selection)
+
+    # Root of the tree, with a selection only the Tasks and the selected Programs, Add-On Instructions and Routines
+    # are parsed and the other subtrees are never turned into elements
+    @cached_property
+    def root(self):
+        with phase("parse"), gc_paused():
+            if self.selection is None:
+                return _parse_content(self.content)
+            return self._selected_root()
+
+    # Selected Programs and Add-On Instructions with the byte offsets of their selected routines, see selected_subtrees
+    @cached_property
+    def subtrees(self):
+        return selected_subtrees(self.content, self.selection)
+
+    # Function to build a tree of the Controller that only holds the Tasks and the selected subtrees
+    # Every selected Program or Add-On Instruction is its start tag with a Routines element of its selected routines
+    def _selected_root(self):
+        root = ET.Element('RSLogix5000Content')
+        controller = ET.SubElement(root, 'Controller')
+        tasks = l5x_tasks_element(self.content)
+        if tasks is not None:
+            controller.append(tasks)
+        sections = {}
+        for match, _, routines in self.subtrees:
+            tag = match.group(1)
+            start_tag = bytes(self.content[match.start():match.end()])
+            owner = ET.fromstring(start_tag if start_tag.endswith(b'/>') else start_tag + b'</' + tag + b'>')
+            if tag not in sections:
+                sections[tag] = ET.SubElement(controller, tag.decode() + 's')
+            sections[tag].append(owner)
+            routines_element = ET.SubElement(owner, 'Routines')
+            for start, end in routines:
+                routines_element.append(ET.fromstring(self.content[start:end]))
+        count("routines parsed", sum(len(routines) for _, _, routines in self.subtrees))
+        return root
+
+    # Byte offsets of the selected routines, None when the whole document is selected
+    def selected_regions(self):
+        if self.selection is None:
+            return None
+        return [span for _, _, routines in self.subtrees for span in routines]
+
+    # Every Text element of the document in document order
+    @cached_property
+    def text_tags(self):
+        return self.root.findall('.//Text')
+
+    # Stripped text of every Text element that has any text
+    @property
+    def texts(self):
+        return [text.text.strip() for text in self.text_tags if text.text is not None]
+
+    # Byte offsets of every Text element in document order, found in a single scan of the content (of the selected
+    # routines when there is a selection)
+    @cached_property
+    def text_spans(self):
+        spans = []
+        for start, end in self.selected_regions() or [(0, len(self.content))]:
+            _scan_text_spans(self.content, start, end, spans)
+        if len(spans) != len(self.text_tags):
+            raise ValueError(f"Found {len(spans)} Text spans for {len(self.text_tags)} Text elements")
+        return spans
+
+    # Current stripped text of the Text element at a position of text_tags
+    def get_text(self, index):
+        return _element_text(self.text_tags[index])
+
+    def text_count(self):
+        return len(self.text_tags)
+
+    def iter_texts(self):
+        for index, text_tag in enumerate(self.text_tags):
+            yield index, _element_text(text_tag)
+
+    # Function to replace the text of the Text element at a position of text_tags
+    def set_text(self, index, text):
+        self.text_tags[index].text = text
+        super().set_text(index, text)
+
+    # Function to encode a text the way it is written back into a Text element
+    def encode_text(self, text, span):
+        return _encode_text(text, span.cdata)
+
+    # Dictionary of task name to the names of its scheduled programs
+    @cached_property
+    def tasks_dict(self):
+        tasks_dict = {}
+        for task in self.root.findall('.//Task'):
+            tasks_dict[task.get('Name')] = [program.get('Name') for program in task.findall('.//ScheduledProgram')]
+        return tasks_dict
+
+    # Dictionary of program name to the name of the task it is scheduled in
+    @cached_property
+    def program_tasks(self):
+        reverse_dict = {}
+        for task, programs in self.tasks_dict.items():
+            for program in programs:
+                reverse_dict[program] = task
+        return reverse_dict
+
+    # Position of every Text element in text_tags by the id of the element
+    @cached_property
+    def text_positions(self):
+        return {id(text): i for i, text in enumerate(self.text_tags)}
+
+    # Function to walk the Program (and optionally Add-On Instruction) routines and yield a RoutineRecord per routine
+    # Add-On Instruction definitions come before the Programs in an L5X export so document order is kept
+    # The programs and routines are found by their path so the ones left out by a RoutineSelection are never walked
+    def iter_routines(self, include_aoi=False, selection=None):
+        positions = self.text_positions
+        owners = []
+        if include_aoi:
+            owners.extend((None, aoi) for aoi in self.root.iterfind('Controller/AddOnInstructionDefinitions/AddOnInstructionDefinition'))
+        owners.extend((self.task_of(program.get('Name')), program) for program in self.root.iterfind('Controller/Programs/Program'))
+        for task_name, owner in owners:
+            owner_name = owner.get('Name')
+            if selection is not None and not selection.selects_program(task_name, owner_name):
+                continue
+            routines = owner.findall('Routines/Routine')
+            if not routines and owner.tag == 'Program' and (selection is None or selection.selects_routine(None)):
+                yield RoutineRecord(task_name, owner_name, None, ())
+            for routine in routines:
+                routine_name = routine.get('Name')
+                if selection is not None and not selection.selects_routine(routine_name):
+                    continue
+                yield RoutineRecord(task_name, owner_name, routine_name,
+                                    _routine_rungs(routine, positions, task_name, owner_name, routine_name))
+
+# Size of the pieces an L5X export is parsed in, the progress of the parse is told after every piece
+PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Function to parse the tree of an L5X export piece by piece so that the progress of a long parse can be followed
+def _parse_content(content):
+    progress_step("parse", len(content))
+    parser = ET.XMLParser()
+    for start in range(0, len(content), PARSE_CHUNK_SIZE):
+        piece = content[start:start + PARSE_CHUNK_SIZE]
+        parser.feed(piece)
+        advance(0, len(piece))
+    return parser.close()
+
+# Function to add the TextSpan of every Text element between two byte offsets of an L5X export to spans
+def _scan_text_spans(content, start, end, spans):
+    for match in TEXT_SPAN_PATTERN.finditer(content, start, end):
+        if match.group(1) is not None:
+            spans.append(_stripped_span(content, match.start(1), match.end(1), True))
+        elif match.group(2) is not None:
+            spans.append(_stripped_span(content, match.start(2), match.end(2), False))
+        elif content[match.start():match.start() + 5] == b'<Text':
+            spans.append(TextSpan(match.start(), match.end(), None))
+
+# Function to build the RungRecords of a Routine element, the free Text elements of a routine without rungs
+# positions is the position of every Text element by the id of the element
+def _routine_rungs(routine, positions, task_name, owner_name, routine_name):
+    rungs = [_rung_record(rung, positions.get(id(rung.find('Text'))), task_name, owner_name, routine_name)
+             for rung in routine.iter('Rung')]
+    if not rungs:
+        for text in routine.iter('Text'):
+            rungs.append(RungRecord(positions[id(text)], task_name, owner_name, routine_name,
+                                    None, None, _element_text(text), None))
+    return rungs
+
+# Function to build the TextSpan of a region without its leading and trailing whitespace
+def _stripped_span(content, start, end, cdata):
+    region = content[start:end]
+    stripped = region.lstrip()
+    start = start + len(region) - len(stripped)
+    return TextSpan(start, start + len(stripped.rstrip()), cdata)
+
+# Boundary of two CDATA sections in the CDATA group of a Text element, with the character data between them
+CDATA_BOUNDARY_PATTERN = re.compile(rb'\]\]>(\s*)<!\[CDATA\[')
+
+# Function to decode the stripped raw text of a TextSpan the way the parser reads the element
+def _span_text(raw, cdata):
+    if cdata:
+        if b']]>' in raw:
+            raw = CDATA_BOUNDARY_PATTERN.sub(rb'\1', raw)
+        return raw.decode("UTF-8")
+    return unescape(raw.decode("UTF-8"), {'&quot;': '"', '&apos;': "'"})
+
+# Function to encode text the way it is written back into a Text element
+# A text that holds ]]> is split into a run of CDATA sections since a CDATA section cannot hold it
+def _encode_text(text, cdata):
+    if cdata is None:
+        return ('<Text>\n<![CDATA[' + text.replace(']]>', ']]]]><![CDATA[>') + ']]>\n</Text>').encode("UTF-8")
+    if cdata:
+        return text.replace(']]>', ']]]]><![CDATA[>').encode("UTF-8")
+    return escape(text).encode("UTF-8")
+
+# Function to apply a text function to every text of a document and keep the changed ones as edits
+def rewrite_texts(doc, function):
+    changed = 0
+    with phase("replace"):
+        progress_step("replace", doc.text_count)
+        for index, original_text in doc.iter_texts():
+            advance(1)
+            modified_text = function(original_text)
+            if modified_text != original_text:
+                doc.set_text(index, modified_text)
+                changed += 1
+    count("texts changed", changed)
+    return changed
+
+# Function to build the RungRecord of a Rung element
+# The rung numbers, rung types and languages are a small set of values so every rung shares an interned string
+def _rung_record(rung, index, task_name, owner_name, routine_name):
+    comments = tuple((_intern(comment.get('Lang')), _element_text(comment)) for comment in rung.iterfind('Comment/LocalizedComment'))
+    return RungRecord(index, task_name, owner_name, routine_name, _intern(rung.get('Number')), _intern(rung.get('Type')),
+                      _element_text(rung.find('Text')), comments)
+
+# Function to intern an attribute value that may be missing
+def _intern(value):
+    return None if value is None else sys.intern(value)
+
+# Function to get the stripped text of an element
+def _element_text(element):
+    if element is None or element.text is None:
+        return ''
+    return element.text.strip()
+
+# Encoding of L5K exports, Studio 5000 writes them in the Windows code page
+L5K_ENCODING = "cp1252"
+
+# Pattern of the lines of an L5K export the records are read from: the start and end of the Programs, Add-On
+# Instructions and routines, the rung statements (N: for a normal rung, other letters for pending edits) and the
+# rung comments (RC:) that come before their rung
+L5K_LINE_PATTERN = re.compile(rb'^[ \t]*(?:(END_)?(PROGRAM|ADD_ON_INSTRUCTION_DEFINITION|ROUTINE|FBD_ROUTINE|SFC_ROUTINE|ST_ROUTINE)\b[ \t]*(\w*)'
+                              rb'|([A-Za-z]{1,3}):[ \t]*)', re.M)
+
+# End of a rung statement, a rung can be written over several lines and ends with a semicolon at the end of a line
+L5K_RUNG_END_PATTERN = re.compile(rb';[ \t]*\r?$', re.M)
+
+# String of an L5K export, $ escapes the next character
+L5K_STRING_PATTERN = re.compile(rb'"((?:[^"$]|\$.)*)"', re.S)
+
+# Escape sequences of an L5K string
+L5K_ESCAPE_PATTERN = re.compile(r'\$([0-9A-Fa-f]{2}|.)', re.S)
+L5K_ESCAPES = {'N': '\n', 'n': '\n', 'L': '\n', 'l': '\n', 'R': '\r', 'r': '\r', 'T': '\t', 't': '\t', 'P': '\f', 'p': '\f'}
+
+# Task blocks of an L5K export and the programs scheduled in them, one name and a semicolon per line
+L5K_TASK_PATTERN = re.compile(rb'^[ \t]*TASK[ \t]+(\w+)(.*?)^[ \t]*END_TASK\b', re.M | re.S)
+L5K_SCHEDULED_PROGRAM_PATTERN = re.compile(rb'^[ \t]*(\w+)[ \t]*;[ \t]*\r?$', re.M)
+
+# Function to decode an L5K string
+def l5k_unescape(raw):
+    return L5K_ESCAPE_PATTERN.sub(lambda match: L5K_ESCAPES.get(match.group(1), match.group(1)) if len(match.group(1)) == 1
+                                  else chr(int(match.group(1), 16)), raw.decode(L5K_ENCODING, errors="replace"))
+
+# Function to read the program to task dictionary of an L5K export
+# The tasks come after the programs so the search starts at the end of the last program
+def l5k_program_tasks(content):
+    program_tasks = {}
+    start = content.rfind(b'END_PROGRAM')
+    for task in L5K_TASK_PATTERN.finditer(content, max(start, 0)):
+        task_name = task.group(1).decode(L5K_ENCODING)
+        for program in L5K_SCHEDULED_PROGRAM_PATTERN.finditer(task.group(2)):
+            program_tasks[program.group(1).decode(L5K_ENCODING)] = task_name
+    return program_tasks
+
+# Function to scan an L5K export and yield a RoutineRecord per routine like L5XDocument.iter_routines
+# Only the lines that start or end a block, the rungs and the rung comments are looked at, everything else (tags,
+# data types, modules) is skipped by the search. The texts of the document are the ladder rungs in document order,
+# spans gets the byte span of every one of them and edits replaces the text of the edited ones.
+# Tasks are only resolved when a program to task dictionary is given, the programs and routines left out by a
+# RoutineSelection are scanned over without building their records and regions gets the byte offsets of the walked routines.
+def _scan_l5k(content, program_tasks=None, include_aoi=False, spans=None, edits=None, selection=None, regions=None):
+    owner_name = task_name = routine_name = None
+    routine_start = 0
+    owner_routines = 0
+    ladder = False
+    rungs = []
+    comments = []
+    text_index = 0
+    position = 0
+    while True:
+        match = L5K_LINE_PATTERN.search(content, position)
+        if match is None:
+            break
+        position = match.end()
+        keyword = match.group(2)
+        if keyword is None:
+            if not ladder:
+                continue
+            statement = match.group(4)
+            if statement == b'RC':
+                string = L5K_STRING_PATTERN.match(content, position)
+                if string is not None:
+                    comments.append((None, l5k_unescape(string.group(1)).strip()))
+                    position = string.end()
+                continue
+            end = L5K_RUNG_END_PATTERN.search(content, position)
+            if end is None:
+                break
+            span = TextSpan(position, end.start() + 1, None)
+            position = end.end()
+            if spans is not None:
+                spans.append(span)
+            if routine_name is not None:
+                if edits is not None and text_index in edits:
+                    text = edits[text_index]
+                else:
+                    text = bytes(content[span.start:span.end]).decode(L5K_ENCODING, errors="replace")
+                rungs.append(RungRecord(text_index, task_name, owner_name, routine_name, sys.intern(str(len(rungs))),
+                                        sys.intern(statement.decode(L5K_ENCODING)), text, tuple(comments)))
+            comments = []
+            text_index += 1
+        elif match.group(1) is None:
+            name = match.group(3).decode(L5K_ENCODING)
+            if keyword == b'PROGRAM':
+                owner_routines = 0
+                task_name = program_tasks.get(name, UNSCHEDULED_TASK) if program_tasks is not None else None
+                owner_name = name if selection is None or selection.selects_program(task_name, name) else None
+            elif keyword == b'ADD_ON_INSTRUCTION_DEFINITION':
+                task_name = None
+                owner_name = name if include_aoi and (selection is None or selection.selects_program(None, name)) else None
+            else:
+                ladder = keyword == b'ROUTINE'
+                selected = selection is None or selection.selects_routine(name)
+                routine_name = name if owner_name is not None and selected else None
+                routine_start = match.start()
+                owner_routines += 1
+                rungs = []
+                comments = []
+        elif keyword == b'PROGRAM':
+            if owner_name is not None and owner_routines == 0 and (selection is None or selection.selects_routine(None)):
+                yield RoutineRecord(task_name, owner_name, None, ())
+            owner_name = None
+        elif keyword == b'ADD_ON_INSTRUCTION_DEFINITION':
+            owner_name = None
+        else:
+            if routine_name is not None:
+                if regions is not None:
+                    regions.append((routine_start, match.end()))
+                yield RoutineRecord(task_name, owner_name, routine_name, rungs)
+            routine_name = None
+            ladder = False
+
+# Function to map a file into memory, an empty file gives empty bytes because it cannot be mapped
+def _map_file(path):
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+# Class of an L5K (ASCII) export with the same interface as L5XDocument
+# The file is memory mapped like an L5X export and the records are scanned from the mapped bytes every time they are
+# needed, so only the byte spans of the rungs and the edited rungs are held in memory. The texts of the document are
+# the texts of the ladder rungs, they are written back as they are (structured text and function block routines
+# are not read).
+class L5KDocument(ProjectDocument):
+    encoding = L5K_ENCODING
+    cached_names = ('text_spans', 'program_tasks')
+
+    # Function to open an L5K file
+    @classmethod
+    def load(cls, path, selection=None):
+        with phase("read"):
+            return cls(_map_file(path), path, selection)
+
+    # Byte span of every ladder rung text in document order
+    @cached_property
+    def text_spans(self):
+        spans = []
+        for _ in _scan_l5k(self.content, None, True, spans):
+            pass
+        return spans
+
+    # Dictionary of program name to the name of the task it is scheduled in
+    @cached_property
+    def program_tasks(self):
+        return l5k_program_tasks(self.content)
+
+    # Dictionary of task name to the names of its scheduled programs
+    @property
+    def tasks_dict(self):
+        tasks_dict = {}
+        for program, task in self.program_tasks.items():
+            tasks_dict.setdefault(task, []).append(program)
+        return tasks_dict
+
+    # Current text of the rung at a position of text_spans
+    def get_text(self, index):
+        if index in self.edits:
+            return self.edits[index]
+        span = self.text_spans[index]
+        return bytes(self.content[span.start:span.end]).decode(L5K_ENCODING, errors="replace")
+
+    # Function to encode a rung text the way it is written back
+    def encode_text(self, text, span):
+        return text.encode(L5K_ENCODING, errors="replace")
+
+    # Function to yield the position and the current text of the rungs of the selected routines
+    # The positions stay the positions in text_spans of the whole document
+    def iter_texts(self):
+        if self.selection is None:
+            yield from super().iter_texts()
+            return
+        for routine in self.iter_routines(True):
+            for rung in routine.rungs:
+                yield rung.index, rung.text
+
+    # With a selection the rungs that are walked are not known without a scan of their own
+    def text_count(self):
+        return None if self.selection is not None else len(self.text_spans)
+
+    # Byte offsets of the selected routines, None when the whole document is selected
+    def selected_regions(self):
+        if self.selection is None:
+            return None
+        regions = []
+        for _ in _scan_l5k(self.content, self.program_tasks, True, None, None, self.selection, regions):
+            pass
+        return regions
+
+    # Function to walk the Program (and optionally Add-On Instruction) routines and yield a RoutineRecord per routine
+    # A selection of the call is applied on top of the selection of the document
+    def iter_routines(self, include_aoi=False, selection=None):
+        if self.selection is None or selection is None:
+            return _scan_l5k(self.content, self.program_tasks, include_aoi, None, self.edits,
+                             self.selection if selection is None else selection)
+        routines = _scan_l5k(self.content, self.program_tasks, include_aoi, None, self.edits, self.selection)
+        return (routine for routine in routines if selection.selects(routine))
+
+# Function to tell if a path is an L5K export
+def is_l5k(path):
+    return str(path).lower().endswith('.l5k')
+
+# Function to get a parsed document from either a file path or an already loaded document
+# A file loaded with a RoutineSelection only parses the selected routines, a loaded document keeps its own selection
+def load_document(source, selection=None):
+    if isinstance(source, ProjectDocument):
+        return source
+    if is_l5k(source):
+        return L5KDocument.load(source, selection)
+    return L5XDocument.load(source, selection)
+
+# Files larger than this are read in streaming mode by the report operations unless told otherwise
+STREAM_THRESHOLD = 100 * 1024 * 1024
+
+# Patterns of the controller name in the Controller element and in the TargetName of the root element of an L5X
+# export and in the CONTROLLER block of an L5K export
+CONTROLLER_NAME_PATTERN = re.compile(rb'<Controller\s[^>]*?\bName="([^"]*)"')
+TARGET_NAME_PATTERN = re.compile(rb'\bTargetName="([^"]*)"')
+L5K_CONTROLLER_NAME_PATTERN = re.compile(rb'^[ \t]*CONTROLLER[ \t]+(\w+)', re.M)
+
+# Function to read the name of the controller of an L5X or L5K export from the start of the file
+# The Controller element comes right after the header so only the first bytes are read, the file name is used if it is missing
+def controller_name(source, head_size=64 * 1024):
+    if isinstance(source, ProjectDocument):
+        head = bytes(source.content[:head_size])
+        path = source.path or ''
+    else:
+        with open(source, 'rb') as file:
+            head = file.read(head_size)
+        path = source
+    match = CONTROLLER_NAME_PATTERN.search(head) or TARGET_NAME_PATTERN.search(head) or L5K_CONTROLLER_NAME_PATTERN.search(head)
+    if match:
+        return match.group(1).decode("UTF-8", errors="replace")
+    return os.path.splitext(os.path.basename(path))[0]
+
+# Function to decide if a report operation should stream the source file instead of loading it
+# L5K files are always scanned from a memory map so they are never streamed
+def use_stream(source, stream=None):
+    if isinstance(source, ProjectDocument) or is_l5k(source):
+        return False
+    if stream is None:
+        return os.path.getsize(source) > STREAM_THRESHOLD
+    return stream
+
+# Function to read the task/program map of an L5X file without parsing the rest of it
+def stream_program_tasks(path):
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return l5x_program_tasks(mapped)
+
+# Function to parse the Tasks section of the content of an L5X export on its own, None if there is none
+# The Tasks section is at the end of a controller export so it is found by searching backwards
+def l5x_tasks_element(content):
+    start = content.rfind(b'<Tasks>')
+    end = content.find(b'</Tasks>', start)
+    if start == -1 or end == -1:
+        return None
+    return ET.fromstring(content[start:end + len(b'</Tasks>')])
+
+# Function to read the program to task dictionary of the content of an L5X export
+def l5x_program_tasks(content):
+    program_tasks = {}
+    tasks = l5x_tasks_element(content)
+    if tasks is None:
+        return program_tasks
+    for task in tasks.iter('Task'):
+        for program in task.iter('ScheduledProgram'):
+            program_tasks[program.get('Name')] = task.get('Name')
+    return program_tasks
+
+# Function to walk an L5X file with iterparse and yield the same RoutineRecords as L5XDocument.iter_routines
+# Every element is cleared and detached from its parent once it is processed, so the tree never holds more than
+# the Routine being read. Tasks are only resolved when a program to task dictionary is given and the records of the
+# programs and routines left out by a RoutineSelection are not built.
+def iter_routines_stream(path, include_aoi=False, program_tasks=None, selection=None):
+    stack = []
+    owner_name = task_name = routine_name = None
+    owner_routines = 0
+    rungs = []
+    rung = None
+    text_index = 0
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            stack.append(element)
+            if tag == 'Program' or (include_aoi and tag == 'AddOnInstructionDefinition'):
+                owner_name = element.get('Name')
+                owner_routines = 0
+                if tag == 'Program' and program_tasks is not None:
+                    task_name = program_tasks.get(owner_name, UNSCHEDULED_TASK)
+                else:
+                    task_name = None
+                if selection is not None and not selection.selects_program(task_name, owner_name):
+                    owner_name = None
+            elif tag == 'Routine' and owner_name is not None:
+                owner_routines += 1
+                if selection is None or selection.selects_routine(element.get('Name')):
+                    routine_name = element.get('Name')
+                    rungs = []
+            elif tag == 'Rung':
+                rung = element
+            continue
+
+        stack.pop()
+        if tag == 'Text':
+            if rung is not None:
+                rung_text_index = text_index
+            elif routine_name is not None:
+                rungs.append(RungRecord(text_index, task_name, owner_name, routine_name, None, None, _element_text(element), None))
+            text_index += 1
+        elif tag == 'Rung':
+            if routine_name is not None:
+                rungs.append(_rung_record(element, rung_text_index if element.find('Text') is not None else None,
+                                          task_name, owner_name, routine_name))
+            rung = None
+        elif tag == 'Routine' and routine_name is not None:
+            yield RoutineRecord(task_name, owner_name, routine_name, rungs)
+            routine_name = None
+        elif tag == 'Program' or (include_aoi and tag == 'AddOnInstructionDefinition'):
+            if tag == 'Program' and owner_name is not None and owner_routines == 0 and (selection is None or selection.selects_routine(None)):
+                yield RoutineRecord(task_name, owner_name, None, ())
+            owner_name = None
+        if rung is None:
+            element.clear()
+            if stack:
+                del stack[-1][-1]
+
+# Function to yield the RoutineRecords of a source from the project index, a loaded document or by streaming the file
+# Files are read through the index cache when it is on, the cached records hold the Add-On Instruction routines
+# (the ones without a task) and the tasks of the programs so every call can be answered from the same entry
+# A RoutineSelection keeps only the selected routines, tasks are resolved whenever tasks are selected
+def iter_source_routines(source, include_aoi=False, stream=None, tasks=True, selection=None):
+    if isinstance(source, IncrementalIndex):
+        return source.iter_routines(include_aoi, selection)
+    index = project_index(source, stream)
+    if index is not None:
+        return index.iter_routines(include_aoi, selection)
+    cache = index_cache()
+    if cache is not None and not isinstance(source, ProjectDocument):
+        key = cache.file_key(source)
+        # a selection only reads the cache when the whole file is in it, otherwise only the selection is parsed
+        if selection is None or os.path.exists(cache.entry_path(key, 'routines')):
+            routines = cache.iter_routines(key, lambda: _iter_source_routines(source, True, stream, True))
+            return (routine for routine in routines if (include_aoi or routine.task is not None) and
+                    (selection is None or selection.selects(routine)))
+    return _iter_source_routines(source, include_aoi, stream, tasks or (selection is not None and selection.tasks is not None), selection)
+
+# A selection is loaded with only the selected subtrees parsed instead of streaming the whole file
+def _iter_source_routines(source, include_aoi, stream, tasks, selection=None):
+    if selection is None and use_stream(source, stream):
+        return iter_routines_stream(source, include_aoi, stream_program_tasks(source) if tasks else None, selection)
+    return load_document(source, selection).iter_routines(include_aoi, selection)
+
+# Version of what is stored in the index cache, entries of another version are never read
+CACHE_SCHEMA_VERSION = 2
+
+# Folder the menu and the front ends keep the index cache in
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'xml_manipulation_tool_rockwell')
+
+# Folder of the index cache, the functions called from another program only cache when XML_TOOL_CACHE_DIR is set or
+# use_cache() was called, an empty XML_TOOL_CACHE_DIR turns the cache off for the menu and the front ends as well
+CACHE_DIR = os.environ.get('XML_TOOL_CACHE_DIR', '')
+
+# Size the index cache is kept under by removing the least recently used entries, set with XML_TOOL_CACHE_SIZE in bytes
+CACHE_SIZE_LIMIT = int(os.environ.get('XML_TOOL_CACHE_SIZE', 1024 * 1024 * 1024))
+
+# Class of the on-disk cache of the indexes derived from an L5X file
+# Entries are keyed by the hash of the file content and the schema version, so a file that is copied or renamed
+# is still found and a changed file never is. Hashing is skipped when the path, size and modification time of a
+# file are the same as when it was last hashed. Entries are written to a temporary file and renamed into place so
+# that parallel processes never read a partial entry, and the least recently used ones are removed above size_limit.
+class IndexCache:
+    def __init__(self, folder, size_limit=CACHE_SIZE_LIMIT):
+        self.folder = folder
+        self.size_limit = size_limit
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        # the entries are unpickled, so a folder other users can write to could make this process run their code
+        info = os.stat(folder)
+        if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o022):
+            raise PermissionError(f"the cache folder '{folder}' can be written by other users")
+
+    # Function to get the content hash of a file, through the stat shortcut when the file has not changed
+    def file_key(self, path):
+        path = os.path.abspath(path)
+        stamp = file_stamp(path)
+        stat_path = os.path.join(self.folder, "stat-" + hashlib.sha1(path.encode("UTF-8")).hexdigest() + ".txt")
+        try:
+            with open(stat_path, 'r', encoding="UTF-8") as file:
+                saved_stamp, key = file.read().rsplit(' ', 1)
+            if saved_stamp == stamp:
+                return key
+        except (OSError, ValueError):
+            pass
+        key = file_digest(path)
+        self._write(stat_path, lambda file: file.write(f"{stamp} {key}".encode("UTF-8")))
+        return key
+
+    # Path of the entry of a kind of index for a key
+    def entry_path(self, key, kind):
+        return os.path.join(self.folder, f"{key}-{kind}-v{CACHE_SCHEMA_VERSION}.pickle")
+
+    # Function to get an index from the cache or build it with build() and store it
+    def get(self, key, kind, build):
+        path = self.entry_path(key, kind)
+        try:
+            with phase("read cache"), open(path, 'rb') as file:
+                value = pickle.load(file)
+            self._touch(path)
+            return value
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self._remove(path)
+        value = build()
+        with phase("write cache"):
+            self._write(path, lambda file: pickle.dump(value, file, pickle.HIGHEST_PROTOCOL))
+        self.evict()
+        return value
+
+    # Function to yield the RoutineRecords of a key from the cache, or from build() while they are written to the cache
+    # Every routine is a pickle of its own so neither reading nor writing an entry holds all the records in memory
+    def iter_routines(self, key, build):
+        path = self.entry_path(key, 'routines')
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return self._store_routines(path, build())
+        try:
+            if pickle.load(file) != ('routines', CACHE_SCHEMA_VERSION):
+                raise ValueError(f"Invalid cache entry {path}")
+        except Exception:
+            file.close()
+            self._remove(path)
+            return self._store_routines(path, build())
+        self._touch(path)
+        return self._load_routines(file)
+
+    def _load_routines(self, file):
+        with file:
+            while True:
+                try:
+                    task, program, routine, rungs = pickle.load(file)
+                except EOFError:
+                    return
+                yield RoutineRecord(task, program, routine, [RungRecord._make(rung) for rung in rungs])
+
+    def _store_routines(self, path, routines):
+        temporary = temporary_path(path)
+        complete = False
+        try:
+            with open(temporary, 'wb') as file:
+                pickle.dump(('routines', CACHE_SCHEMA_VERSION), file, pickle.HIGHEST_PROTOCOL)
+                for routine in routines:
+                    # plain tuples so the entry can be read whatever module the records were made in
+                    pickle.dump((routine.task, routine.program, routine.routine, [tuple(rung) for rung in routine.rungs]),
+                                file, pickle.HIGHEST_PROTOCOL)
+                    yield routine
+            os.replace(temporary, path)
+            complete = True
+            self.evict()
+        finally:
+            if not complete:
+                self._remove(temporary)
+
+    # Function to write a file of the cache through a temporary file
+    def _write(self, path, write):
+        temporary = temporary_path(path)
+        try:
+            with open(temporary, 'wb') as file:
+                write(file)
+            os.replace(temporary, path)
+        except OSError:
+            self._remove(temporary)
 
-# Function to parse all text tags at the root level of XML
-def parse_all_text_tags_root(xml_content):
-    root = ET.fromstring(xml_content)
-    return root
-
-# Function to parse all text tags within Text elements of XML
-def parse_all_text_tags_text(xml_content):
-    root = ET.fromstring(xml_content)
-
-    text_tags = root.findall('.//Text')
-    
-    texts = [text.text.strip() for text in text_tags if text.text is not None]
-
-    return texts
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-# Function to replace specific tags in a text using a replacement dictionary
+    # Function to mark an entry as used, an entry that was evicted meanwhile has been read all the same
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # Function to get the (modification time, size, path) of every entry, entries that another thread or process
+    # removes meanwhile are left out
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.pickle'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    # Function to remove the least recently used entries until the cache is under its size limit
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.size_limit:
+                break
+            self._remove(path)
+            total -= size
+
+    # Total size in bytes and number of the entries of the cache
+    def size(self):
+        entries = self.entries()
+        return sum(size for _, size, _ in entries), len(entries)
+
+    # Function to remove every file of the cache, returns the number of removed files
+    def clear(self):
+        removed = 0
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and (entry.name.endswith(('.pickle', '.txt', '.tmp'))):
+                self._remove(entry.path)
+                removed += 1
+        return removed
+
+_index_cache = None
+# Folder the cache could not be used in, its error is only printed once
+_index_cache_error = None
+
+# Function to get the size and modification time of a file, a file with the same stamp is taken as unchanged
+def file_stamp(path):
+    stat = os.stat(path)
+    return f"{stat.st_size} {stat.st_mtime_ns}"
+
+# Function to get the temporary file a file is written to before it is renamed into place, the process and the thread
+# are in its name so that operations running side by side never write to the same temporary file
+def temporary_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+# Function to get the hash of the content of a file, read in chunks
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(4 * 1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to turn the index cache on in its default folder, the menu and the front ends call it when they start
+# A folder or an empty value set in XML_TOOL_CACHE_DIR is kept, the variable passes the folder on to worker processes
+def use_cache():
+    global CACHE_DIR
+    CACHE_DIR = os.environ.setdefault('XML_TOOL_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+# Function to get the index cache of CACHE_DIR, None when the cache is turned off or the folder cannot be used
+def index_cache():
+    global _index_cache, _index_cache_error
+    if not CACHE_DIR:
+        return None
+    if _index_cache is None or _index_cache.folder != CACHE_DIR:
+        try:
+            _index_cache = IndexCache(CACHE_DIR)
+        except OSError as error:
+            if _index_cache_error != CACHE_DIR:
+                _index_cache_error = CACHE_DIR
+                print(f"Error: The cache is turned off, {error}")
+            return None
+    return _index_cache
+
+# Function to clear the index cache, returns the number of removed files
+def clear_cache():
+    cache = index_cache()
+    if cache is None:
+        print("The cache is turned off")
+        return 0
+    removed = cache.clear()
+    print(f"Removed {removed} files from the cache at {cache.folder}")
+    return removed
+
+# Pattern of a tag operand in rung text: a tag name followed by any member (.Name) or index ([...]) accesses
+# The look-behind keeps a match from starting inside another operand, so Bus[1].Obj is never found in HWBus[1].Obj
+OPERAND_TOKEN_PATTERN = re.compile(r'(?<![\w.:\]])[A-Za-z_][\w:]*(?:\.\w+|\[[^\[\]]*\])*')
+
+# Pattern of the expression inside an index access
+INDEX_PATTERN = re.compile(r'\[([^\[\]]*)\]')
+
+# Pattern of a bus object reference
+BUS_PATTERN = re.compile(r'Bus\[\d+\]\.Obj')
+
+# Pattern of the number of a bus object reference that is not part of an HWBus[n].Obj operand
+USED_BUS_PATTERN = re.compile(r'(?<![\w.:\]])Bus\[(\d+)\]\.Obj')
+
+# Pattern of the start of an instruction in rung text, the instruction name and the opening parenthesis, followed
+# by the whole operand list when it can be split at every comma (no parentheses, strings or commas inside an index)
+INSTRUCTION_PATTERN = re.compile(r'([A-Za-z_]\w*)\((?:((?:[^()\[\]\'",]|,|\[[^()\[\]\'",]*\])*)\))?')
+
+# Pattern of the characters that end or nest an operand of an instruction
+OPERAND_DELIMITER_PATTERN = re.compile(r'[(),\[\]\'"]')
+
+# Instruction of a rung: its name, the position of its name in the rung text and the texts of its operands
+# The operands follow the opening parenthesis one comma apart, so their positions are not kept (see operand_starts)
+Instruction = namedtuple('Instruction', ['name', 'start', 'operands'])
+
+# Number of distinct rung texts whose instructions are kept by parse_rung
+RUNG_PARSE_CACHE_SIZE = 64 * 1024
+
+# Function to split a rung (neutral text) into its instructions and their operands
+# Operands are split at the commas that are not inside parentheses, brackets or a string, so expressions
+# (CPT(Dest,(A+B)*2)) and nested indexes (Tag[Idx[2]]) stay in one operand. The branch characters between the
+# instructions are skipped. The result is kept per rung text, so cloned rungs are only parsed once.
+@lru_cache(maxsize=RUNG_PARSE_CACHE_SIZE)
+def parse_rung(text):
+    instructions = []
+    position = 0
+    while True:
+        match = INSTRUCTION_PATTERN.search(text, position)
+        if match is None:
+            break
+        operands = match.group(2)
+        if operands is not None:
+            operands = tuple(operands.split(','))
+            position = match.end()
+        else:
+            operands, position = _split_operands(text, match.end())
+        # the instruction names are a small set so the cached instructions share one string of every name
+        instructions.append(Instruction(sys.intern(match.group(1)), match.start(), operands))
+    return tuple(instructions)
+
+# Function to get the position in the rung text of every operand of an instruction
+def operand_starts(instruction):
+    start = instruction.start + len(instruction.name) + 1
+    for operand in instruction.operands:
+        yield start
+        start += len(operand) + 1
+
+# Function to split the operand list that starts at a position of a rung when it has nested parentheses, brackets
+# or strings, returns the operands and the position after the closing parenthesis
+def _split_operands(text, position):
+    operands = []
+    start = position
+    depth = 0
+    quote = None
+    while True:
+        delimiter = OPERAND_DELIMITER_PATTERN.search(text, position)
+        if delimiter is None:
+            operands.append(text[start:])
+            return tuple(operands), len(text)
+        character = delimiter.group()
+        position = delimiter.end()
+        if quote is not None:
+            if character == quote:
+                quote = None
+        elif character in '\'"':
+            quote = character
+        elif character in '([':
+            depth += 1
+        elif character in ')]':
+            if depth > 0:
+                depth -= 1
+            elif character == ')':
+                operands.append(text[start:position - 1])
+                return tuple(operands), position
+        elif depth == 0:
+            operands.append(text[start:position - 1])
+            start = position
+
+# Class that finds every key of a replacement dictionary in a single pass over a text
+# Operands are matched with OPERAND_TOKEN_PATTERN and each one is looked up in the dictionary, longest prefix first,
+# so a key only matches a whole operand or the part of it before a member or index access (Tag matches Tag.Value
+# but never Tag_1 or Bus[12].Obj for Bus[1].Obj). Only the operands of the instructions found by parse_rung are
+# searched, so an instruction name is never taken for a tag. Keys that are not operands are found with one alternation regex.
+class TagReplacer:
+    def __init__(self, replacement_dict):
+        self.replacement_dict = {str(key): str(value) for key, value in replacement_dict.items() if str(key)}
+        self.token_keys = {key for key in self.replacement_dict if OPERAND_TOKEN_PATTERN.fullmatch(key)}
+        literal_keys = sorted((key for key in self.replacement_dict if key not in self.token_keys), key=len, reverse=True)
+        self.literal_pattern = None
+        if literal_keys:
+            self.literal_pattern = re.compile(r'(?<![\w.:])(?:' + '|'.join(map(re.escape, literal_keys)) + r')(?!\w)')
+
+    # Function to get the longest key that is a prefix of an operand ending at a member or index access
+    def _operand_key(self, operand):
+        if operand in self.token_keys:
+            return operand
+        for end in range(len(operand) - 1, 0, -1):
+            if operand[end] in '.[' and operand[:end] in self.token_keys:
+                return operand[:end]
+        return None
+
+    # Function to find the keys among the operands of a region of the text, including operands used as an index
+    def _find_operands(self, text, start, end, matches):
+        for match in OPERAND_TOKEN_PATTERN.finditer(text, start, end):
+            key = self._operand_key(match.group())
+            if key is not None:
+                matches.append((match.start(), match.start() + len(key), key))
+            if '[' in match.group():
+                for index in INDEX_PATTERN.finditer(text, match.start(), match.end()):
+                    self._find_operands(text, index.start(1), index.end(1), matches)
+
+    # Function to find the (start, end, key) of every key in the text in order
+    def find(self, text):
+        matches = []
+        if self.token_keys:
+            for instruction in parse_rung(text):
+                start = instruction.start + len(instruction.name) + 1
+                end = start + sum(map(len, instruction.operands)) + len(instruction.operands) - 1
+                self._find_operands(text, start, end, matches)
+        if self.literal_pattern is not None:
+            matches.extend((match.start(), match.end(), match.group()) for match in self.literal_pattern.finditer(text))
+            matches.sort()
+        return matches
+
+    # Function to check if any key is in the text
+    def search(self, text):
+        return bool(self.find(text))
+
+    # Function to replace the keys in one pass, only the first occurrence of each key if first_only is set
+    def replace(self, text, first_only=False):
+        pieces = []
+        position = 0
+        seen = set()
+        for start, end, key in self.find(text):
+            if start < position or (first_only and key in seen):
+                continue
+            seen.add(key)
+            pieces.append(text[position:start])
+            pieces.append(self.replacement_dict[key])
+            position = end
+        if not pieces:
+            return text
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+# Function to get a TagReplacer for a replacement dictionary, building it only if it was not built already
+def tag_replacer(replacement):
+    if isinstance(replacement, TagReplacer):
+        return replacement
+    return TagReplacer(replacement)
+
+# Function to replace specific tags in a rung that uses a bus, only the first occurrence of each tag is replaced
 def replace_tags(text, replacement_dict):
-    pattern = r'Bus\[\d+\]\.Obj'
-    if re.search(pattern, text):
-        for key in replacement_dict.keys():
-            text = text.replace(key,replacement_dict[key],1)
+    if BUS_PATTERN.search(text):
+        text = tag_replacer(replacement_dict).replace(text, first_only=True)
     return text
 
-# Function to replace specific bus-related tags in a text using a replacement dictionary and a list of bus items
-def replace_bus(text, replacement_dict,lst):
-    pattern = r'Bus\[\d+\]\.Obj'
-    if re.search(pattern, text):
-        for i in lst:
-            if i in text:
-                for key in replacement_dict.keys():
-                    text = text.replace(key,replacement_dict[key],1)
-    return text
-
-# Function to parse all text tags within Text elements of XML
-def parse_all_text_tags(xml_content):
-    root = ET.fromstring(xml_content)
-
-    text_tags = root.findall('.//Text')
-    
-    texts = [text.text.strip() for text in text_tags if text.text is not None]
-
-    return texts
-
-# Quicksort algorithm for sorting
-# Partition
-def partition(array, low, high):
- 
-    pivot = array[high]
- 
-    i = low - 1
- 
-    for j in range(low, high):
-        if array[j] <= pivot:
-            i = i + 1
-            (array[i], array[j]) = (array[j], array[i])
- 
-    (array[i + 1], array[high]) = (array[high], array[i + 1])
- 
-    return i + 1
- 
-# Quicksort 
-def quicksort(array, low, high):
-    if low < high:
-        pi = partition(array, low, high)
- 
-        quicksort(array, low, pi - 1)
- 
-        quicksort(array, pi + 1, high)
-
-
-# Function to find numbers from a list of numbers that have not yet been allocated to a bus
-def unallocated_number(allocated_dict,numbers):
-    for i in numbers:
-        if(allocated_dict[i] == 0):
-            return i
-    return -1
+# Function to split a rung into the operand lists of its instructions
+def operand_groups(text):
+    return [instruction.operands for instruction in parse_rung(text)]
+
+# Record of one use of a bus object: the rung it is in and the first operand (tag) of the instruction that uses it,
+# index is the position of the rung's Text element in the document
+BusReference = namedtuple('BusReference', ['program', 'routine', 'rung', 'tag', 'index'])
+
+# Class that maps every bus operand (an operand holding Bus[n].Obj) to its references, built in a single pass
+# over the rungs. It also keeps the numbers of every [n].Obj operand for the bus number list.
+# The references are kept in columns instead of a record each: every bus operand has the number of its reference (an
+# array of the numbers once it is used more than once, most buses are used once), and a reference is its tag, the
+# (program, routine, rung) place of its rung and its Text position (-1 for none) at that number. The tags, bus operands and places are interned in the index, so a large project holds one
+# string of every name instead of millions of small objects. BusReference records are only built by references_of.
+class BusIndex:
+    def __init__(self):
+        self.references = {}
+        self.reference_tags = []
+        self.reference_places = []
+        self.reference_positions = array('i')
+        self.object_numbers = set()
+        # numbers of the Bus[n].Obj operands of the rungs that use an HWBus, they are not reported but are in use
+        self.hwbus_rung_numbers = set()
+        self.interned = {}
+
+    # Function to build the index from RoutineRecords, total is the number of rungs (or a function that counts them)
+    # the progress of the index is told against
+    @classmethod
+    def build(cls, routines, total=None):
+        index = cls()
+        rungs = 0
+        with phase("index"), gc_paused():
+            progress_step("index", total)
+            for routine in routines:
+                for rung in routine.rungs:
+                    index.add_rung(rung)
+                rungs += len(routine.rungs)
+                advance(len(routine.rungs))
+        count("rungs scanned", rungs)
+        return index
+
+    # Function to add the bus references of a rung, rungs that use an HWBus only add the numbers of their buses
+    def add_rung(self, rung):
+        numbers, buses = rung_buses(rung.text)
+        self.object_numbers.update(numbers)
+        if not buses:
+            if "HWBus[" in rung.text:
+                self.hwbus_rung_numbers.update(used_bus_numbers(rung.text))
+            return
+        interned = self.interned
+        place = (rung.program, rung.routine, rung.number)
+        place = interned.setdefault(place, place)
+        position = -1 if rung.index is None else rung.index
+        for bus, tag in buses:
+            number = len(self.reference_tags)
+            bus_references = self.references.get(bus)
+            if bus_references is None:
+                self.references[interned.setdefault(bus, bus)] = number
+            elif isinstance(bus_references, int):
+                self.references[bus] = array('i', (bus_references, number))
+            else:
+                bus_references.append(number)
+            self.reference_tags.append(interned.setdefault(tag, tag))
+            self.reference_places.append(place)
+            self.reference_positions.append(position)
+
+    # Function to get the numbers of the references of a bus operand
+    def reference_numbers(self, bus):
+        numbers = self.references.get(bus, ())
+        return (numbers,) if isinstance(numbers, int) else numbers
+
+    # Function to yield the BusReference of every use of a bus operand
+    def references_of(self, bus):
+        for number in self.reference_numbers(bus):
+            program, routine, rung = self.reference_places[number]
+            position = self.reference_positions[number]
+            yield BusReference(program, routine, rung, self.reference_tags[number], None if position < 0 else position)
+
+    # Bus operands sorted by bus number
+    def buses(self):
+        return sorted(self.references, key=lambda bus: (bus_number(bus), bus))
+
+    # Number of times a bus operand is used
+    def count(self, bus):
+        return len(self.reference_numbers(bus))
+
+    # First operand of every instruction that uses a bus operand
+    def tags(self, bus):
+        return [self.reference_tags[number] for number in self.reference_numbers(bus)]
+
+    # Numbers of every Bus[n].Obj in use, the ones of the rungs that use an HWBus included
+    def bus_numbers(self):
+        return {bus_number(bus) for bus in self.references} | self.hwbus_rung_numbers
+
+    # Rows of bus_count_with_tags.csv: bus operand, count and the tags that use it
+    def rows(self):
+        return [[bus, self.count(bus), self.tags(bus)] for bus in self.buses()]
+
+    # Rows of bus_count_with_tags.csv and the sorted numbers of bus_list_numbers.csv
+    # A row is a list of its own so the collector is paused while the rows of a large project are built
+    def reports(self):
+        with gc_paused():
+            return self.rows(), sorted(self.object_numbers)
+
+# Function to get the numbers of the [n].Obj operands and the (bus operand, tag) of every use of a bus in a rung text
+# The tag is the first operand of the instruction, rungs that use an HWBus have none
+def rung_buses(text):
+    numbers = []
+    buses = []
+    if "Bus[" not in text or "HWBus[" in text:
+        return numbers, buses
+    for operands in operand_groups(text):
+        for operand in operands:
+            if "].Obj" in operand:
+                number = bracket_number(operand)
+                if number is not None:
+                    numbers.append(number)
+            if "Bus[" in operand and BUS_PATTERN.search(operand):
+                buses.append((operand, operands[0]))
+    return numbers, buses
+
+# Function to get the numbers of every Bus[n].Obj operand of a rung text, the HWBus[n].Obj operands left out
+def used_bus_numbers(text):
+    return [int(number) for number in USED_BUS_PATTERN.findall(text)]
+
+# Function to get the number between the first pair of brackets of an operand or None if it is not a number
+def bracket_number(operand):
+    match = INDEX_PATTERN.search(operand)
+    if match is None or not match.group(1).isdigit():
+        return None
+    return int(match.group(1))
+
+# Function to get the n of the Bus[n].Obj in a bus operand
+def bus_number(bus):
+    return int(re.search(r'Bus\[(\d+)\]\.Obj', bus).group(1))
+
+# Function to get the BusIndex of a source, the index of a loaded document is kept until the document is edited
+# A RoutineSelection only indexes the selected routines
+def bus_index(source, stream=None, selection=None):
+    if isinstance(source, ProjectDocument) and selection is None:
+        if 'bus_index' not in source.derived:
+            source.derived['bus_index'] = BusIndex.build(source.iter_routines(True), source.text_count)
+        return source.derived['bus_index']
+    return BusIndex.build(iter_source_routines(source, True, stream, tasks=False, selection=selection))
+
+# Function to get the BusIndex of the whole export of a document that only holds a selection of its routines
+# The bytes are scanned without parsing them, the references have no program, routine or rung
+def project_bus_index(doc):
+    if isinstance(doc, L5KDocument):
+        return BusIndex.build(_scan_l5k(doc.content, None, True, None, doc.edits))
+    return scan_bus_index(doc.content_bytes())
+
+# Patterns of the start and end of the sections of an L5X export that hold the routines
+ROUTINE_SECTION_PATTERN = re.compile(rb'<(AddOnInstructionDefinitions|Programs)(?:\s[^>]*)?>')
+ROUTINE_SECTION_ENDS = {b'AddOnInstructionDefinitions': b'</AddOnInstructionDefinitions>', b'Programs': b'</Programs>'}
+
+# Function to find the (start, end) byte offsets of the Add-On Instruction definitions and the Programs of an L5X export
+def routine_sections(content):
+    sections = []
+    position = 0
+    while True:
+        match = ROUTINE_SECTION_PATTERN.search(content, position)
+        if match is None:
+            return sections
+        end = content.find(ROUTINE_SECTION_ENDS[match.group(1)], match.end())
+        if end == -1:
+            return sections
+        sections.append((match.end(), end))
+        position = end
+
+# Function to find the selected Programs and Add-On Instructions of an L5X export and their selected routines
+# Returns the start tag match, the end offset and the (start, end) offsets of the selected routines of every selected
+# owner in document order. The owners and routines are found with byte patterns, nothing is parsed but the Tasks when
+# tasks are selected. A Program without routines is only kept when no routines are selected.
+def selected_subtrees(content, selection):
+    program_tasks = l5x_program_tasks(content) if selection.tasks is not None else {}
+    owners = []
+    for section_start, section_end in routine_sections(content):
+        for match, end in _subtree_spans(content, section_start, section_end, OWNER_START_PATTERN):
+            name = _attribute_value(match.group(2))
+            task_name = None if match.group(1) == b'AddOnInstructionDefinition' else program_tasks.get(name, UNSCHEDULED_TASK)
+            if not selection.selects_program(task_name, name):
+                continue
+            routines = [(routine_match.start(), routine_end) for routine_match, routine_end
+                        in _subtree_spans(content, match.end(), end, ROUTINE_START_PATTERN)
+                        if selection.selects_routine(_attribute_value(routine_match.group(2)))]
+            if routines or selection.routines is None:
+                owners.append((match, end, routines))
+    return owners
+
+# Function to find the (start, end) byte offsets of the selected routines of an L5X export, the routine sections
+# when nothing is selected
+def selected_regions(content, selection):
+    if selection is None:
+        return routine_sections(content)
+    return [span for _, _, routines in selected_subtrees(content, selection) for span in routines]
+
+# Function to decode the raw value of an attribute found with a byte pattern
+def _attribute_value(raw):
+    return unescape(raw.decode("UTF-8"), {'&quot;': '"', '&apos;': "'"})
+
+# Function to build the BusIndex of the bytes of an L5X export (the memory map of the file) without parsing it
+# The Text elements of the routine sections (or of the given regions) are found with the byte pattern and only the
+# ones that use a bus are decoded. The references have no program, routine or rung so the index is only used for
+# the reports and the numbers in use.
+def scan_bus_index(content, regions=None):
+    index = BusIndex()
+    rungs = 0
+    with phase("index"), gc_paused():
+        sections = regions if regions is not None else routine_sections(content)
+        progress_step("index", sum(section_end - section_start for section_start, section_end in sections))
+        for section_start, section_end in sections:
+            scanned = section_start
+            for match in TEXT_SPAN_PATTERN.finditer(content, section_start, section_end):
+                cdata = match.start(1) != -1
+                start, end = match.span(1) if cdata else match.span(2)
+                if start == -1:
+                    continue
+                rungs += 1
+                advance(1, match.end() - scanned)
+                scanned = match.end()
+                if content.find(b'Bus[', start, end) == -1:
+                    continue
+                text = _span_text(bytes(content[start:end]), cdata).strip()
+                index.add_rung(RungRecord(None, None, None, None, None, None, text, None))
+            advance(0, section_end - scanned)
+    count("rungs scanned", rungs)
+    return index
+
+# Function to get the rows of bus_count_with_tags.csv and the sorted numbers of bus_list_numbers.csv of a source
+# They are exported from the project index when it is on. Otherwise L5X files and documents that were neither parsed
+# nor edited are scanned from their bytes and the reports of a file are kept in the index cache when it is on.
+# A RoutineSelection only reports the buses of the selected routines, the other subtrees of an L5X file are skipped.
+def bus_reports(source, stream=None, selection=None):
+    if isinstance(source, IncrementalIndex):
+        return source.bus_reports(selection)
+    index = project_index(source, stream)
+    if index is not None:
+        return index.bus_reports(selection)
+    # a document only holds its own selection already
+    if isinstance(source, ProjectDocument) and selection == source.selection:
+        selection = None
+
+    def build():
+        if isinstance(source, L5XDocument) and selection is None and not source.edits and 'root' not in source.__dict__:
+            index = scan_bus_index(source.content, source.selected_regions())
+        elif not isinstance(source, ProjectDocument) and not is_l5k(source):
+            with phase("read"):
+                content = _map_file(source)
+            index = scan_bus_index(content, selected_regions(content, selection))
+        else:
+            index = bus_index(source, stream, selection)
+        return index.reports()
+    cache = index_cache()
+    if cache is None or isinstance(source, ProjectDocument) or selection is not None:
+        return build()
+    return cache.get(cache.file_key(source), 'bus_reports', build)
+
+# Version of the tables of the project index, an index of another version is built again
+INDEX_SCHEMA_VERSION = 1
+
+# SQLite file of the project index, set XML_TOOL_INDEX_DB to a file to turn the index on
+INDEX_DB = os.path.abspath(os.environ['XML_TOOL_INDEX_DB']) if os.environ.get('XML_TOOL_INDEX_DB') else ''
+
+# Tables of the project index, ids follow document order. Add-On Instructions are programs with aoi set and no task,
+# the programs that are not scheduled have no task either. A rung that is a free Text element of a non-ladder
+# routine has ladder unset and no number, type or comments, comment_count is the number of languages of the comment.
+INDEX_TABLES = (
+    "CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE tasks (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE programs (id INTEGER PRIMARY KEY, task_id INTEGER REFERENCES tasks(id), name TEXT NOT NULL, aoi INTEGER NOT NULL)",
+    "CREATE TABLE routines (id INTEGER PRIMARY KEY, program_id INTEGER NOT NULL REFERENCES programs(id), name TEXT)",
+    "CREATE TABLE rungs (id INTEGER PRIMARY KEY, routine_id INTEGER NOT NULL REFERENCES routines(id), text_index INTEGER,"
+    " number TEXT, type TEXT, text TEXT NOT NULL, ladder INTEGER NOT NULL, comment_count INTEGER NOT NULL)",
+    "CREATE TABLE operands (rung_id INTEGER NOT NULL REFERENCES rungs(id), instruction TEXT NOT NULL,"
+    " position INTEGER NOT NULL, operand TEXT NOT NULL)",
+    "CREATE TABLE bus_references (rung_id INTEGER NOT NULL REFERENCES rungs(id), bus TEXT NOT NULL,"
+    " bus_number INTEGER NOT NULL, tag TEXT NOT NULL)",
+    "CREATE TABLE bus_objects (rung_id INTEGER NOT NULL REFERENCES rungs(id), number INTEGER NOT NULL)",
+    "CREATE TABLE comments (rung_id INTEGER NOT NULL REFERENCES rungs(id), language TEXT, comment TEXT)",
+    "CREATE INDEX programs_task ON programs(task_id)",
+    "CREATE INDEX routines_program ON routines(program_id)",
+    "CREATE INDEX rungs_routine ON rungs(routine_id)",
+    "CREATE INDEX rungs_uncommented ON rungs(routine_id) WHERE ladder AND comment_count = 0",
+    "CREATE INDEX operands_operand ON operands(operand)",
+    "CREATE INDEX operands_rung ON operands(rung_id)",
+    "CREATE INDEX bus_references_bus ON bus_references(bus_number, bus)",
+    "CREATE INDEX bus_references_rung ON bus_references(rung_id)",
+    "CREATE INDEX bus_objects_number ON bus_objects(number)",
+    "CREATE INDEX comments_rung ON comments(rung_id)",
+)
+
+# Query of the place and text of the rungs, the WHERE clause is added by every query
+# Task name of a program in the queries, NULL for an Add-On Instruction and the ? parameter for a program that is not
+# scheduled in any task, the same as the task names of the comment export
+TASK_COLUMN = "CASE WHEN programs.aoi THEN NULL ELSE COALESCE(tasks.name, ?) END"
+
+RUNG_QUERY = f"""SELECT rungs.id, {TASK_COLUMN}, programs.name, routines.name, rungs.number, rungs.text FROM rungs
+    JOIN routines ON routines.id = rungs.routine_id JOIN programs ON programs.id = routines.program_id
+    LEFT JOIN tasks ON tasks.id = programs.task_id """
+
+# Record of a rung found by a query of the project index, task is None for Add-On Instructions and UNSCHEDULED_TASK
+# for the programs that are not scheduled in any task
+IndexedRung = namedtuple('IndexedRung', ['task', 'program', 'routine', 'number', 'text'])
+
+# Class of the SQLite index of a project: tasks, programs, routines, rungs, the operands of every instruction, the bus
+# references and the comments. It holds the last file it was refreshed with and is built again when the content of
+# the file changes, so the reports are exported from it and queries such as the rungs that use an operand are
+# answered from the indexed tables without reading the file.
+class ProjectIndex:
+    def __init__(self, path):
+        self.path = path
+        # autocommit, the build runs in one explicit transaction so readers see either the old or the new index
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        # a new database gives the pages of the dropped tables back so it shrinks to the size of the current project
+        self.connection.execute("PRAGMA auto_vacuum = FULL")
+
+    def close(self):
+        self.connection.close()
+
+    # Function to get a value of the meta table, None when the index was never built
+    def meta(self, name):
+        try:
+            row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    # Function to build the index again if it does not hold the current content of the file at path
+    # The content hash is only computed when the size or modification time of the file changed
+    # routines is called to get the RoutineRecords (with the Add-On Instructions and the tasks) when a build is needed
+    # Returns True if the index was built
+    def refresh(self, path, routines):
+        path = os.path.abspath(path)
+        stamp = file_stamp(path)
+        if self.meta('schema') == str(INDEX_SCHEMA_VERSION) and self.meta('path') == path:
+            if self.meta('stamp') == stamp:
+                return False
+            digest = file_digest(path)
+            if self.meta('digest') == digest:
+                self.connection.execute("UPDATE meta SET value = ? WHERE name = 'stamp'", (stamp,))
+                return False
+        else:
+            digest = file_digest(path)
+        self.build(routines(), {'schema': str(INDEX_SCHEMA_VERSION), 'path': path, 'stamp': stamp, 'digest': digest})
+        return True
+
+    # Function to fill the tables with the RoutineRecords in a single transaction
+    def build(self, routines, meta):
+        connection = self.connection
+        with phase("index"):
+            connection.execute("BEGIN")
+            try:
+                for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                    connection.execute(f'DROP TABLE "{name}"')
+                for statement in INDEX_TABLES:
+                    connection.execute(statement)
+                connection.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+                rungs = self._insert_routines(routines)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        count("rungs scanned", rungs)
+
+    def _insert_routines(self, routines):
+        connection = self.connection
+        tasks = {}
+        programs = {}
+        rung_id = 0
+        for routine in routines:
+            aoi = routine.task is None
+            task_name = None if routine.task in (None, UNSCHEDULED_TASK) else routine.task
+            if task_name is not None and task_name not in tasks:
+                tasks[task_name] = connection.execute("INSERT INTO tasks (name) VALUES (?)", (task_name,)).lastrowid
+            if (aoi, routine.program) not in programs:
+                programs[aoi, routine.program] = connection.execute(
+                    "INSERT INTO programs (task_id, name, aoi) VALUES (?, ?, ?)",
+                    (tasks.get(task_name), routine.program, aoi)).lastrowid
+            routine_id = connection.execute("INSERT INTO routines (program_id, name) VALUES (?, ?)",
+                                            (programs[aoi, routine.program], routine.routine)).lastrowid
+            rung_rows, operand_rows, bus_rows, object_rows, comment_rows = [], [], [], [], []
+            for rung in routine.rungs:
+                rung_id += 1
+                rung_rows.append((rung_id, routine_id, rung.index, rung.number, rung.type, rung.text,
+                                  rung.comments is not None, len(rung.comments or ())))
+                for instruction in parse_rung(rung.text):
+                    operand_rows.extend((rung_id, instruction.name, position, operand)
+                                        for position, operand in enumerate(instruction.operands) if operand)
+                numbers, buses = rung_buses(rung.text)
+                object_rows.extend((rung_id, number) for number in numbers)
+                bus_rows.extend((rung_id, bus, bus_number(bus), tag) for bus, tag in buses)
+                comment_rows.extend((rung_id, language, comment) for language, comment in rung.comments or ())
+            connection.executemany("INSERT INTO rungs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rung_rows)
+            connection.executemany("INSERT INTO operands VALUES (?, ?, ?, ?)", operand_rows)
+            connection.executemany("INSERT INTO bus_references VALUES (?, ?, ?, ?)", bus_rows)
+            connection.executemany("INSERT INTO bus_objects VALUES (?, ?)", object_rows)
+            connection.executemany("INSERT INTO comments VALUES (?, ?, ?)", comment_rows)
+        return rung_id
+
+    # Function to yield the RoutineRecords of the index, the same records the file was indexed from
+    def iter_routines(self, include_aoi=False, selection=None):
+        routines = self.connection.execute(
+            """SELECT routines.id, tasks.name, programs.name, programs.aoi, routines.name FROM routines
+            JOIN programs ON programs.id = routines.program_id LEFT JOIN tasks ON tasks.id = programs.task_id
+            ORDER BY routines.id""").fetchall()
+        for routine_id, task_name, program_name, aoi, routine_name in routines:
+            if aoi:
+                if not include_aoi:
+                    continue
+            elif task_name is None:
+                task_name = UNSCHEDULED_TASK
+            if selection is not None and not (selection.selects_program(task_name, program_name) and
+                                              selection.selects_routine(routine_name)):
+                continue
+            comments = {}
+            for rung_id, language, comment in self.connection.execute(
+                    """SELECT comments.rung_id, comments.language, comments.comment FROM comments
+                    JOIN rungs ON rungs.id = comments.rung_id WHERE rungs.routine_id = ? ORDER BY comments.rowid""",
+                    (routine_id,)):
+                comments.setdefault(rung_id, []).append((language, comment))
+            rungs = [RungRecord(text_index, task_name, program_name, routine_name, number, rung_type, text,
+                                tuple(comments.get(rung_id, ())) if ladder else None)
+                     for rung_id, text_index, number, rung_type, text, ladder in self.connection.execute(
+                         "SELECT id, text_index, number, type, text, ladder FROM rungs WHERE routine_id = ? ORDER BY id",
+                         (routine_id,))]
+            yield RoutineRecord(task_name, program_name, routine_name, rungs if routine_name is not None else ())
+
+    # Rows of bus_count_with_tags.csv and the sorted numbers of bus_list_numbers.csv, the same as a BusIndex
+    # A RoutineSelection indexes the selected routines again
+    def bus_reports(self, selection=None):
+        if selection is not None:
+            return BusIndex.build(self.iter_routines(True, selection)).reports()
+        rows = []
+        for bus, tag in self.connection.execute("SELECT bus, tag FROM bus_references ORDER BY bus_number, bus, rowid"):
+            if not rows or rows[-1][0] != bus:
+                rows.append([bus, 0, []])
+            rows[-1][1] += 1
+            rows[-1][2].append(tag)
+        numbers = [number for (number,) in self.connection.execute("SELECT DISTINCT number FROM bus_objects ORDER BY number")]
+        return rows, numbers
+
+    def _rungs(self, where, parameters=()):
+        return [IndexedRung(*row[1:]) for row in self.connection.execute(RUNG_QUERY + where + " ORDER BY rungs.id",
+                                                                         (UNSCHEDULED_TASK,) + parameters)]
+
+    # Function to get the rungs that use an operand, for example Bus[417].Obj or Local:2:I.Data
+    def rungs_using(self, operand):
+        return self._rungs("WHERE rungs.id IN (SELECT rung_id FROM operands WHERE operand = ?)", (operand,))
+
+    # Function to get the rungs that use a number in any of their [n].Obj operands, Bus[n].Obj and HWBus[n].Obj alike
+    # at any position of the instruction (the bus references of the reports only keep the buses of rungs without HWBus)
+    def rungs_using_bus(self, number):
+        return self._rungs("WHERE rungs.id IN (SELECT rung_id FROM operands WHERE operand LIKE '%[' || ? || '].Obj')",
+                           (str(number),))
+
+    # Function to get the ladder rungs that have no comment
+    def uncommented_rungs(self):
+        return self._rungs("WHERE rungs.ladder AND rungs.comment_count = 0")
+
+    # Function to get the (task, program, number of uncommented rungs) of the programs and Add-On Instructions that
+    # have ladder rungs without a comment, the task is named like the task of an IndexedRung
+    def programs_with_uncommented_rungs(self):
+        return self.connection.execute(
+            f"""SELECT {TASK_COLUMN}, programs.name, COUNT(*) FROM rungs
+            JOIN routines ON routines.id = rungs.routine_id JOIN programs ON programs.id = routines.program_id
+            LEFT JOIN tasks ON tasks.id = programs.task_id
+            WHERE rungs.ladder AND rungs.comment_count = 0 GROUP BY programs.id ORDER BY programs.id""",
+            (UNSCHEDULED_TASK,)).fetchall()
+
+# Project index of every thread, a SQLite connection is only used by the thread that opened it
+_project_indexes = threading.local()
+_project_index_lock = threading.RLock()
+
+# Function to get the project index of INDEX_DB refreshed with a source, None when the index is turned off, the
+# source is a document that was changed after it was read or the index cannot be used
+def project_index(source, stream=None):
+    if not INDEX_DB:
+        return None
+    if isinstance(source, ProjectDocument):
+        if not source.is_file_content():
+            return None
+        path = source.path
+    else:
+        path = source
+    try:
+        with _project_index_lock:
+            index = getattr(_project_indexes, 'index', None)
+            if index is None or index.path != INDEX_DB:
+                index = _project_indexes.index = ProjectIndex(INDEX_DB)
+            index.refresh(path, lambda: _iter_source_routines(source, True, stream, True))
+        return index
+    except (sqlite3.Error, OSError) as error:
+        print(f"Error: the project index '{INDEX_DB}' cannot be used ({error}), the file is read instead")
+        return None
+
+# Patterns of the start tag of a Program or Add-On Instruction definition and of a Routine with its name
+OWNER_START_PATTERN = re.compile(rb'<(Program|AddOnInstructionDefinition)\s[^>]*?\bName="([^"]*)"[^>]*>')
+ROUTINE_START_PATTERN = re.compile(rb'<(Routine)\s[^>]*?\bName="([^"]*)"[^>]*>')
+
+# Function to find the subtrees of the elements a start tag pattern finds between start and end
+# Returns the start tag match and the end offset of every element, raises ValueError if an element is not closed
+def _subtree_spans(content, start, end, pattern):
+    spans = []
+    position = start
+    while True:
+        match = pattern.search(content, position, end)
+        if match is None:
+            return spans
+        if content[match.end() - 2:match.end()] == b'/>':
+            close = match.end()
+        else:
+            end_tag = b'</' + match.group(1) + b'>'
+            close = content.find(end_tag, match.end(), end)
+            if close == -1:
+                raise ValueError(f"The {match.group(1).decode()} element at byte {match.start()} is not closed")
+            close += len(end_tag)
+        spans.append((match, close))
+        position = close
+
+# Function to get the digest of a region of a memory view
+def _region_digest(view, start, end):
+    return hashlib.blake2b(view[start:end], digest_size=16).digest()
+
+# Record of a parsed routine subtree: its name, its RungRecords with the Text positions counted from the start of the
+# routine and without task and program, the number of its Text elements and its RoutineBuses (None when it uses no bus)
+RoutineEntry = namedtuple('RoutineEntry', ['name', 'rungs', 'text_count', 'bus_uses'])
+
+# Record of the bus uses of a routine in columns: the distinct [n].Obj numbers and, for every use of a bus in rung
+# order, the bus operand, its number and the tag of the instruction
+RoutineBuses = namedtuple('RoutineBuses', ['numbers', 'buses', 'bus_numbers', 'tags'])
+
+# Record of a Program or Add-On Instruction subtree: its name, the number of its Text elements and its routines as
+# (digest of the routine, number of Text elements of the owner before the routine)
+OwnerEntry = namedtuple('OwnerEntry', ['aoi', 'name', 'text_count', 'routines'])
+
+# Class of the index of an L5X file that is refreshed per Program and Routine when the file changes
+# Every Program and Add-On Instruction subtree is hashed, only the routines of a changed subtree are hashed and only
+# the changed routines are parsed, the records and bus uses of the others are kept from the last refresh. It is a
+# source of the report operations like a file or a document. L5K files, and L5X files whose subtrees cannot be
+# found, are read as a whole on every refresh.
+class IncrementalIndex:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.stamp = None
+        self.owners = {}
+        self.routines = {}
+        self.gaps = {}
+        # digest and number of Text elements before it of every owner in document order
+        self.order = []
+        self.program_tasks = {}
+        # RoutineRecords of a file that was read as a whole
+        self.records = None
+        # one string of every bus operand and tag of the parsed routines, it grows with the names seen while watching
+        self.interned = {}
+        # reports of the whole file, kept until the next change
+        self.reports = None
+
+    # Function to read the changes of the file, returns (parsed routines, routines) or None when it did not change
+    def refresh(self):
+        stamp = file_stamp(self.path)
+        if stamp == self.stamp:
+            return None
+        with phase("index"), gc_paused():
+            if is_l5k(self.path):
+                counts = self._read_whole()
+            else:
+                try:
+                    counts = self._read_subtrees()
+                except (ValueError, ET.ParseError):
+                    counts = self._read_whole()
+        self.stamp = stamp
+        self.reports = None
+        return counts
+
+    def _read_whole(self):
+        doc = load_document(self.path)
+        self.records = list(doc.iter_routines(True))
+        self.owners, self.routines, self.gaps, self.order = {}, {}, {}, []
+        count("rungs scanned", sum(len(routine.rungs) for routine in self.records))
+        return len(self.records), len(self.records)
+
+    def _read_subtrees(self):
+        content = _map_file(self.path)
+        owners, routines, gaps, order = {}, {}, {}, []
+        parsed = [0, 0]
+        try:
+            with memoryview(content) as view:
+                offset = 0
+                position = 0
+                for section_start, section_end in routine_sections(content):
+                    for match, end in _subtree_spans(content, section_start, section_end, OWNER_START_PATTERN):
+                        digest = _region_digest(view, position, match.start())
+                        if digest not in gaps:
+                            gaps[digest] = self.gaps.get(digest)
+                            if gaps[digest] is None:
+                                gaps[digest] = len(_text_starts(content, position, match.start()))
+                        offset += gaps[digest]
+                        digest = _region_digest(view, match.start(), end)
+                        owner = owners.get(digest) or self.owners.get(digest)
+                        if owner is None:
+                            owner = self._read_owner(content, view, match, end, routines, parsed)
+                        owners[digest] = owner
+                        for routine_digest, _ in owner.routines:
+                            routines.setdefault(routine_digest, self.routines.get(routine_digest))
+                        order.append((digest, offset))
+                        offset += owner.text_count
+                        position = end
+            self.program_tasks = stream_program_tasks(self.path)
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+        self.owners, self.routines, self.gaps, self.order, self.records = owners, routines, gaps, order, None
+        count("rungs scanned", parsed[1])
+        return parsed[0], sum(len(owner.routines) for owner in owners.values())
+
+    # Function to index a changed owner, its routines that are not known by their digest are parsed
+    def _read_owner(self, content, view, match, end, routines, parsed):
+        text_starts = _text_starts(content, match.start(), end)
+        owner_routines = []
+        for routine_match, routine_end in _subtree_spans(content, match.end(), end, ROUTINE_START_PATTERN):
+            digest = _region_digest(view, routine_match.start(), routine_end)
+            if routines.get(digest) is None and digest not in self.routines:
+                routines[digest] = _parse_routine(bytes(view[routine_match.start():routine_end]), self.interned)
+                parsed[0] += 1
+                parsed[1] += len(routines[digest].rungs)
+            owner_routines.append((digest, bisect.bisect_left(text_starts, routine_match.start())))
+        return OwnerEntry(match.group(1) == b'AddOnInstructionDefinition', _attribute_value(match.group(2)),
+                          len(text_starts), owner_routines)
+
+    # Function to yield the RoutineRecords of the file, the same records as the ones of a loaded document
+    def iter_routines(self, include_aoi=False, selection=None):
+        if self.records is not None:
+            for routine in self.records:
+                if (include_aoi or routine.task is not None) and (selection is None or selection.selects(routine)):
+                    yield routine
+            return
+        for digest, offset in self.order:
+            owner = self.owners[digest]
+            if owner.aoi and not include_aoi:
+                continue
+            task_name = None if owner.aoi else self.program_tasks.get(owner.name, UNSCHEDULED_TASK)
+            if selection is not None and not selection.selects_program(task_name, owner.name):
+                continue
+            if not owner.routines and not owner.aoi and (selection is None or selection.selects_routine(None)):
+                yield RoutineRecord(task_name, owner.name, None, ())
+            for routine_digest, routine_offset in owner.routines:
+                routine = self.routines[routine_digest]
+                if selection is not None and not selection.selects_routine(routine.name):
+                    continue
+                start = offset + routine_offset
+                yield RoutineRecord(task_name, owner.name, routine.name,
+                                    [rung._replace(index=None if rung.index is None else start + rung.index,
+                                                   task=task_name, program=owner.name) for rung in routine.rungs])
+
+    # Rows of bus_count_with_tags.csv and the sorted numbers of bus_list_numbers.csv, the same as a BusIndex
+    # A RoutineSelection indexes the records of the selected routines again, the reports of the whole file are only
+    # made once for every change of the file
+    def bus_reports(self, selection=None):
+        if selection is not None:
+            return BusIndex.build(self.iter_routines(True, selection)).reports()
+        if self.reports is None:
+            self.reports = self._bus_reports()
+        return self.reports
+
+    def _bus_reports(self):
+        if self.records is not None:
+            return BusIndex.build(self.iter_routines(True)).reports()
+        references = {}
+        bus_numbers = {}
+        numbers = set()
+        for digest, _ in self.order:
+            for routine_digest, _ in self.owners[digest].routines:
+                bus_uses = self.routines[routine_digest].bus_uses
+                if bus_uses is None:
+                    continue
+                numbers.update(bus_uses.numbers)
+                for bus, number, tag in zip(bus_uses.buses, bus_uses.bus_numbers, bus_uses.tags):
+                    tags = references.get(bus)
+                    if tags is None:
+                        tags = references[bus] = []
+                        bus_numbers[bus] = number
+                    tags.append(tag)
+        rows = [[bus, len(references[bus]), references[bus]] for bus in sorted(references, key=lambda bus: (bus_numbers[bus], bus))]
+        return rows, sorted(numbers)
+
+# Function to get the byte offsets of the Text elements of a region of an L5X export
+def _text_starts(content, start, end):
+    return [match.start() for match in TEXT_SPAN_PATTERN.finditer(content, start, end)
+            if content[match.start():match.start() + 5] == b'<Text']
+
+# Function to parse the bytes of a Routine element into a RoutineEntry
+# The bus operands and tags are interned in the interned dictionary
+def _parse_routine(routine_bytes, interned):
+    routine = ET.fromstring(routine_bytes)
+    texts = list(routine.iter('Text'))
+    positions = {id(text): i for i, text in enumerate(texts)}
+    rungs = _routine_rungs(routine, positions, None, None, routine.get('Name'))
+    numbers = set()
+    bus_uses = RoutineBuses(None, [], array('i'), [])
+    for rung in rungs:
+        rung_numbers, buses = rung_buses(rung.text)
+        numbers.update(rung_numbers)
+        for bus, tag in buses:
+            bus_uses.buses.append(interned.setdefault(bus, bus))
+            bus_uses.bus_numbers.append(bus_number(bus))
+            bus_uses.tags.append(interned.setdefault(tag, tag))
+    if not numbers and not bus_uses.buses:
+        bus_uses = None
+    else:
+        bus_uses = bus_uses._replace(numbers=array('i', sorted(numbers)))
+    return RoutineEntry(routine.get('Name'), rungs, len(texts), bus_uses)
+
+# Function to give every tag but the first that shares a bus a new bus number
+# next_number is called with the first BusReference of the moved tag and returns a free number or -1
+# Returns a dictionary of (bus, tag) to the new bus operand, or None when the numbers run out
+def plan_bus_moves(index, buses, next_number):
+    moves = {}
+    for bus in buses:
+        first_references = {}
+        for reference in index.references_of(bus):
+            first_references.setdefault(reference.tag, reference)
+        for tag, reference in list(first_references.items())[1:]:
+            number = next_number(reference)
+            if number == -1:
+                return None
+            moves[(bus, tag)] = "Bus["+str(number)+"].Obj"
+    return moves
+
+# Function to rewrite the rungs that use the moved buses, only the instructions whose first operand is the moved tag change
+def apply_bus_moves(doc, index, moves):
+    rung_moves = {}
+    for (bus, tag), new_bus in moves.items():
+        for reference in index.references_of(bus):
+            if reference.tag == tag:
+                rung_moves.setdefault(reference.index, {})[(tag, bus)] = new_bus
+    with phase("replace"):
+        for position, text_moves in rung_moves.items():
+            doc.set_text(position, _move_bus_operands(doc.get_text(position), text_moves))
+    count("texts changed", len(rung_moves))
+    return len(rung_moves)
+
+# Function to replace bus operands inside the instructions of a rung whose first operand is a given tag
+def _move_bus_operands(text, text_moves):
+    pieces = []
+    position = 0
+    for instruction in parse_rung(text):
+        tag = instruction.operands[0]
+        for operand, start in zip(instruction.operands, operand_starts(instruction)):
+            new_operand = text_moves.get((tag, operand))
+            if new_operand is not None:
+                pieces.append(text[position:start])
+                pieces.append(new_operand)
+                position = start + len(operand)
+    if not pieces:
+        return text
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+# Class that hands out free bus numbers from a range
+# The range is a bitmap with one byte per number, numbers in use and reserved ranges are marked as taken.
+# Areas are named sub-ranges (for example one per program) and every area keeps a cursor, so the next free number
+# is found with bytearray.find from where the last one was taken, which is amortized O(1) per allocation.
+class BusNumberAllocator:
+    def __init__(self, start_number, end_number, allocated=(), reserved=(), areas=None):
+        if end_number < start_number:
+            raise ValueError(f"End number {end_number} is smaller than start number {start_number}")
+        self.start_number = start_number
+        self.end_number = end_number
+        self.taken = bytearray(end_number - start_number + 1)
+        self.areas = {None: (start_number, end_number)}
+        for name, (area_start, area_end) in (areas or {}).items():
+            if area_start < start_number or area_end > end_number or area_end < area_start:
+                raise ValueError(f"Area {name} ({area_start}-{area_end}) is not inside {start_number}-{end_number}")
+            self.areas[name] = (area_start, area_end)
+        self.cursors = {}
+        self.reserved = []
+        for number in allocated:
+            if start_number <= number <= end_number:
+                self.taken[number - start_number] = 1
+        for reserved_start, reserved_end in reserved:
+            self.reserve(reserved_start, reserved_end)
+
+    # Function to mark a range of numbers as not available
+    def reserve(self, reserved_start, reserved_end):
+        low = max(reserved_start, self.start_number) - self.start_number
+        high = min(reserved_end, self.end_number) - self.start_number + 1
+        if low < high:
+            self.taken[low:high] = b'\x01' * (high - low)
+        self.reserved.append((reserved_start, reserved_end))
+
+    # Function to take the lowest free number of an area (the whole range by default), -1 if the area is full
+    # An area that is not configured shares the cursor of the whole range so the scan never starts over for it
+    def allocate(self, area=None):
+        if area not in self.areas:
+            area = None
+        area_start, area_end = self.areas[area]
+        cursor = self.cursors.get(area, area_start)
+        position = self.taken.find(0, cursor - self.start_number, area_end - self.start_number + 1)
+        if position == -1:
+            self.cursors[area] = area_end + 1
+            return -1
+        self.taken[position] = 1
+        self.cursors[area] = self.start_number + position + 1
+        return self.start_number + position
+
+    # Function to give a number back to the free numbers
+    def release(self, number):
+        if self.start_number <= number <= self.end_number:
+            self.taken[number - self.start_number] = 0
+            for area, cursor in self.cursors.items():
+                area_start, area_end = self.areas.get(area, self.areas[None])
+                if area_start <= number <= area_end and number < cursor:
+                    self.cursors[area] = number
+
+    # Number of free numbers left in an area
+    def free_count(self, area=None):
+        area_start, area_end = self.areas.get(area, self.areas[None])
+        return self.taken.count(0, area_start - self.start_number, area_end - self.start_number + 1)
+
+    # Dictionary of area name to (start, end, free numbers, size), the whole range is under None
+    def capacity(self):
+        return {name: (area_start, area_end, self.free_count(name), area_end - area_start + 1)
+                for name, (area_start, area_end) in self.areas.items()}
+
+    # Function to print how many numbers are left in the range and in every area
+    def print_capacity(self):
+        for name, (area_start, area_end, free, size) in self.capacity().items():
+            label = "range" if name is None else "area "+str(name)
+            print(f"Free bus numbers in {label} {area_start}-{area_end}: {free} of {size}")
+
+# Function to read ranges written as "100-199,250,300-310" into a list of (start, end)
+def parse_ranges(text):
+    ranges = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            range_start, range_end = part.split('-', 1)
+            ranges.append((int(range_start), int(range_end)))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+# Function to read a csv file into a list of dictionaries of column name to value
+# Excel may add a byte order mark when it saves a csv file so it is skipped
+def read_csv_rows(file_name):
+    with phase("read csv"), gc_paused(), open(file_name, mode='r', newline='', encoding='utf-8-sig') as file:
+        return list(csv.DictReader(file))
+
+# Function to write a csv file with a header row
+def write_csv(file_name, header, rows):
+    with phase("write csv"), open(file_name, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+# Function to get the number of a cell of a reviewed csv file, row_number counts the header as row 1
+# A cell that is not a number raises a ValueError that names the cell, its row and the file
+def csv_number(value, column, row_number, file_name, convert=int):
+    try:
+        return convert(value)
+    except ValueError:
+        raise ValueError(f"The {column} '{value}' in row {row_number} of '{file_name}' is not a number") from None
+
+# Function to tell if every value of a csv row is filled in
+def complete_row(row):
+    return all(value is not None and value.strip() != '' for value in row.values())
+
+# Function to build the replacement dictionary of Bus[n].Obj operands from pairs of bus numbers
+def bus_replacements(number_pairs):
+    return {f"Bus[{int(number)}].Obj": f"Bus[{int(new_number)}].Obj" for number, new_number in number_pairs}
+
+# Function to replace the bus numbers of every Text element of a document, returns the number of changed Text elements
+def renumber_buses(doc, replacement_dict):
+    replacer = TagReplacer(replacement_dict)
+    return rewrite_texts(doc, lambda text: replacer.replace(text) if "Bus[" in text else text)
+
+# Function to replace tags in the rungs of a document that use a bus, returns the number of changed Text elements
+def replace_bus_rung_tags(doc, replacement_dict):
+    replacer = TagReplacer(replacement_dict)
+    return rewrite_texts(doc, lambda text: replace_tags(text, replacer))
+
+# Function to give the tags that share one of the buses a free number in the range from start_number to end_number
+# Returns the moves and the allocator, the moves are None and nothing is changed when the range runs out of numbers
+def dedupe_buses(doc, buses, start_number, end_number, reserved=(), areas=None):
+    index = bus_index(doc)
+    # the numbers used by the routines a selection leaves out are not free either
+    allocated = index.bus_numbers() if doc.selection is None else project_bus_index(doc).bus_numbers()
+    allocator = BusNumberAllocator(start_number, end_number, allocated, reserved, areas)
+    if areas:
+        moves = plan_bus_moves(index, buses, lambda reference: allocator.allocate(reference.program))
+    else:
+        moves = plan_bus_moves(index, buses, lambda reference: allocator.allocate())
+    if moves is not None:
+        apply_bus_moves(doc, index, moves)
+        count("tags moved", len(moves))
+    return moves, allocator
+
+# Function to build a regex that matches the longest of the labels at a position
+# The labels are merged in a trie so each character of the text is compared once per trie node and not once per label
+def trie_pattern(labels):
+    trie = {}
+    for label in labels:
+        node = trie
+        for char in label:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def node_pattern(node):
+        branches = [re.escape(char) + node_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + pattern + ')?' if '' in node else pattern
+
+    return node_pattern(trie)
+
+# Class that counts and numbers a set of labels in a single scan of a text
+# The count of every label is the same as str.count, so a label inside another label or overlapping one is counted too
+# With an encoding the text is the encoded bytes (the memory map of a file) and only the labels are encoded
+class LabelMatcher:
+    def __init__(self, labels, encoding=None):
+        self.labels = list(dict.fromkeys(label for label in labels if label))
+        self.encoding = encoding
+        if encoding is None:
+            keys = self.labels
+            pattern = trie_pattern(keys)
+        else:
+            keys = [label.encode(encoding) for label in self.labels]
+            # every byte is one latin-1 character so the trie is built on the bytes of the labels
+            pattern = trie_pattern([key.decode('latin-1') for key in keys]).encode('latin-1')
+        self.labels_by_key = dict(zip(keys, self.labels))
+        self.pattern = re.compile(pattern) if self.labels else None
+        # the pattern matches the longest label at a position, the other labels there are its prefixes
+        self.prefixes = {key: [key[:end] for end in range(1, len(key) + 1) if key[:end] in self.labels_by_key]
+                         for key in keys}
+
+    # Function to yield the start and the longest label of every position of the text a label starts at
+    # The positions inside a match are checked one by one, the scan goes on after the match
+    def iter_starts(self, text):
+        for match in self.pattern.finditer(text):
+            yield match.start(), match.group()
+            for position in range(match.start() + 1, match.end()):
+                inner = self.pattern.match(text, position)
+                if inner:
+                    yield position, inner.group()
+
+    # Function to get the number of instances of every label
+    def count(self, text):
+        counts = dict.fromkeys(self.labels_by_key, 0)
+        if self.pattern is not None:
+            ends = dict.fromkeys(self.labels_by_key, 0)
+            for start, longest in self.iter_starts(text):
+                for key in self.prefixes[longest]:
+                    if start >= ends[key]:
+                        counts[key] += 1
+                        ends[key] = start + len(key)
+        return {self.labels_by_key[key]: number for key, number in counts.items()}
+
+    # Function to number every instance of the labels, the n-th instance of a label becomes the label followed by "type" and n
+    # numbers is the last number of every label, so several texts can be numbered one after the other
+    # Returns the new text and the numbered labels in the order of the text
+    def number(self, text, numbers=None):
+        numbered = []
+        if self.pattern is None:
+            return text, numbered
+        if numbers is None:
+            numbers = {}
+
+        def numbered_label(match):
+            label = self.labels_by_key[match.group()]
+            numbers[label] = numbers.get(label, 0) + 1
+            numbered.append(label + "type" + str(numbers[label]))
+            return numbered[-1] if self.encoding is None else numbered[-1].encode(self.encoding)
+
+        return self.pattern.sub(numbered_label, text), numbered
+
+# Function to count the instances of every label in one pass, returns a dictionary of label to count
+# The content is either the text or the bytes of a document in the given encoding, regions limits the count to
+# (start, end) offsets of the content
+def count_labels(content, labels, encoding=None, regions=None):
+    matcher = LabelMatcher(labels, encoding)
+    if regions is None:
+        return matcher.count(content)
+    counts = dict.fromkeys(matcher.labels, 0)
+    for start, end in regions:
+        for label, number in matcher.count(content[start:end]).items():
+            counts[label] += number
+    return counts
+
+# Function to number every instance of the labels in one pass, the labels that are not in tags are left as they are
+# regions limits the numbering to (start, end) offsets of the content, the rest of it is copied as it is
+# Returns the new content and the numbered labels
+def number_labels(content, tags, labels, encoding=None, regions=None):
+    tags = set(tags)
+    matcher = LabelMatcher([label for label in labels if label in tags], encoding)
+    if regions is None or matcher.pattern is None:
+        return matcher.number(content)
+    pieces = []
+    numbered = []
+    numbers = {}
+    position = 0
+    for start, end in regions:
+        text, region_numbered = matcher.number(content[start:end], numbers)
+        pieces.append(content[position:start])
+        pieces.append(text)
+        numbered.extend(region_numbered)
+        position = end
+    pieces.append(content[position:])
+    return (b'' if encoding is not None else '').join(pieces), numbered
+
+# Function to get the content of a document the labels of its selected routines are counted and numbered in and the
+# offsets of the selected routines (None for the whole content)
+# The offsets are offsets of the content without the edits, so pending edits are applied to the content first
+def label_content(doc):
+    if doc.selection is not None and doc.edits:
+        doc.set_content(doc.content_bytes())
+    return doc.content_bytes(), doc.selected_regions()
 
 # Function to perform list bus numbers in XML to a csv file
-def bus_xml_list(source, dir_text):
+# A RoutineSelection only lists the numbers of the selected routines
+# Returns the path of the csv file, None if it could not be written
+@instrumented
+def bus_xml_list(source, dir_text, stream=None, selection=None):
     file_path = source
+    file_name = os.path.join(dir_text, "bus_list_numbers.csv")
 
     try:
-        with open(file_path, 'r',encoding = "UTF-8") as file:
-            xml_content = file.read()
-            all_texts = parse_all_text_tags(xml_content)
-
-            numbers = []
-            data = []
-            bus_data = []
-            for text in all_texts:
-                if "Bus[" in text and not "HWBus[" in text:
-                    lst = re.findall(r'\((.*?)\)', text)
-                    for s in lst:
-                        result = s.split(',')
-                        data.append(result)
-                        for s1 in result:
-                            if "].Obj" in s1:
-                                num = re.findall(r'\[(.*?)\]', s1)
-                                n = (int(num[0]))
-                                numbers.append(n)
-                                bus_data.append([s1])
-
-            quicksort(numbers, 0, len(numbers) - 1)
-            numbers = list(np.unique(numbers))
-            bus_num_list = []
-            for i in numbers:
-                bus_num_list.append([i])
-            
-            os.chdir(dir_text)
-            file_name = os.getcwd()+"\\bus_list_numbers.csv"
-            any_key = input("Warning if the file at "+file_name+" is open in Microsoft Excel or any spreadsheet application please close it.\nIf the file is closed then hit any key to continue:\t")
-            try:
-                with open(file_name, mode='w', newline='',encoding='utf-8') as file:
-                    writer = csv.writer(file)
-
-                    writer.writerows([['Bus Number','Replacement Bus Number']])
-                    writer.writerows(bus_num_list)
-                    print("The csv file "+file_name," was created")
-            except FileNotFoundError:
-                print(f"Error: File '{file_name}' not found.")
-        
+        bus_num_list = [[number] for number in bus_reports(source, stream, selection)[1]]
+
+        try:
+            write_csv(file_name, ['Bus Number','Replacement Bus Number'], bus_num_list)
+            print("The csv file "+file_name," was created")
+            return file_name
+        except FileNotFoundError:
+            print(f"Error: File '{file_name}' not found.")
+
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
 
 
 # Function to replace bus numbers in the XML content
-def bus_xml_replacement(source, dest, dir_text):
+# A RoutineSelection only replaces them in the selected routines
+# The document is only written when dest is given, returns the number of changed Text elements or None on failure
+@instrumented
+def bus_xml_replacement(source, dest, dir_text, selection=None):
     file_path = source
     try:
-        with open(file_path, 'r',encoding = "UTF-8") as file:
-            xml_content = file.read()
-            all_texts = parse_all_text_tags(xml_content)
-            os.chdir(dir_text)
-            f1 = os.getcwd()+"\\bus_list_numbers.csv"
-            file_name = f1
-            df = pd.read_csv(file_name)
-            df = df.dropna()
-            num = list(df['Bus Number'])
-            new_num = list(df['Replacement Bus Number'])
-            replacement_dict = {}
-            for i in range(len(num)):
-                replacement_dict[str(num[i])] = str(int(new_num[i]))
-            root = parse_all_text_tags_root(xml_content)
-            for text_tag in root.findall('.//Text'):
-                original_text = text_tag.text.strip() if text_tag.text is not None else ''
-                modified_text = replace_tags(original_text, replacement_dict)
-                xml_content = xml_content.replace(original_text,modified_text)
-            try:
-                with open(dest, 'w',encoding = "UTF-8") as file:
-                    file.write(xml_content)
-                    print("Change has happened")
-            except FileNotFoundError:
-                print(f"Error: File '{dest}' not found.")
-        
+        doc = load_document(source, selection)
+        file_name = os.path.join(dir_text, "bus_list_numbers.csv")
+        rows = [(row_number, row) for row_number, row in enumerate(read_csv_rows(file_name), 2) if complete_row(row)]
+        replacement_dict = bus_replacements((csv_number(row['Bus Number'], 'Bus Number', row_number, file_name, float),
+                                             csv_number(row['Replacement Bus Number'], 'Replacement Bus Number', row_number, file_name, float))
+                                            for row_number, row in rows)
+        changed = renumber_buses(doc, replacement_dict)
+        try:
+            if dest is not None:
+                doc.save(dest)
+            print("Change has happened")
+            return changed
+        except FileNotFoundError:
+            print(f"Error: File '{dest}' not found.")
+
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
+    except ValueError as error:
+        print(f"Error: {error}")
 
 # Function to list all the bus numbers with their count and respective tags
-def list_bus(source,dir_text):
+# A RoutineSelection only lists the buses of the selected routines
+# Returns the path of the csv file, None if it could not be written
+@instrumented
+def list_bus(source,dir_text, stream=None, selection=None):
     file_path = source
+    f1 = os.path.join(dir_text, "bus_count_with_tags.csv")
 
     try:
-        with open(file_path, 'r',encoding = "UTF-8") as file:
-            xml_content = file.read()
-            all_texts = parse_all_text_tags(xml_content)
-            numbers = []
-            data = []
-            bus_data = []
-            for text in all_texts:
-                if "Bus[" in text and not "HWBus[" in text:
-                    lst = re.findall(r'\((.*?)\)', text)
-                    for s in lst:
-                        result = s.split(',')
-                        data.append(result)
-                        for s1 in result:
-                            if "Bus[" in s1:
-                                num = re.findall(r'\[(.*?)\]', s1)
-                                n = (int(num[0]))
-                                numbers.append(n)
-                                bus_data.append([s1])
-
-            quicksort(numbers, 0, len(numbers) - 1)
-            numbers = list(np.unique(numbers))
-            bus_num_list = []
-            for i in numbers:
-                bus_num_list.append([i])
-            bus_item_list = []
-            for i in bus_data:
-                bus_item_list.append(i[0])
-            bus_item_list = list(set(bus_item_list))
-            pattern = r'Bus\[\d+\]\.Obj'
-
-            bus_item_list = [string for string in bus_item_list if re.search(pattern, string)]
-
-            c = []
-            for i in bus_item_list:
-                count = 0
-                lst = []
-                for j in data:
-                    for k in j:
-                        if i == k:
-                            count+=1
-                            lst.append(j[0])
-                c.append([i,count,lst])
-            os.chdir(dir_text)
-            f1 = os.getcwd()+"\\bus_count_with_tags.csv"
-            any_key = input("Warning if the file at "+f1+" is open in Microsoft Excel or any spreadsheet application please close it.\nIf the file is closed then hit any key to continue:\t")
-            try:
-                with open(f1, mode='w', newline='',encoding='utf-8') as file:
-                    writer = csv.writer(file)
-
-                    writer.writerows([['Bus Tags','Count','Original Tags','Replace Tags']])
-                    writer.writerows(c)
-            except:
-                print(f"Error: File '{f1}' not found.")
+        c = bus_reports(source, stream, selection)[0]
+        try:
+            write_csv(f1, ['Bus Tags','Count','Original Tags','Replace Tags'], c)
+            return f1
+        except Exception:
+            print(f"Error: File '{f1}' not found.")
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
 
 # Function to replace duplicated bus tags with unallocated numbers in the XML content
-def replace_bus_tags(source, dest, dir_text):
+# The new numbers are taken from start_number to end_number, reserved is a list of (start, end) ranges that must not
+# be used and areas a dictionary of program name to the (start, end) sub-range the new numbers of that program are
+# taken from. The document is only written when dest is given, returns the number of moved tags or None on failure
+# A RoutineSelection only moves the tags of the selected routines, the numbers in use are taken from the whole project
+@instrumented
+def replace_bus_tags(source, dest, dir_text, reserved=(), areas=None, start_number=None, end_number=None, selection=None):
+    if start_number is None or end_number is None:
+        raise ValueError("The start and end numbers of the range the buses are allocated from are needed")
     file_path = source
+    csv_file_path = os.path.join(dir_text, "bus_count_with_tags.csv")
     
     try:
-        with open(file_path, 'r', encoding="UTF-8") as file:
-            xml_content = file.read()
-            root = parse_all_text_tags_root(xml_content)
-            all_texts = parse_all_text_tags_text(xml_content)
-            os.chdir(dir_text)
-            f1 = os.getcwd()+"\\bus_count_with_tags.csv"
-            csv_file_path = f1
-            df = pd.read_csv(csv_file_path)
-            bus_list = list(df['Bus Tags'])
-            t = list(df['Original Tags'])
-            rt = list(df['Replace Tags'])
-            og_t = []
-            rep_t = []
-            tag_list = []
-            count = list(df["Count"])
-            replacement_dict = {}
-            pattern = r'Bus\[(\d+)\].Obj'
-            allocated_numbers = [int(re.search(pattern, s).group(1)) for s in bus_list if re.search(pattern, s)]
-            allocated_numbers.sort()
-            allocated_dict = {}
-            start_number = int(input("Enter start number of the range that the Buses are allocated:\t"))
-            end_number = int(input("Enter end number of the range that the Buses are allocated:\t"))
-            numbers = range(start_number,end_number+1)
-            for i in numbers:
-                if i in allocated_numbers:
-                    allocated_dict[i] = 1
-                else:
-                    allocated_dict[i] = 0
-            for i in range(len(t)):
-                if(count[i] == 1):
-                    match = re.search(r"'(.*?)'",t[i])
-                    if match:
-                        extracted_string = match.group(1)
-                        og_t.append(extracted_string)
-                    else:
-                        print("No match found.")
-                    rep_t.append(rt[i])
-                elif(count[i] > 1):
-                    lst = t[i].split(",")
-                    for j in range(len(lst)):
-                        match = re.search(r"'(.*?)'",lst[j])
-                        if match:
-                            extracted_string = match.group(1)
-                            og_t.append(extracted_string)
-                            if(j > 0):
-                                number = unallocated_number(allocated_dict,numbers)
-                                if number == -1:
-                                    print("No unallocated numbers found")
-                                    return
-                                allocated_dict[number] = 1
-                                replacement_dict[bus_list[i]] = "Bus["+str(number)+"].Obj"
-                                tag_list.append(extracted_string)
-                        else:
-                            print("No match found.")
-    
-            for text_tag in root.findall('.//Text'):
-                original_text = text_tag.text.strip() if text_tag.text is not None else ''
-                modified_text = replace_bus(original_text, replacement_dict,tag_list)
-                xml_content = xml_content.replace(original_text,modified_text)
-
-            modified_file_path = dest
-
-            with open(modified_file_path, 'w',encoding = "UTF-8") as file:
-                file.write(xml_content)
-                print("Change has happened")
-            
+        doc = load_document(source, selection)
+        index = bus_index(doc)
+        # the reviewed csv selects the duplicated buses, their references come from the index
+        bus_list = [row['Bus Tags'] for row_number, row in enumerate(read_csv_rows(csv_file_path), 2)
+                    if csv_number(row['Count'] or 0, 'Count', row_number, csv_file_path) > 1
+                    and row['Bus Tags'] in index.references]
+        moves, allocator = dedupe_buses(doc, bus_list, start_number, end_number, reserved or (), areas)
+        allocator.print_capacity()
+        if moves is None:
+            print("No unallocated numbers found")
+            return
+
+        modified_file_path = dest
+
+        if modified_file_path is not None:
+            doc.save(modified_file_path)
+        print("Change has happened")
+
+        if modified_file_path is not None:
             print(f"XML file '{modified_file_path}' has been created with replaced tags.")
+        return len(moves)
 
     except FileNotFoundError:
         print(f"Error: File '{file_path}' or '{csv_file_path}' not found.")
+    except ValueError as error:
+        print(f"Error: {error}")
 
 # Function to replace specific tags in the XML content
-def replace_tags_xml(source,dest,dir_text):
+# A RoutineSelection only replaces them in the selected routines
+# The document is only written when dest is given, returns the number of changed Text elements or None on failure
+@instrumented
+def replace_tags_xml(source,dest,dir_text,selection=None):
     file_path = source
+    csv_file_path = os.path.join(dir_text, "bus_count_with_tags.csv")
     
     try:
-        with open(file_path, 'r', encoding="UTF-8") as file:
-            xml_content = file.read()
-            root = parse_all_text_tags_root(xml_content)
-            all_texts = parse_all_text_tags_text(xml_content)
-            os.chdir(dir_text)
-            f1 = os.getcwd()+"\\bus_count_with_tags.csv"
-            csv_file_path = f1
-            df = pd.read_csv(csv_file_path)
-            df = df.dropna()
-            bus_list = list(df['Bus Tags'])
-            t = list(df['Original Tags'])
-            rt = list(df['Replace Tags'])
-            og_t = []
-            rep_t = []
-            count = list(df["Count"])
-            bus_list = bus_list.sort()
-            for i in range(len(t)):
-                if(count[i] == 1):
-                    match = re.search(r"'(.*?)'",t[i])
-                    if match:
-                        extracted_string = match.group(1)
-                        og_t.append(extracted_string)
-                    else:
-                        print("No match found.")
-                    
-                    rep_t.append(rt[i])
+        doc = load_document(source, selection)
+        replacement_dict = {}
+        for row_number, row in enumerate(read_csv_rows(csv_file_path), 2):
+            if complete_row(row) and csv_number(row['Count'], 'Count', row_number, csv_file_path) == 1:
+                match = re.search(r"'(.*?)'",row['Original Tags'])
+                if match:
+                    replacement_dict[match.group(1)] = row['Replace Tags']
+                else:
+                    print("No match found.")
 
-            replacement_dict = {}
-            for i in range(len(og_t)):
-                replacement_dict[og_t[i]] = rep_t[i]
+        changed = replace_bus_rung_tags(doc, replacement_dict)
 
-            for text_tag in root.findall('.//Text'):
-                original_text = text_tag.text.strip() if text_tag.text is not None else ''
-                modified_text = replace_tags(original_text, replacement_dict)
-                xml_content = xml_content.replace(original_text,modified_text)
+        modified_file_path = dest
 
-            modified_file_path = dest
+        if modified_file_path is not None:
+            doc.save(modified_file_path)
+        print("Change has happened")
 
-            with open(modified_file_path, 'w',encoding = "UTF-8") as file:
-                file.write(xml_content)
-                print("Change has happened")
-            
+        if modified_file_path is not None:
             print(f"XML file '{modified_file_path}' has been created with replaced tags.")
+        return changed
 
     except FileNotFoundError:
         print(f"Error: File '{file_path}' or '{csv_file_path}' not found.")
-    except:
+    except ValueError as error:
+        print(f"Error: {error}")
+    except Exception:
         print(f"Error: File '{file_path}' or '{csv_file_path}' not found.")
 
 
 
 #Function to find instances of a particular tag
-def num_par_tag(source,dest,dir_text):
+# label is the label to number or a function that gets the count of every label and returns the label, the menu asks
+# for it that way once the counts are printed. The renumbered content replaces the content of the document and is
+# only written when dest is given, returns the number of renumbered instances or None on failure
+# A RoutineSelection only counts and numbers the labels inside the selected routines
+@instrumented
+def num_par_tag(source,dest,dir_text,label,selection=None):
     file_path = source
-    print(dest)
-    print(dir_text)
+    csv_file_path = os.path.join(dir_text, "bus_count_with_tags.csv")
     try:
-        with open(file_path, 'r', encoding="UTF-8") as file:
-            xml_content = file.read()
-            os.chdir(dir_text)
-            f1 = os.getcwd()+"\\bus_count_with_tags.csv"
-            csv_file_path = f1
-            print(csv_file_path)
-            df = pd.read_csv(csv_file_path)
-            lst = list(df['Original Tags'])
-            result_list = []
-
-            for given_string in lst:
-                extracted_strings = re.findall(r"'(.*?)'", given_string)
-                result_list.extend(extracted_strings)
-
-            print(result_list)
-            
-            print("\n")
-            tag_dash_list = []
-            for i in result_list:
-                dash_string = i.replace("_", "-")
-                tag_dash_list.append(dash_string)
-            
-            print("tagg_dash_list = ",tag_dash_list)
-            
-            label_dict = {}
-            for i in tag_dash_list:
-                occurrences = xml_content.count(i)
-                label_dict[i] = occurrences
-            
-            print("\n",label_dict)
-            
-            replace_replace_label_list = []
-            replace_label_list = []
-            label =  input("\nEnter a label:\t")
-            for i in tag_dash_list:
-                if i == label:
-                    for j in range(label_dict[i]):
-                        replace_label = "type" + str(int(j+1))
-                        replace_label_list.append(replace_label)
-                        print(replace_label)
-                        replace_replace_label = label + replace_label
-                        replace_replace_label_list.append(replace_replace_label)
-                        xml_content = xml_content.replace(label,replace_label,1)
-                        print(replace_replace_label)
-            
-            for i in range(len(replace_label_list)):
-                xml_content = xml_content.replace(replace_label_list[i],replace_replace_label_list[i],1)
-                print(replace_replace_label_list[i])
-            # print("Replace label")
-            # print(replace_replace_label_list[0])
-            modified_file_path = dest
-            with open(modified_file_path, 'w',encoding = "UTF-8") as file:
-                file.write(xml_content)
-                print("Change has happened")
+        doc = load_document(source, selection)
+        content, regions = label_content(doc)
+        lst = [row['Original Tags'] or '' for row in read_csv_rows(csv_file_path)]
+        result_list = []
+
+        for given_string in lst:
+            extracted_strings = re.findall(r"'(.*?)'", given_string)
+            result_list.extend(extracted_strings)
+
+        tag_dash_list = []
+        for i in result_list:
+            dash_string = i.replace("_", "-")
+            tag_dash_list.append(dash_string)
+
+        progress_step("labels")
+        with phase("count labels"):
+            label_dict = count_labels(content, tag_dash_list, doc.encoding, regions)
+
+        print("\n",label_dict)
+
+        if callable(label):
+            label = label(label_dict)
+        with phase("number labels"):
+            content, replace_label_list = number_labels(content, tag_dash_list, [label], doc.encoding, regions)
+        count("labels numbered", len(replace_label_list))
+        for replace_label in replace_label_list:
+            print(replace_label)
+        modified_file_path = dest
+        if replace_label_list:
+            doc.set_content(content)
+        if modified_file_path is not None:
+            doc.save(modified_file_path)
+            print("Change has happened")
             print(f"XML file '{modified_file_path}' has been created with replaced tags.")
+        return len(replace_label_list)
 
     except FileNotFoundError:
         print(f"Error: File '{file_path}' or '{csv_file_path}' not found.")
-    except:
+    except Exception:
         print(f"Error: File '{file_path}' or '{csv_file_path}' not found.")
 
 
 
-# Extract the comments that are present in the rungs with their properties
-def extract_comments(source, dir_text):
-    file_path = source
-    try:
-        with open(file_path, 'r', encoding="UTF-8") as file:
-            xml_content = file.read()
-            os.chdir(dir_text)
-            # Parse the XML content
-            root = ET.fromstring(xml_content)
-            tasks_dict = {}
-
-            for task in root.findall('.//Task'):
-                task_name = task.get('Name')
-                scheduled_programs = [program.get('Name') for program in task.findall('.//ScheduledProgram')]
-                
-                tasks_dict[task_name] = scheduled_programs
-            # print(tasks_dict)
-            reverse_dict = {}
-
-            for task, programs in tasks_dict.items():
-                for program in programs:
-                    reverse_dict[program] = task
-            
-            # print(reverse_dict)
-            txt = ""
-            txt_list = []
-            c = 0
-            k = 0
-            for program in root.findall('.//Program'):
-                program_name = program.get('Name')
-                task_name = reverse_dict.get(program_name, "Program not found in any task")
-                txt = txt + f"Program: {program_name}"+ "\n"
-
-                for routine in program.findall('.//Routine'):
-                    routine_name = routine.get('Name')
-                    txt = txt + f"  Routine: {routine_name}"+"\n"
-
-                    for rung in routine.findall('.//Rung'):
-                        comment_element = rung.find('.//Comment/LocalizedComment')
-                        if comment_element is not None:
-                            comment_text = comment_element.text.strip()
-                            c+=1
-                            txt = txt + f"      Task Name: {task_name}, Routine Name: {routine_name},  Rung Number:{rung.get('Number')}, Rung Type: {rung.get('Type')}, Comment Lang: {comment_element.attrib.get('Lang')}:, Comment:\n            {comment_text}" + "\n"
-                            lst = [task_name, program_name, routine_name,rung.get('Number'),rung.get('Type'),comment_element.attrib.get('Lang'),comment_text]
-                            txt_list.append(lst)
-                        else:
-                            k+=1
-                            txt = txt + f"      Task Name: {task_name}, Routine Name: {routine_name},  Rung Number:{rung.get('Number')}, Rung Type: {rung.get('Type')}, Comment Lang: No Language, Comment: No comment" + "\n"
-                            lst = [task_name, program_name, routine_name, rung.get('Number'),rung.get('Type'),"No Language", "No Comment"]
-                            txt_list.append(lst)
-            
-            modified_file_path = os.getcwd()+"\\extracted_comments_under_rungs.txt"
-            print("Total Number of rungs which have a comment = ",c)
-            print("Total Number of rungs which do not have a comment = ",k)
-            print("Total Number of rungs = ",k+c)
-            with open(modified_file_path, 'w',encoding = "UTF-8") as file:
-                file.write(txt)
-                print("Change has happened")
-            print(f"XML file '{modified_file_path}' has been created with replaced tags.")
+# Files the comments are exported to by format
+COMMENT_FILES = {'txt': "extracted_comments_under_rungs.txt", 'csv': "extracted_comments_under_rungs.csv",
+                 'jsonl': "extracted_comments_under_rungs.jsonl"}
 
+# Columns of the comments csv file
+COMMENT_COLUMNS = ["Task Name", "Program Name", "Routine Name", "Rung Number", "Rung Type", "Language", "Comment"]
 
+# Function to get the rows of the comments csv file of a rung, one per language of its comment
+def rung_comment_rows(rung):
+    comments = rung.comments or (("No Language", "No Comment"),)
+    return [[rung.task, rung.program, rung.routine, rung.number, rung.type, comment_lang, comment_text]
+            for comment_lang, comment_text in comments]
 
-            modified_file_path = os.getcwd()+"\\extracted_comments_under_rungs.csv"
-            with open(modified_file_path, 'w',encoding = "UTF-8") as file:
-                writer = csv.writer(file)
+# Function to get the lines of the comments txt file of a rung, one per language of its comment
+def rung_comment_lines(rung):
+    if not rung.comments:
+        return (f"      Task Name: {rung.task}, Routine Name: {rung.routine},  Rung Number:{rung.number}, Rung Type: {rung.type}, Comment Lang: No Language, Comment: No comment\n",)
+    return [f"      Task Name: {rung.task}, Routine Name: {rung.routine},  Rung Number:{rung.number}, Rung Type: {rung.type}, Comment Lang: {comment_lang}:, Comment:\n            {comment_text}\n"
+            for comment_lang, comment_text in rung.comments]
 
-                writer.writerows([["Task Name","Program Name", "Routine Name", "Rung Number", "Rung Type", "Language", "Comment"]])
-                writer.writerows(txt_list)
+# Function to get the record of the comments jsonl file of a rung, every language of its comment is in the record
+def rung_comment_record(rung):
+    return {'task': rung.task, 'program': rung.program, 'routine': rung.routine, 'rung': rung.number, 'type': rung.type,
+            'comments': [{'language': comment_lang, 'comment': comment_text} for comment_lang, comment_text in rung.comments]}
 
-                print("Change has happened")
-            print(f"XML file '{modified_file_path}' has been created with replaced tags.")
+# Function to get the comments csv rows of every rung of a source
+def comment_rows(source, stream=None, selection=None):
+    return [row for routine in iter_source_routines(source, stream=stream, selection=selection)
+            for rung in routine.rungs if rung.comments is not None for row in rung_comment_rows(rung)]
 
-    except:
+# Extract the comments that are present in the rungs with their properties
+# The rows are written to every file of formats (txt, csv and jsonl) while the routines are walked, so neither the
+# reports nor the rows are held in memory, and a RoutineSelection limits the walk to the selected routines
+# Returns the paths of the written files, None if they could not be written
+@instrumented
+def extract_comments(source, dir_text, stream=None, formats=('txt', 'csv'), selection=None):
+    try:
+        routines = iter_source_routines(source, stream=stream, selection=selection)
+        file_names = [os.path.join(dir_text, COMMENT_FILES[name]) for name in formats]
+        c = 0
+        k = 0
+        with ExitStack() as stack:
+            files = {name: stack.enter_context(open(file_name, 'w', encoding="UTF-8", newline='' if name == 'csv' else None))
+                     for name, file_name in zip(formats, file_names)}
+            txt = files.get('txt')
+            writer = csv.writer(files['csv']) if 'csv' in files else None
+            jsonl = files.get('jsonl')
+            if writer is not None:
+                writer.writerow(COMMENT_COLUMNS)
+            program_name = None
+            progress_step("comments", source.text_count if isinstance(source, ProjectDocument) else None)
+            for routine in routines:
+                advance(len(routine.rungs))
+                if routine.program != program_name:
+                    program_name = routine.program
+                    if txt is not None:
+                        txt.write(f"Program: {program_name}\n")
+                if routine.routine is None:
+                    continue
+                if txt is not None:
+                    txt.write(f"  Routine: {routine.routine}\n")
+
+                for rung in routine.rungs:
+                    if rung.comments is None:
+                        continue
+                    if rung.comments:
+                        c+=1
+                    else:
+                        k+=1
+                    if txt is not None:
+                        txt.writelines(rung_comment_lines(rung))
+                    if writer is not None:
+                        writer.writerows(rung_comment_rows(rung))
+                    if jsonl is not None:
+                        jsonl.write(json.dumps(rung_comment_record(rung)) + "\n")
+
+        count("rungs scanned", k + c)
+        print("Total Number of rungs which have a comment = ",c)
+        print("Total Number of rungs which do not have a comment = ",k)
+        print("Total Number of rungs = ",k+c)
+        for file_name in file_names:
+            print(f"The file '{file_name}' has been created.")
+        return tuple(file_names)
+
+    except Exception:
         print("Error: The Source file or folder paths are not found")
 
+# Report operations the watch mode can run again, by the name of their function
+WATCH_REPORTS = ('list_bus', 'bus_xml_list', 'extract_comments')
+
+# Function to watch a source file and write the reports again every time it changes until it is stopped with Ctrl+C
+# Only the Programs and Routines that changed are read again (see IncrementalIndex). A change is read once the size and
+# modification time of the file stayed the same for one interval, so an export that is still being written is not read.
+# Returns the number of times the reports were written
+def watch(source, dir_text, reports=('list_bus', 'bus_xml_list'), interval=1.0, formats=('txt', 'csv'), selection=None):
+    index = IncrementalIndex(source)
+    dir_text = os.path.abspath(dir_text)
+    refreshes = 0
+    last_stamp = failed_stamp = None
+    print(f"Watching '{index.path}' for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            try:
+                stamp = file_stamp(index.path)
+            except OSError:
+                stamp = None
+            if stamp is not None and stamp == last_stamp and stamp not in (index.stamp, failed_stamp):
+                start = time.perf_counter()
+                try:
+                    parsed, routines = index.refresh()
+                except (OSError, ValueError, ET.ParseError) as error:
+                    print(f"Error: '{index.path}' could not be read ({error}), it is read again when it changes")
+                    failed_stamp = stamp
+                else:
+                    # the index lives as long as the watch, moving it out of the collected generations keeps the
+                    # garbage collector from walking every record while the reports are built
+                    gc.freeze()
+                    if 'list_bus' in reports:
+                        list_bus(index, dir_text, selection=selection)
+                    if 'bus_xml_list' in reports:
+                        bus_xml_list(index, dir_text, selection=selection)
+                    if 'extract_comments' in reports:
+                        extract_comments(index, dir_text, formats=formats, selection=selection)
+                    refreshes += 1
+                    print(f"Read {parsed} of {routines} routines and wrote the reports in {time.perf_counter() - start:.2f} s")
+            last_stamp = stamp
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    return refreshes
+
+
+# Class that chains the operations on one document in memory
+# The bus lists are passed from one stage to the next instead of going through csv files, the document is parsed once
+# and only written by save. When checkpoint_dir is given the csv files of the manual workflow are also written after
+# every stage so that the run can be reviewed, they are never read back. With a RoutineSelection only the selected
+# routines are parsed and changed.
+#
+#   pipeline = Pipeline("Project.L5X", checkpoint_dir="reports")
+#   pipeline.dedupe_buses(400, 500)
+#   pipeline.renumber_buses(lambda number: number + 1000)
+#   pipeline.save("Project_new.L5X")
+class Pipeline:
+    def __init__(self, source, checkpoint_dir=None, selection=None):
+        self.doc = load_document(source, selection)
+        self.checkpoint_dir = checkpoint_dir
+
+    # Function to write a checkpoint csv file when checkpoints are on
+    def checkpoint(self, file_name, header, rows):
+        if self.checkpoint_dir is not None:
+            write_csv(os.path.join(self.checkpoint_dir, file_name), header, rows)
+
+    # Rows of bus_count_with_tags.csv for the document as it is now: bus operand, count and the tags that use it
+    def bus_rows(self):
+        rows = bus_reports(self.doc)[0]
+        self.checkpoint("bus_count_with_tags.csv", ['Bus Tags','Count','Original Tags','Replace Tags'], rows)
+        return rows
+
+    # Numbers of bus_list_numbers.csv for the document as it is now
+    def bus_numbers(self):
+        numbers = bus_reports(self.doc)[1]
+        self.checkpoint("bus_list_numbers.csv", ['Bus Number','Replacement Bus Number'], [[number] for number in numbers])
+        return numbers
+
+    # Function to give the tags that share a bus free numbers between start_number and end_number
+    # Returns the number of moved tags, raises ValueError when the range runs out of numbers
+    def dedupe_buses(self, start_number, end_number, reserved=(), areas=None):
+        buses = [row[0] for row in self.bus_rows() if row[1] > 1]
+        moves, allocator = dedupe_buses(self.doc, buses, start_number, end_number, reserved, areas)
+        if moves is None:
+            raise ValueError(f"No unallocated numbers found between {start_number} and {end_number}")
+        return len(moves)
+
+    # Function to replace the tags of the rungs that use a bus
+    # replacements is a dictionary of tag to new tag or a function that gets the tag of every bus that is used once
+    # and returns the new tag or None to keep it, like the Replace Tags column of bus_count_with_tags.csv
+    def replace_tags(self, replacements):
+        if callable(replacements):
+            rename = replacements
+            replacements = {}
+            for bus, count, tags in self.bus_rows():
+                new_tag = rename(tags[0]) if count == 1 else None
+                if new_tag:
+                    replacements[tags[0]] = new_tag
+        return replace_bus_rung_tags(self.doc, replacements)
+
+    # Function to replace bus numbers, replacements is a dictionary of number to new number or a function that
+    # gets every bus number in use and returns the new number or None to keep it
+    def renumber_buses(self, replacements):
+        if callable(replacements):
+            pairs = [(number, replacements(number)) for number in self.bus_numbers()]
+        else:
+            pairs = replacements.items()
+        return renumber_buses(self.doc, bus_replacements((number, new_number) for number, new_number in pairs
+                                                         if new_number is not None))
+
+    # Function to number the instances of a label, see num_par_tag, returns the numbered labels
+    def count_label(self, label):
+        tags = [tag.replace("_", "-") for row in self.bus_rows() for tag in row[2]]
+        content, regions = label_content(self.doc)
+        content, labels = number_labels(content, tags, [label], self.doc.encoding, regions)
+        if labels:
+            self.doc.set_content(content)
+        return labels
+
+    # Function to write the document with every change of the pipeline, returns the number of written bytes
+    def save(self, dest):
+        return self.doc.save(dest)
 
 # Function to print options for the main menu
 def printOptions(x):
@@ -537,6 +2915,9 @@ def printOptions(x):
     print("Enter 4 to find instances of comments under rungs.")
     print("Enter 5 to create the bus list to change bus names.")
     print("Enter 6 to replace bus numbers in the list.")
+    print("Enter 7 to clear the cache of the indexes of the read files.")
+    print("Enter 8 to save the changes of options 1, 2, 3 and 6 to the destination file.")
+    print("Enter 9 to watch the source file and create the lists of options 0 and 5 again every time it changes.")
     print("Enter any other number or key to quit.")
 
 # Function to get the destination path
@@ -548,11 +2929,65 @@ def dest_path(source):
         d = input("Enter destination L5X/L5K file path:\t")
         return d
 
+# Function to ask to close a csv file in the spreadsheet application before it is written again
+def close_file_input(file_name):
+    return input("Warning if the file at "+file_name+" is open in Microsoft Excel or any spreadsheet application please close it.\nIf the file is closed then hit any key to continue:\t")
+
+# Function to ask for the range the duplicated buses are allocated from, returns the start, the end and the reserved ranges
+def bus_range_input():
+    start_number = int(input("Enter start number of the range that the Buses are allocated:\t"))
+    end_number = int(input("Enter end number of the range that the Buses are allocated:\t"))
+    reserved = parse_ranges(input("Enter reserved numbers or ranges that must not be used (e.g. 100-199,250) or leave blank:\t"))
+    return start_number, end_number, reserved
+
+# Function to ask for the label to number, num_par_tag calls it once the count of every label is printed
+def label_input(label_dict):
+    return input("\nEnter a label:\t")
+
+# Function to ask for the programs and routines the options work on, returns None for the whole project
+def selection_input():
+    programs = input("Enter the programs to work on separated by commas or leave blank for every program:\t")
+    routines = input("Enter the routines to work on separated by commas or leave blank for every routine:\t")
+    return routine_selection(programs=[name.strip() for name in programs.split(',') if name.strip()],
+                             routines=[name.strip() for name in routines.split(',') if name.strip()])
+
+# Class of a menu session, it holds the parsed source file so that every option works on the same document
+# The options that change the document keep their changes in memory until they are saved
+# Only the programs and routines of selection are parsed and worked on
+class MenuSession:
+    def __init__(self, selection=None):
+        self.doc = None
+        self.selection = selection
+
+    # Function to get the document of the source, it is only read again when the source path changes
+    def document(self, source):
+        if self.doc is None or self.doc.path != source:
+            self.doc = load_document(source, self.selection)
+        return self.doc
+
+    # Function to write the document to dest if it has changes that are not saved
+    def save(self, dest):
+        if self.doc is None or not self.doc.changed:
+            print("There are no changes to save")
+            return
+        self.doc.save(dest)
+        print(f"XML file '{dest}' has been saved")
+
+    # Function to ask if unsaved changes should be written before the document is closed
+    def close(self, dest):
+        if self.doc is not None and self.doc.changed:
+            y_n = input(f"Do you want to save the changes to '{dest}' (Y/N):\t")
+            if(y_n == 'y' or y_n == 'Y'):
+                self.save(dest)
+        self.doc = None
+
 # the main menu
 def main():
+    use_cache()
     source = input("Enter source L5X/L5K file path:\t")
     dest = dest_path(source)
     dir_text = input("Enter the folder path where you want to save all the csv files:\t")
+    session = MenuSession(selection_input())
     c = 0
     while True:
         printOptions(c)
@@ -560,19 +2995,28 @@ def main():
         try:
             ch = input("Enter choice\n")
             if ch == '0':
-                list_bus(source,dir_text)
+                close_file_input(os.path.join(dir_text, "bus_count_with_tags.csv"))
+                list_bus(session.document(source),dir_text)
             elif ch == '1':
-                replace_tags_xml(source,dest,dir_text)
+                replace_tags_xml(session.document(source),None,dir_text)
             elif ch == '2':
-                replace_bus_tags(source,dest,dir_text)
+                start_number, end_number, reserved = bus_range_input()
+                replace_bus_tags(session.document(source),None,dir_text,reserved,start_number=start_number,end_number=end_number)
             elif ch == '3':
-                num_par_tag(source,dest,dir_text)
+                num_par_tag(session.document(source),None,dir_text,label_input)
             elif ch == '4':
-                extract_comments(source,dir_text)
+                extract_comments(session.document(source),dir_text)
             elif ch == '5':
-                bus_xml_list(source,dir_text)
+                close_file_input(os.path.join(dir_text, "bus_list_numbers.csv"))
+                bus_xml_list(session.document(source),dir_text)
             elif ch == '6':
-                bus_xml_replacement(source,dest,dir_text)
+                bus_xml_replacement(session.document(source),None,dir_text)
+            elif ch == '7':
+                clear_cache()
+            elif ch == '8':
+                session.save(dest)
+            elif ch == '9':
+                watch(source, dir_text, selection=session.selection)
             else:
                 break
             y_n = input("Do you want to quit (Y/N):\t")
@@ -588,7 +3032,9 @@ def main():
             if(y_n == 'y' or y_n == 'Y'):
                 pass
             else:
+                session.close(dest)
                 source = input("Enter new source L5X/L5K file path:\t")
+                session.selection = selection_input()
             y_n = input("Do you want the destination L5X/L5K file to be as same as before (Y/N):\t")
             if(y_n == 'y' or y_n == 'Y'):
                 pass
@@ -599,16 +3045,19 @@ def main():
             if(y_n == 'y' or y_n == 'Y'):
                 pass
             else:
-                dest = input("Enter the new folder path where you want to save all the csv files same as before (Y/N):\t")
+                dir_text = input("Enter the new folder path where you want to save all the csv files:\t")
             
             y_n = input("Do you want to clear screen (Y/N):\t")
             if(y_n == 'y' or y_n == 'Y'):
                 c = 0
         except:
             print("Either in valid source or destination file or invalid folder path")
+            session.close(dest)
             source = input("Enter source L5X/L5K file path:\t")
             dest = dest_path(source)
             dir_text = input("Enter the folder path where you want to save all the csv files:\t")
+            session.selection = selection_input()
+    session.close(dest)
     
     
 
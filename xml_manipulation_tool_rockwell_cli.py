@@ -0,0 +1,368 @@
+"""
+Command line interface for the XML Manipulation Tool for Rockwell PLC Programs
+
+This Python script runs the operations of xml_manipulation_tool_rockwell.py without any prompts so that they can be used from build servers and batch files. Several operations can be given in one call, they are run in order against a single loaded document and the modified document is written once at the end.
+
+Operations:
+- list-bus: list the bus tags with their count and tags to bus_count_with_tags.csv
+- bus-list: list the bus numbers to bus_list_numbers.csv
+- replace-bus-numbers: replace the bus numbers with the numbers in bus_list_numbers.csv
+- dedupe-buses: give the duplicated buses of bus_count_with_tags.csv free numbers between --start-number and --end-number
+- replace-tags: replace the tags with the Replace Tags of bus_count_with_tags.csv
+- count-label: count and number the instances of --label
+- extract-comments: write the rung comments to extracted_comments_under_rungs.txt and .csv (and .jsonl with --comment-formats txt,csv,jsonl), one row per language of every comment
+
+Usage:
+1. python xml_manipulation_tool_rockwell_cli.py Project.L5X --csv-dir reports list-bus bus-list extract-comments
+2. python xml_manipulation_tool_rockwell_cli.py Project.L5X --csv-dir reports --dest Project_new.L5X dedupe-buses --start-number 400 --end-number 500
+3. Use --in-place instead of --dest to overwrite the source file.
+   Use --task, --program and --routine (each can be given several times) to run every operation on the selected routines only. Only their Program and Routine subtrees are parsed, the edits only change them and the rest of the file is written back byte for byte.
+4. python xml_manipulation_tool_rockwell_cli.py exports --csv-dir reports list-bus bus-list extract-comments
+   When the source is a folder (searched for .L5X and .L5K files in all its subfolders) or a glob pattern such as "exports/*/*.L5X" the report operations are run on every file in a pool of worker processes, one per core or --workers. The results are merged into fleet_bus_count_with_tags.csv, fleet_bus_list_numbers.csv and fleet_extracted_comments_under_rungs.csv with the controller and file of every row, files that cannot be read are listed in fleet_errors.csv and do not stop the scan.
+5. python xml_manipulation_tool_rockwell_cli.py Project.L5X --index-db Project.sqlite --csv-dir reports list-bus --rungs-using-bus 417 --uncommented-programs
+6. python xml_manipulation_tool_rockwell_cli.py Project.L5X --csv-dir reports --watch list-bus bus-list
+   With --watch the report operations are run again every time the source file changes until Ctrl+C is pressed. The file is checked every --interval seconds and only the Programs and Routines that changed are read again.
+7. python xml_manipulation_tool_rockwell_cli.py Project.L5X --csv-dir reports --server list-bus bus-list
+   With --server the operations are run by the local server of xml_manipulation_tool_rockwell_server.py, which is started when it is not running and keeps the project loaded for the next calls.
+
+The indexes of every read file are kept in an on-disk cache keyed by the content of the file (see IndexCache in xml_manipulation_tool_rockwell.py), use --no-cache to turn it off for one run and --clear-cache to empty it.
+
+Use --index-db to keep a SQLite index of the tasks, programs, routines, rungs, operands, bus references and comments of the source (see ProjectIndex in xml_manipulation_tool_rockwell.py). It is only built again when the file changes and the reports are exported from it. It answers these queries without reading the file again, they can be given with or without operations (without --index-db the index is built in memory for the run):
+   --rungs-using OPERAND     the rungs that use an operand, e.g. --rungs-using "Bus[417].Obj"
+   --rungs-using-bus NUMBER  the rungs that use a number in any [n].Obj operand, Bus[n].Obj and HWBus[n].Obj alike
+   --uncommented-programs    the programs and Add-On Instructions with ladder rungs that have no comment
+
+Use --profile to print the time, the calls and the peak memory of every phase of the run (reading, parsing, indexing, the csv files, the replacements and the write) with counters of the scanned rungs, changed texts and written bytes and the time spent in garbage collection, --profile-json to append the same as a JSON record to a file and --profile-stats to write the cProfile stats of the phase that took the longest to a folder (open them with python -m pstats).
+
+Return codes: 0 when every operation succeeded, 1 when an operation failed (the following operations are not run and the L5X file is not written) or when a file of a fleet scan failed, 2 for invalid arguments.
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+
+import xml_manipulation_tool_rockwell as tool
+import xml_manipulation_tool_rockwell_server as server
+
+# Operations that only read the document and write csv/txt reports
+REPORT_OPERATIONS = ['list-bus', 'bus-list', 'extract-comments']
+
+# Name of the function of the core each report operation runs in watch mode
+WATCH_REPORTS = {'list-bus': 'list_bus', 'bus-list': 'bus_xml_list', 'extract-comments': 'extract_comments'}
+
+# Operations that change the document
+EDIT_OPERATIONS = ['replace-bus-numbers', 'dedupe-buses', 'replace-tags', 'count-label']
+
+# Name of the function of the core every operation runs on the local server
+SERVER_OPERATIONS = {'list-bus': 'list_bus', 'bus-list': 'bus_xml_list', 'extract-comments': 'extract_comments',
+                     'replace-bus-numbers': 'bus_xml_replacement', 'dedupe-buses': 'replace_bus_tags',
+                     'replace-tags': 'replace_tags_xml', 'count-label': 'num_par_tag'}
+
+# File name and columns of the merged report of every report operation of a fleet scan
+FLEET_REPORTS = {
+    'list-bus': ("fleet_bus_count_with_tags.csv", ['Bus Tags', 'Count', 'Original Tags', 'Replace Tags']),
+    'bus-list': ("fleet_bus_list_numbers.csv", ['Bus Number', 'Replacement Bus Number']),
+    'extract-comments': ("fleet_extracted_comments_under_rungs.csv",
+                         tool.COMMENT_COLUMNS),
+}
+
+# Function to build the argument parser
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the Rockwell XML manipulation operations without prompts")
+    parser.add_argument("source", nargs='?', help="Source L5X or L5K file, or a folder or glob pattern of export files for a fleet scan")
+    parser.add_argument("operations", nargs='*', metavar="operation",
+                        help="Operations to run in order: " + ", ".join(REPORT_OPERATIONS + EDIT_OPERATIONS))
+    parser.add_argument("--csv-dir", help="Folder of the csv and txt files")
+    parser.add_argument("--dest", help="Destination L5X file of the edit operations")
+    parser.add_argument("--in-place", action="store_true", help="Write the edit operations back to the source file")
+    parser.add_argument("--start-number", type=int, help="Start number of the range the buses are allocated from")
+    parser.add_argument("--end-number", type=int, help="End number of the range the buses are allocated from")
+    parser.add_argument("--reserved", default="", help="Bus numbers or ranges that must not be allocated, e.g. 100-199,250")
+    parser.add_argument("--label", help="Label for count-label")
+    parser.add_argument("--comment-formats", default="txt,csv", help="Comma separated formats of extract-comments: txt, csv and jsonl")
+    parser.add_argument("--task", action="append", help="Only run the operations on the programs of this task")
+    parser.add_argument("--program", action="append", help="Only run the operations on this program")
+    parser.add_argument("--routine", action="append", help="Only run the operations on this routine")
+    parser.add_argument("--index-db", help="SQLite file of the project index the reports are exported from")
+    parser.add_argument("--rungs-using", action="append", default=[], metavar="OPERAND", help="Print the rungs that use an operand")
+    parser.add_argument("--rungs-using-bus", action="append", default=[], type=int, metavar="NUMBER",
+                        help="Print the rungs that use a bus number in any [n].Obj operand")
+    parser.add_argument("--uncommented-programs", action="store_true", help="Print the programs with rungs that have no comment")
+    parser.add_argument("--watch", action="store_true", help="Run the report operations again every time the source file changes")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between the checks of the source file in watch mode")
+    parser.add_argument("--server", action="store_true", help="Run the operations on the local server that keeps the project loaded")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the index cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Remove every entry of the index cache before running")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes of a fleet scan")
+    parser.add_argument("--profile", action="store_true", help="Print the time, calls and peak memory of every phase of the run")
+    parser.add_argument("--profile-json", help="Append a JSON record of the phases of the run to this file")
+    parser.add_argument("--profile-stats", help="Write the cProfile stats of the phase that took the longest to this folder")
+    stream = parser.add_mutually_exclusive_group()
+    stream.add_argument("--stream", dest="stream", action="store_true", default=None,
+                        help="Stream the source file for the report operations")
+    stream.add_argument("--no-stream", dest="stream", action="store_false",
+                        help="Always load the source file into memory")
+    return parser
+
+# Function to tell if the source is a folder or a glob pattern of several L5X files
+def is_fleet(source):
+    # a file whose name has glob characters, such as Line[1].L5X, is a single source
+    if os.path.isfile(source):
+        return False
+    return os.path.isdir(source) or any(character in source for character in '*?[')
+
+# Function to check the combinations of arguments that argparse cannot check on its own
+def check_args(parser, args):
+    if args.source is None and args.clear_cache and not args.operations:
+        return
+    if args.source is None or not (args.operations or has_queries(args)):
+        parser.error("a source and at least one operation or query are needed")
+    for operation in args.operations:
+        if operation not in REPORT_OPERATIONS + EDIT_OPERATIONS:
+            parser.error(f"invalid operation '{operation}' (choose from {', '.join(REPORT_OPERATIONS + EDIT_OPERATIONS)})")
+    if args.csv_dir is None and args.operations:
+        parser.error("the argument --csv-dir is required")
+    args.comment_formats = tuple(name.strip() for name in args.comment_formats.split(',') if name.strip())
+    for name in args.comment_formats:
+        if name not in tool.COMMENT_FILES:
+            parser.error(f"invalid comment format '{name}' (choose from {', '.join(tool.COMMENT_FILES)})")
+    edits = [operation for operation in args.operations if operation in EDIT_OPERATIONS]
+    if is_fleet(args.source):
+        if edits:
+            parser.error("a fleet scan only runs the report operations " + ", ".join(REPORT_OPERATIONS))
+        if args.index_db is not None or has_queries(args) or args.watch or args.server:
+            parser.error("the project index, its queries, the watch mode and the server are only for a single source file")
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        if not os.path.isdir(args.csv_dir):
+            parser.error(f"csv folder '{args.csv_dir}' not found")
+        return
+    if args.server and (args.watch or args.index_db is not None or has_queries(args)):
+        parser.error("--server only runs the operations, without --watch, --index-db and the queries")
+    if args.watch and (edits or not args.operations):
+        parser.error("--watch runs the report operations " + ", ".join(REPORT_OPERATIONS) + " only")
+    if args.interval <= 0:
+        parser.error("--interval must be more than 0")
+    if edits and args.dest is None and not args.in_place:
+        parser.error("the operations " + ", ".join(edits) + " need --dest or --in-place")
+    if args.dest is not None and args.in_place:
+        parser.error("--dest and --in-place cannot be used together")
+    if 'dedupe-buses' in args.operations and (args.start_number is None or args.end_number is None):
+        parser.error("dedupe-buses needs --start-number and --end-number")
+    if 'count-label' in args.operations and args.label is None:
+        parser.error("count-label needs --label")
+    try:
+        args.reserved = tool.parse_ranges(args.reserved)
+    except ValueError:
+        parser.error(f"invalid --reserved ranges '{args.reserved}'")
+    if not os.path.isfile(args.source):
+        parser.error(f"source file '{args.source}' not found")
+    if args.csv_dir is not None and not os.path.isdir(args.csv_dir):
+        parser.error(f"csv folder '{args.csv_dir}' not found")
+
+# Function to tell if any query of the project index is asked for
+def has_queries(args):
+    return bool(args.rungs_using or args.rungs_using_bus or args.uncommented_programs)
+
+# Function to run one operation against the document, returns None when it failed
+def run_operation(operation, doc, csv_dir, args):
+    if operation == 'list-bus':
+        return tool.list_bus(doc, csv_dir, args.stream, selection=selection(args))
+    if operation == 'bus-list':
+        return tool.bus_xml_list(doc, csv_dir, args.stream, selection=selection(args))
+    if operation == 'extract-comments':
+        return tool.extract_comments(doc, csv_dir, args.stream, args.comment_formats, selection(args))
+    if operation == 'replace-bus-numbers':
+        return tool.bus_xml_replacement(doc, None, csv_dir)
+    if operation == 'dedupe-buses':
+        return tool.replace_bus_tags(doc, None, csv_dir, args.reserved, start_number=args.start_number, end_number=args.end_number)
+    if operation == 'replace-tags':
+        return tool.replace_tags_xml(doc, None, csv_dir)
+    if operation == 'count-label':
+        return tool.num_par_tag(doc, None, csv_dir, args.label)
+
+# Function to run the operations on the local server, it writes the L5X file once every operation succeeded
+# Returns the exit code
+def run_on_server(source, csv_dir, dest, args):
+    print(f"Running {' '.join(args.operations)} on the server")
+    results = server.request(source, [SERVER_OPERATIONS[operation] for operation in args.operations], csv_dir,
+                             dest if any(operation in EDIT_OPERATIONS for operation in args.operations) else None,
+                             args.task, args.program, args.routine, start_number=args.start_number,
+                             end_number=args.end_number, reserved=args.reserved, label=args.label,
+                             formats=args.comment_formats)
+    if results is None:
+        return 1
+    if results[-1] is None:
+        print(f"Error: {args.operations[len(results) - 1]} failed, the L5X file was not written", file=sys.stderr)
+        return 1
+    return 0
+
+# Function to get the RoutineSelection of the --task, --program and --routine arguments
+def selection(args):
+    return tool.routine_selection(args.task, args.program, args.routine)
+
+# Function to print the place and the text of the rungs found by a query
+def print_rungs(title, rungs):
+    print(f"{title}: {len(rungs)} rungs")
+    for rung in rungs:
+        print(f"  {rung.task or 'Add-On Instruction'}/{rung.program}/{rung.routine} rung {rung.number}: {rung.text}")
+
+# Function to print the answers of the queries of the project index of the source, returns the exit code
+def run_queries(source, args):
+    index = tool.project_index(source, args.stream)
+    if index is None:
+        print("Error: the queries need the project index", file=sys.stderr)
+        return 1
+    for operand in args.rungs_using:
+        print_rungs(f"Rungs using {operand}", index.rungs_using(operand))
+    for number in args.rungs_using_bus:
+        print_rungs(f"Rungs using bus {number}", index.rungs_using_bus(number))
+    if args.uncommented_programs:
+        programs = index.programs_with_uncommented_rungs()
+        print(f"Programs with rungs without a comment: {len(programs)}")
+        for task_name, program_name, rungs in programs:
+            print(f"  {task_name or 'Add-On Instruction'}/{program_name}: {rungs} rungs without a comment")
+    return 0
+
+# Function to find the L5X and L5K files of a folder and its subfolders or of a glob pattern
+def fleet_files(source):
+    if os.path.isdir(source):
+        files = []
+        for folder, _, names in os.walk(source):
+            files.extend(os.path.join(folder, name) for name in names if name.lower().endswith(('.l5x', '.l5k')))
+    else:
+        files = [path for path in glob.glob(source, recursive=True) if os.path.isfile(path)]
+    return sorted(os.path.abspath(path) for path in files)
+
+# Function run in a worker process to collect the report rows of one file
+# Errors are returned instead of raised so that a corrupt file is reported and the scan goes on
+def scan_file(path, operations, stream, selection=None):
+    try:
+        source = path if tool.index_cache() is not None or tool.use_stream(path, stream) else tool.load_document(path, selection)
+        result = {'controller': tool.controller_name(source)}
+        if 'list-bus' in operations or 'bus-list' in operations:
+            rows, numbers = tool.bus_reports(source, stream, selection)
+            result['list-bus'] = rows
+            result['bus-list'] = [[number] for number in numbers]
+        if 'extract-comments' in operations:
+            result['extract-comments'] = tool.comment_rows(source, stream, selection)
+        return result, None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+# Function to scan every file in a pool of worker processes and write the merged reports keyed by controller
+# Returns the dictionary of file to error of the files that failed
+def run_fleet(files, operations, csv_dir, workers, stream, selection=None):
+    results = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scan_file, path, operations, stream, selection): path for path in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                result, error = future.result()
+            except Exception as worker_error:
+                result, error = None, f"{type(worker_error).__name__}: {worker_error}"
+            if error is None:
+                results[path] = result
+                print(f"[{done}/{len(files)}] {result['controller']}: {path}")
+            else:
+                errors[path] = error
+                print(f"[{done}/{len(files)}] Error in {path}: {error}", file=sys.stderr)
+
+    order = sorted(results, key=lambda path: (results[path]['controller'], path))
+    for operation in dict.fromkeys(operations):
+        file_name, columns = FLEET_REPORTS[operation]
+        with open(os.path.join(csv_dir, file_name), mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Controller', 'File'] + columns)
+            for path in order:
+                controller = results[path]['controller']
+                writer.writerows([controller, path] + row for row in results[path][operation])
+        print(f"The csv file {os.path.join(csv_dir, file_name)} was created")
+    with open(os.path.join(csv_dir, "fleet_errors.csv"), mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['File', 'Error'])
+        writer.writerows(sorted(errors.items()))
+    print(f"Scanned {len(results)} of {len(files)} files, {len(errors)} failed")
+    return errors
+
+# Function to run the operations on the source file or on every file of a fleet scan, returns the exit code
+def run(args):
+    if is_fleet(args.source):
+        files = fleet_files(args.source)
+        if not files:
+            print(f"Error: no L5X or L5K files found in '{args.source}'", file=sys.stderr)
+            return 1
+        errors = run_fleet(files, args.operations, os.path.abspath(args.csv_dir), args.workers, args.stream, selection(args))
+        return 1 if errors else 0
+
+    source = os.path.abspath(args.source)
+    csv_dir = os.path.abspath(args.csv_dir) if args.csv_dir is not None else None
+    if args.watch:
+        tool.watch(source, csv_dir, [WATCH_REPORTS[operation] for operation in args.operations], args.interval,
+                   args.comment_formats, selection(args))
+        return 0
+    dest = source if args.in_place else (os.path.abspath(args.dest) if args.dest is not None else None)
+    if args.server:
+        return run_on_server(source, csv_dir, dest, args)
+    edits = any(operation in EDIT_OPERATIONS for operation in args.operations)
+
+    # reports on their own read the file through the project index or the index cache or stream it, otherwise every
+    # operation shares one document that only parses the selected routines
+    if not edits and (tool.INDEX_DB or tool.index_cache() is not None or tool.use_stream(source, args.stream)):
+        doc = source
+    else:
+        try:
+            doc = tool.load_document(source, selection(args))
+        except OSError as error:
+            print(f"Error: {error}", file=sys.stderr)
+            return 1
+
+    for operation in args.operations:
+        print(f"Running {operation}")
+        if run_operation(operation, doc, csv_dir, args) is None:
+            print(f"Error: {operation} failed, the L5X file was not written", file=sys.stderr)
+            return 1
+
+    if edits:
+        try:
+            doc.save(dest)
+        except OSError as error:
+            print(f"Error: {error}", file=sys.stderr)
+            return 1
+        print(f"XML file '{dest}' has been created")
+    if has_queries(args):
+        return run_queries(source, args)
+    return 0
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_intermixed_args(argv)
+    check_args(parser, args)
+
+    tool.use_cache()
+    if args.clear_cache:
+        tool.clear_cache()
+    if args.no_cache:
+        # the environment variable turns the cache off in the worker processes of a fleet scan as well
+        os.environ['XML_TOOL_CACHE_DIR'] = tool.CACHE_DIR = ''
+    if args.source is None:
+        return 0
+    if args.index_db is not None:
+        tool.INDEX_DB = os.path.abspath(args.index_db)
+    elif has_queries(args):
+        tool.INDEX_DB = ':memory:'
+    if args.profile or args.profile_json or args.profile_stats:
+        tool.PROFILE = True
+        tool.PROFILE_JSON = os.path.abspath(args.profile_json) if args.profile_json else ''
+        tool.PROFILE_STATS = os.path.abspath(args.profile_stats) if args.profile_stats else ''
+
+    with tool.instrument("cli") if tool.profiling() else nullcontext():
+        return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
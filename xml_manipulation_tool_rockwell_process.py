@@ -0,0 +1,55 @@
+"""
+Background processes of the XML Manipulation Tool for Rockwell PLC Programs
+
+This Python script holds what the local server (xml_manipulation_tool_rockwell_server.py) and the worker of the GUI (xml_manipulation_tool_rockwell_gooey.py) share: the file a background process writes its address and key to, the connection to it and its start detached from the process that needs it.
+
+The file is written to the .cache/xml_manipulation_tool_rockwell folder of the home folder, only the user can read it. The key is random for every process and only the processes that know it are served. The script does not import xml_manipulation_tool_rockwell.py, so a request to the server does not pay for its import.
+"""
+
+import json
+import os
+import subprocess
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+# Folder of the files of the background processes
+PROCESS_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'xml_manipulation_tool_rockwell')
+
+# Function to write the address and key of a background process to a file only the user can read
+def write_process_file(path, address, authkey):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding="UTF-8") as file:
+        json.dump({'address': address, 'authkey': authkey.hex(), 'pid': os.getpid()}, file)
+    os.replace(temporary, path)
+
+# Function to remove the file of a background process if it is the file of this process
+def remove_process_file(path):
+    try:
+        with open(path, encoding="UTF-8") as file:
+            if json.load(file).get('pid') == os.getpid():
+                os.remove(path)
+    except (OSError, ValueError):
+        pass
+
+# Function to connect to the background process of a file, None when it is not running
+def connect_process(path, family=None):
+    try:
+        with open(path, encoding="UTF-8") as file:
+            info = json.load(file)
+        address = info['address']
+        # json writes the host and port of a TCP address as a list
+        if isinstance(address, list):
+            address = tuple(address)
+        return Client(address, family, authkey=bytes.fromhex(info['authkey']))
+    except (OSError, ValueError, KeyError, TypeError, EOFError, AuthenticationError):
+        return None
+
+# Function to start a command detached from the process that starts it, it goes on when that process ends
+def start_detached(command):
+    options = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    if os.name == 'nt':
+        options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options['start_new_session'] = True
+    subprocess.Popen(command, **options)
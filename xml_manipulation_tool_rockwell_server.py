@@ -0,0 +1,503 @@
+"""
+Local server for the XML Manipulation Tool for Rockwell PLC Programs
+
+This Python script runs the operations of xml_manipulation_tool_rockwell.py in a local server that keeps the projects it is asked about loaded. Scripts that run the operations many times a day on the same projects then neither import the tool nor read and parse the files again, a report of a project that is loaded is answered in milliseconds.
+
+Every project the server holds keeps the index of its Programs and Routines the reports are made from (see IncrementalIndex in xml_manipulation_tool_rockwell.py) and the document the edit operations change, each is only made when an operation needs it. A project whose file changed is read again, the index only reads the Programs and Routines that changed. The projects that were used the longest time ago are dropped when the memory the projects take goes over the limit.
+
+Operations:
+- list_bus, bus_xml_list, extract_comments: write the csv and txt reports of the source to dir_text
+- bus_reports, comment_rows: return the rows of the reports instead of writing them
+- replace_tags_xml, replace_bus_tags, num_par_tag, bus_xml_replacement: change the document, it is written to dest once every operation of the request succeeded and the project of dest then goes on from the changes
+
+Usage:
+1. python xml_manipulation_tool_rockwell_server.py
+   Runs the server until it is stopped. --memory-limit is the memory the projects may take in MB (XML_TOOL_SERVER_MEMORY in bytes, 2048 MB by default) and --idle-timeout the minutes without a request after which it quits.
+2. python xml_manipulation_tool_rockwell_server.py --status
+   Prints the projects the server holds with the memory they take, --stop stops it.
+3. From another Python program, the server is started when it is not running:
+   import xml_manipulation_tool_rockwell_server as server
+   server.request("Project.L5X", ["list_bus", "bus_xml_list"], dir_text="reports")
+   rows, numbers = server.request("Project.L5X", ["bus_reports"])[0]
+   server.request("Project.L5X", ["replace_bus_tags"], dir_text="reports", dest="Project_new.L5X", start_number=400, end_number=500)
+4. python xml_manipulation_tool_rockwell_cli.py Project.L5X --csv-dir reports --server list-bus bus-list
+
+The server listens on a Unix socket (a named pipe on Windows), a request over TCP would wait for the delayed acknowledgements of the small messages of the handshake. The address of the server and its key are written to .cache/xml_manipulation_tool_rockwell/server.json in the home folder, only the user can read the file and only the processes that know the key are served.
+"""
+import argparse
+import gc
+import io
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import xml_manipulation_tool_rockwell_process as process
+
+# the tool is only imported by the server (see run_server) so that a request does not pay for its import
+
+# File the server writes its address and key to, the key is random for every server and only the user can read the file
+SERVER_FILE = os.path.join(process.PROCESS_DIR, 'server.json')
+
+# Memory in bytes the projects of the server are kept under by dropping the least recently used ones, set with
+# XML_TOOL_SERVER_MEMORY
+MEMORY_LIMIT = int(os.environ.get('XML_TOOL_SERVER_MEMORY', 2 * 1024 * 1024 * 1024))
+
+# Seconds without a request after which a server that a request started quits
+START_IDLE_TIMEOUT = 60 * 60
+
+# Seconds a request waits for a new server to start
+SERVER_START_TIMEOUT = 30
+
+# Family of the address the server listens on
+SERVER_FAMILY = 'AF_PIPE' if os.name == 'nt' else 'AF_UNIX'
+
+# Operations that only read the project, they are answered from its index
+REPORT_OPERATIONS = ('list_bus', 'bus_xml_list', 'extract_comments', 'bus_reports', 'comment_rows')
+
+# Operations that change the document of the project
+EDIT_OPERATIONS = ('replace_tags_xml', 'replace_bus_tags', 'num_par_tag', 'bus_xml_replacement')
+
+# Bytes of memory for every byte of the file that the index and the parsed document of a project take, measured on
+# generated L5X and L5K exports. A document that was not parsed takes the size of the file.
+MEMORY_FACTORS = {'.l5x': (4, 9), '.l5k': (10, 5)}
+
+tool = None
+
+# Class of the standard output of the server, what the operations of a request print goes to the output of the thread
+# that serves it and everything else to the stream of the server
+class ThreadOutput:
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    # Function to collect what the thread prints while it runs a request
+    @contextmanager
+    def capture(self):
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+# Function to load a document into memory instead of mapping it, so that Studio 5000 can export over a file while the
+# server holds it
+def read_document(path, selection=None):
+    doc = tool.load_document(path, selection)
+    if isinstance(doc.content, mmap.mmap):
+        mapped = doc.content
+        doc.reset(bytes(mapped))
+        mapped.close()
+    return doc
+
+# Class of a project the server holds, the reports are made from its index and the edit operations change its document
+# Requests on a project are run one after the other, requests on different projects side by side
+class WarmProject:
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self.doc = None
+        # stamp of the file the document holds
+        self.stamp = None
+        self.lock = threading.Lock()
+
+    # Function to get the index of the file with the changes of the file read
+    def report_source(self):
+        if self.index is None:
+            self.index = tool.IncrementalIndex(self.path)
+        self.index.refresh()
+        return self.index
+
+    # Function to get the document of a selection of the file, it is read again when the file or the selection changed
+    def document(self, selection):
+        stamp = tool.file_stamp(self.path)
+        if self.doc is None or stamp != self.stamp or self.doc.selection != selection:
+            self.doc = None
+            self.doc = read_document(self.path, selection)
+            self.stamp = stamp
+        return self.doc
+
+    # Function to take over a document that was written to the file of the project
+    def adopt(self, doc):
+        self.doc = doc
+        self.stamp = tool.file_stamp(self.path)
+
+    # Estimate of the memory in bytes the index and the document take
+    def memory(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        index_factor, document_factor = MEMORY_FACTORS.get(os.path.splitext(self.path)[1].lower(), MEMORY_FACTORS['.l5x'])
+        memory = size * index_factor if self.index is not None else 0
+        if self.doc is not None:
+            parsed = self.doc.derived or any(name in self.doc.__dict__ for name in self.doc.cached_names)
+            memory += size * document_factor if parsed else len(self.doc.content)
+        return memory
+
+    # Function to run the operations of a request in order, like the command line interface an operation that fails
+    # stops the request and the document is only written to dest when every operation succeeded
+    # The reports are made from the index until an edit operation changed the document, then from the document
+    # Returns the result of every operation that ran and the document when it was written to another file
+    def run(self, request, selection):
+        operations = request['operations']
+        dest = request.get('dest')
+        doc = self.document(selection) if any(operation in EDIT_OPERATIONS for operation in operations) else None
+        results = []
+        try:
+            for operation in operations:
+                if operation in EDIT_OPERATIONS:
+                    result = run_edit(operation, doc, request)
+                else:
+                    source = doc if doc is not None and doc.changed else self.report_source()
+                    result = run_report(operation, source, request, selection)
+                results.append(result)
+                if result is None:
+                    return results, None
+            if doc is None:
+                return results, None
+            doc.save(dest)
+            print(f"XML file '{dest}' has been created")
+            if os.path.abspath(dest) == self.path:
+                self.stamp = tool.file_stamp(self.path)
+                return results, None
+            self.doc = None
+            return results, doc
+        finally:
+            # a request that failed half way leaves changes that are in no file
+            if self.doc is not None and self.doc.changed:
+                self.doc = None
+
+# Function to run a report operation of a request
+def run_report(operation, source, request, selection):
+    dir_text = request.get('dir_text')
+    if operation == 'list_bus':
+        return tool.list_bus(source, dir_text, selection=selection)
+    elif operation == 'bus_xml_list':
+        return tool.bus_xml_list(source, dir_text, selection=selection)
+    elif operation == 'extract_comments':
+        return tool.extract_comments(source, dir_text, formats=tuple(request.get('formats') or ('txt', 'csv')), selection=selection)
+    elif operation == 'bus_reports':
+        return tool.bus_reports(source, selection=selection)
+    elif operation == 'comment_rows':
+        return tool.comment_rows(source, selection=selection)
+
+# Function to run an edit operation of a request on the document, the document is written by WarmProject.run
+def run_edit(operation, doc, request):
+    dir_text = request.get('dir_text')
+    if operation == 'replace_tags_xml':
+        return tool.replace_tags_xml(doc, None, dir_text)
+    elif operation == 'replace_bus_tags':
+        reserved = request.get('reserved') or ()
+        if isinstance(reserved, str):
+            reserved = tool.parse_ranges(reserved)
+        return tool.replace_bus_tags(doc, None, dir_text, reserved, request.get('areas'),
+                                     start_number=request.get('start_number'), end_number=request.get('end_number'))
+    elif operation == 'num_par_tag':
+        return tool.num_par_tag(doc, None, dir_text, request.get('label'))
+    elif operation == 'bus_xml_replacement':
+        return tool.bus_xml_replacement(doc, None, dir_text)
+
+# Function to check a request before it runs, returns the error or None
+def request_error(request):
+    operations = request.get('operations') or []
+    if not request.get('source') or not operations:
+        return "a request needs a source and at least one operation"
+    for operation in operations:
+        if operation not in REPORT_OPERATIONS + EDIT_OPERATIONS:
+            return f"invalid operation '{operation}' (choose from {', '.join(REPORT_OPERATIONS + EDIT_OPERATIONS)})"
+    if any(operation not in ('bus_reports', 'comment_rows') for operation in operations) and not request.get('dir_text'):
+        return "the operations " + ", ".join(operations) + " need dir_text"
+    if any(operation in EDIT_OPERATIONS for operation in operations) and not request.get('dest'):
+        return "the operations " + ", ".join(operation for operation in operations if operation in EDIT_OPERATIONS) + " need dest"
+    if not os.path.isfile(request['source']):
+        return f"source file '{request['source']}' not found"
+    return None
+
+# Class of the server, it holds the projects by the path of their file with the least recently used one first
+class ProjectServer:
+    def __init__(self, memory_limit=MEMORY_LIMIT, output=None):
+        self.projects = OrderedDict()
+        self.memory_limit = memory_limit
+        self.output = output
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    # Function to get the project of a file, it becomes the most recently used one
+    def project(self, path):
+        with self.lock:
+            project = self.projects.get(path)
+            if project is None:
+                project = self.projects[path] = WarmProject(path)
+            self.projects.move_to_end(path)
+            return project
+
+    # Function to run a request, returns the result of every operation that ran
+    def run(self, request):
+        selection = tool.routine_selection(**(request.get('selection') or {}))
+        project = self.project(os.path.abspath(request['source']))
+        with project.lock:
+            results, doc = project.run(request, selection)
+        if doc is not None:
+            # the project of dest goes on from the written document, unless a request is running on it
+            dest = self.project(os.path.abspath(request['dest']))
+            if dest.lock.acquire(blocking=False):
+                try:
+                    dest.adopt(doc)
+                finally:
+                    dest.lock.release()
+        return results
+
+    # Function to move the projects out of the collected generations, they live as long as the server and this keeps the
+    # garbage collector from walking their records and trees again and again
+    # When projects were dropped the frozen objects are first moved back and collected, or the cycles of the dropped
+    # projects would be kept for as long as the server runs
+    def freeze(self, dropped):
+        if dropped:
+            gc.unfreeze()
+            gc.collect()
+        gc.freeze()
+
+    # Function to drop the least recently used projects until the projects are under the memory limit, then to freeze
+    # the projects that are left (see freeze)
+    def evict(self):
+        with self.lock:
+            self.freeze(self.drop_least_recently_used())
+
+    # Function to drop the least recently used projects until the projects are under the memory limit, returns the
+    # number of dropped projects. A project that a request is running on is kept
+    def drop_least_recently_used(self):
+        memory = {path: project.memory() for path, project in self.projects.items()}
+        total = sum(memory.values())
+        dropped = 0
+        for path, project in list(self.projects.items()):
+            if total <= self.memory_limit:
+                break
+            if not project.lock.acquire(blocking=False):
+                continue
+            try:
+                del self.projects[path]
+                total -= memory[path]
+                dropped += 1
+            finally:
+                project.lock.release()
+            print(f"Dropped '{path}' to stay under the memory limit")
+        return dropped
+
+    # Function to drop the project of a file or every project, returns the number of dropped projects
+    def forget(self, path=None):
+        with self.lock:
+            paths = [path] if path is not None else list(self.projects)
+            dropped = sum(self.projects.pop(name, None) is not None for name in paths)
+            self.freeze(dropped)
+            return dropped
+
+    # Status of every project, the least recently used one first
+    def status(self):
+        with self.lock:
+            projects = [{'path': path, 'index': project.index is not None, 'document': project.doc is not None,
+                         'memory': project.memory()} for path, project in self.projects.items()]
+        return {'pid': os.getpid(), 'memory_limit': self.memory_limit, 'projects': projects}
+
+    # Function to answer one request of a client, returns False when the server is asked to stop
+    def handle(self, connection):
+        request = connection.recv()
+        command = request.get('command', 'run')
+        if command == 'stop':
+            connection.send(('done', True, ""))
+            return False
+        if command == 'status':
+            connection.send(('done', self.status(), ""))
+        elif command == 'forget':
+            connection.send(('done', self.forget(request.get('source')), ""))
+        else:
+            with self.output.capture() as output:
+                error = request_error(request)
+                if error is None:
+                    try:
+                        reply = ('done', self.run(request), output.getvalue())
+                    except Exception as exception:
+                        reply = ('error', f"{type(exception).__name__}: {exception}", output.getvalue())
+                else:
+                    reply = ('error', error, "")
+            self.evict()
+            connection.send(reply)
+        return True
+
+    # Function to serve a client on its own thread, a client that stops the server wakes up the listener
+    def serve_connection(self, connection, stop):
+        with self.lock:
+            self.active += 1
+        try:
+            with connection:
+                if not self.handle(connection):
+                    stop()
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    # Function to serve the clients until the server is asked to stop
+    def serve(self, listener, authkey):
+        stopping = threading.Event()
+
+        def stop():
+            stopping.set()
+            try:
+                Client(listener.address, SERVER_FAMILY, authkey=authkey).close()
+            except (OSError, AuthenticationError):
+                pass
+
+        while not stopping.is_set():
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            if stopping.is_set():
+                connection.close()
+                break
+            threading.Thread(target=self.serve_connection, args=(connection, stop), daemon=True).start()
+
+    # Function to quit the server once it has had no request for idle_timeout seconds
+    def quit_when_idle(self, idle_timeout):
+        while True:
+            time.sleep(min(10, idle_timeout))
+            with self.lock:
+                if not self.active and time.monotonic() - self.last_used > idle_timeout:
+                    process.remove_process_file(SERVER_FILE)
+                    os._exit(0)
+
+# Function to run the server, it listens on a new address of SERVER_FAMILY
+def run_server(memory_limit=MEMORY_LIMIT, idle_timeout=None):
+    global tool
+    import xml_manipulation_tool_rockwell as tool
+    tool.use_cache()
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    server = ProjectServer(memory_limit, output)
+    authkey = os.urandom(32)
+    with Listener(family=SERVER_FAMILY, authkey=authkey) as listener:
+        process.write_process_file(SERVER_FILE, listener.address, authkey)
+        print(f"Serving on {listener.address}, projects are kept under {memory_limit / 1024 / 1024:.0f} MB")
+        if idle_timeout:
+            threading.Thread(target=server.quit_when_idle, args=(idle_timeout,), daemon=True).start()
+        try:
+            server.serve(listener, authkey)
+        finally:
+            process.remove_process_file(SERVER_FILE)
+    print("The server has been stopped")
+
+# Function to start the server detached from the process that starts it, it quits after START_IDLE_TIMEOUT seconds
+# without a request
+def start_server():
+    process.start_detached([sys.executable, os.path.abspath(__file__), "--idle-timeout", str(START_IDLE_TIMEOUT / 60)])
+
+# Function to connect to the server, None when it is not running
+def connect_server():
+    return process.connect_process(SERVER_FILE, SERVER_FAMILY)
+
+# Function to connect to the server and start it when it is not running and start is set, None when it does not start
+def server_connection(start=True):
+    connection = connect_server()
+    if connection is not None or not start:
+        return connection
+    start_server()
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        connection = connect_server()
+        if connection is not None:
+            return connection
+    return None
+
+# Function to send a message to the server and print what its operations printed, returns the answer or None when
+# the server could not be reached or the request failed
+def send_request(message, start=True):
+    connection = server_connection(start)
+    if connection is None:
+        print("Error: The server is not running" if not start else "Error: The server could not be started")
+        return None
+    with connection:
+        connection.send(message)
+        try:
+            status, answer, output = connection.recv()
+        except (OSError, EOFError):
+            print("Error: The server stopped before it answered")
+            return None
+    print(output, end='')
+    if status == 'error':
+        print(f"Error: {answer}")
+        return None
+    return answer
+
+# Function to run operations on a project of the server, the server is started when it is not running
+# operations are the names of the functions of xml_manipulation_tool_rockwell.py (see REPORT_OPERATIONS and
+# EDIT_OPERATIONS) and the options their arguments: start_number, end_number, reserved (a list of (start, end) or a
+# text such as "100-199,250"), areas, label and formats, with tasks, programs and routines to select routines
+# Returns the result of every operation that ran (the last one is None when it failed) or None when the request failed
+def request(source, operations, dir_text=None, dest=None, tasks=None, programs=None, routines=None, start=True, **options):
+    message = dict(options, command='run', source=os.path.abspath(source), operations=list(operations),
+                   dir_text=os.path.abspath(dir_text) if dir_text is not None else None,
+                   dest=os.path.abspath(dest) if dest is not None else None,
+                   selection={'tasks': tasks, 'programs': programs, 'routines': routines})
+    return send_request(message, start)
+
+# Function to get the status of the server, None when it is not running
+def status():
+    return send_request({'command': 'status'}, start=False)
+
+# Function to drop a project or every project from the server, returns the number of dropped projects
+def forget(source=None):
+    return send_request({'command': 'forget', 'source': os.path.abspath(source) if source is not None else None}, start=False)
+
+# Function to stop the server if it is running
+def stop():
+    if send_request({'command': 'stop'}, start=False):
+        print("The server has been stopped and the loaded projects freed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep Rockwell L5X/L5K projects loaded for the XML manipulation operations")
+    parser.add_argument("--memory-limit", type=float, default=MEMORY_LIMIT / 1024 / 1024,
+                        help="Memory in MB the loaded projects are kept under by dropping the least recently used ones")
+    parser.add_argument("--idle-timeout", type=float, help="Minutes without a request after which the server quits")
+    parser.add_argument("--status", action="store_true", help="Print the projects the running server holds")
+    parser.add_argument("--stop", action="store_true", help="Stop the running server")
+    args = parser.parse_args(argv)
+    if args.stop:
+        stop()
+        return 0
+    if args.status:
+        info = status()
+        if info is None:
+            return 1
+        print(f"Server {info['pid']}: {len(info['projects'])} projects, {sum(project['memory'] for project in info['projects']) / 1024 / 1024:.1f}"
+              f" of {info['memory_limit'] / 1024 / 1024:.0f} MB")
+        for project in info['projects']:
+            parts = [name for name in ('index', 'document') if project[name]]
+            print(f"  {project['path']}: {' and '.join(parts) or 'nothing'} loaded, {project['memory'] / 1024 / 1024:.1f} MB")
+        return 0
+    if args.memory_limit <= 0 or (args.idle_timeout is not None and args.idle_timeout <= 0):
+        parser.error("--memory-limit and --idle-timeout must be more than 0")
+    if connect_server() is not None:
+        parser.error("a server is already running, stop it with --stop first")
+    run_server(int(args.memory_limit * 1024 * 1024), args.idle_timeout * 60 if args.idle_timeout else None)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())